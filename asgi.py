@@ -0,0 +1,15 @@
+"""ASGI entry point for production serving, e.g. ``uvicorn asgi:application``.
+
+Requests run on a pool of ``GUDLFT_ASGI_WORKERS`` threads, so reads never
+queue behind a booking, and bookings are written by the background writer
+unless ``GUDLFT_PERSISTENCE_MODE`` says otherwise.
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+os.environ.setdefault('GUDLFT_PERSISTENCE_MODE', 'background')
+
+from server import app  # noqa: E402
+
+application = WSGIMiddleware(app, workers=int(os.environ.get('GUDLFT_ASGI_WORKERS', '16')))
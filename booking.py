@@ -0,0 +1,220 @@
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from copy import copy
+from contextlib import ExitStack, contextmanager, nullcontext
+
+
+MAX_PLACES_PER_BOOKING = 12
+
+
+class BookingError(Exception):
+    """Raised when a booking breaks one of the booking rules.
+
+    ``index`` points at the offending booking when a batch is refused.
+    """
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+def applyBooking(competition, club, places):
+    if competition is not None:
+        competition.number_of_places -= places
+    if club is not None:
+        club.points -= places
+
+
+def settle(result):
+    """Return a storage result, waiting for it if the write was queued."""
+    return result.result() if isinstance(result, Future) else result
+
+
+class BookingEngine:
+    """Checks and applies bookings without lost updates.
+
+    A booking holds the lock of its competition, then the lock of its club,
+    while it checks the remaining places and points and debits them, so two
+    bookings only wait for each other when they share a competition or a
+    club. Persisting and debiting happen under a short commit lock that
+    :meth:`exclusive` also takes, which keeps compaction consistent.
+
+    When the storage is shared with other processes, every booking first
+    applies the bookings the other processes stored since it last looked,
+    reading on from the archive when a compaction replaced the journal; only
+    a storage that cannot tell what was missed is reloaded.
+    When the storage queues its writes, the booking waits for its write
+    after releasing the locks, so queued bookings can be written together;
+    if the write fails, the debits and ledger entries are taken back before
+    the error is raised. A booking whose records were replaced by a reload before it committed
+    starts over.
+    """
+
+    def __init__(self, repository, storage, reload=None):
+        self.repository = repository
+        self.storage = storage
+        self.reload = reload
+        self._competition_locks = {}
+        self._club_locks = {}
+        self._registry_lock = threading.Lock()
+        self._commit_lock = threading.RLock()
+
+    def _lock_for(self, locks, name):
+        lock = locks.get(name)
+        if lock is None:
+            with self._registry_lock:
+                lock = locks.setdefault(name, threading.Lock())
+        return lock
+
+    def _lock_all(self, stack, competition_names, club_names):
+        # Competitions then clubs, each in name order, so that no two callers deadlock
+        for name in sorted(set(competition_names)):
+            stack.enter_context(self._lock_for(self._competition_locks, name))
+        for name in sorted(set(club_names)):
+            stack.enter_context(self._lock_for(self._club_locks, name))
+
+    @contextmanager
+    def exclusive(self):
+        """Hold off every booking, e.g. while writing snapshots."""
+        with self._commit_lock, self.storage.lock():
+            self.catch_up()
+            yield
+
+    def catch_up(self):
+        """Apply the bookings stored by other processes."""
+        if not self.storage.shared:
+            return
+        records = self.storage.changes()
+        if records is None:
+            records = self.storage.replaced_changes()
+        if records is None:
+            self.reload()
+            return
+        self._apply_changes(records)
+
+    def refresh(self):
+        """Apply the bookings stored by other processes before a read.
+
+        The new records are read without the storage lock, under the
+        commit lock so that no local booking checks its rules in between.
+        A replaced journal is caught up with under the storage lock.
+        """
+        if not self.storage.shared:
+            return
+        with self._commit_lock:
+            records = self.storage.changes()
+            if records is None:
+                with self.exclusive():
+                    return
+            self._apply_changes(records)
+
+    def _apply_changes(self, records):
+        for record in records:
+            self.repository.apply_booking(
+                self.repository.competition_by_name(record['competition']),
+                self.repository.club_by_name(record['club']),
+                record['places'],
+            )
+
+    def book(self, competition_name, club_name, places):
+        """Book ``places`` for a club and return the stored booking record."""
+        while True:
+            with self._lock_for(self._competition_locks, competition_name), \
+                    self._lock_for(self._club_locks, club_name):
+                with self.exclusive() if self.storage.shared else nullcontext():
+                    # Records are looked up again under the locks: a reload may have replaced them
+                    generation = self.repository.generation
+                    competition = self.repository.competition_by_name(competition_name)
+                    club = self.repository.club_by_name(club_name)
+                    if competition is None or club is None:
+                        raise BookingError('Invalid club or competition.')
+                    self.check(competition, club, places)
+                    with self._commit_lock:
+                        if self.repository.generation != generation:
+                            continue
+                        record = self.storage.record_booking(competition_name, club_name, places)
+                        entry_id = self.repository.apply_booking(competition, club, places)
+            return self._settle(record, generation, [(competition, club, places, entry_id)])
+
+    def book_many(self, bookings):
+        """Book a list of ``(competition, club, places)``, all or nothing.
+
+        Every lock the batch needs is taken up front, competitions then
+        clubs, each in name order, so batches cannot deadlock with each
+        other or with single bookings. The rules are checked against the
+        batch totals before anything is debited, and the storage persists
+        the whole batch at once.
+        """
+        while True:
+            with ExitStack() as stack:
+                self._lock_all(stack, (competition for competition, _, _ in bookings),
+                               (club for _, club, _ in bookings))
+                if self.storage.shared:
+                    stack.enter_context(self.exclusive())
+
+                generation = self.repository.generation
+                resolved = []
+                per_competition = Counter()
+                per_club = Counter()
+                per_pair = Counter()
+                for index, (competition_name, club_name, places) in enumerate(bookings):
+                    competition = self.repository.competition_by_name(competition_name)
+                    club = self.repository.club_by_name(club_name)
+                    if competition is None or club is None:
+                        raise BookingError('Invalid club or competition.', index)
+                    per_competition[competition_name] += places
+                    per_club[club_name] += places
+                    per_pair[competition_name, club_name] += places
+                    try:
+                        self._check_totals(competition, club, per_pair[competition_name, club_name],
+                                           per_competition[competition_name], per_club[club_name])
+                    except BookingError as error:
+                        raise BookingError(str(error), index) from None
+                    resolved.append((competition, club, places))
+
+                with self._commit_lock:
+                    if self.repository.generation != generation:
+                        continue
+                    records = self.storage.record_bookings(bookings)
+                    applied = [(competition, club, places, self.repository.apply_booking(competition, club, places))
+                               for competition, club, places in resolved]
+            return self._settle(records, generation, applied)
+
+    def _settle(self, result, generation, applied):
+        """Wait for the write of ``applied`` bookings, taking them back if it fails."""
+        try:
+            return settle(result)
+        except BaseException:
+            # Only a queued write fails here, once the locks are released: take them again
+            with ExitStack() as stack:
+                self._lock_all(stack, (competition.name for competition, _, _, _ in applied),
+                               (club.name for _, club, _, _ in applied))
+                stack.enter_context(self._commit_lock)
+                # After a reload the records come from the storage, which never had these bookings
+                if self.repository.generation == generation:
+                    for competition, club, places, entry_id in reversed(applied):
+                        self.repository.revert_booking(competition, club, places, entry_id)
+            raise
+
+    def snapshot(self):
+        """Return copies of the clubs and competitions, taken between bookings."""
+        with self.exclusive():
+            return ([copy(club) for club in self.repository.clubs],
+                    [copy(competition) for competition in self.repository.competitions])
+
+    def compact(self):
+        with self.exclusive():
+            self.storage.compact(self.repository.clubs, self.repository.competitions)
+
+    def check(self, competition, club, places):
+        self._check_totals(competition, club, places, places, places)
+
+    def _check_totals(self, competition, club, club_places, competition_places, club_points):
+        # The cap counts what the club already holds in the competition, a ledger counter read
+        if self.repository.ledger.total(competition.name, club.name) + club_places > MAX_PLACES_PER_BOOKING:
+            raise BookingError('You cannot book more than 12 places for a single competition.')
+        if competition_places > competition.number_of_places:
+            raise BookingError('Not enough places remaining in this competition.')
+        if club_points > club.points:
+            raise BookingError('Your club does not have enough points to complete this booking.')
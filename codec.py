@@ -0,0 +1,52 @@
+"""JSON encoding with the fastest library installed.
+
+orjson is preferred, then msgspec, then the standard library.
+``GUDLFT_JSON_CODEC`` forces one of them by name. ``loads`` accepts bytes
+or str and raises ``ValueError`` on invalid input; ``dumps`` returns
+compact UTF-8 bytes.
+"""
+import json
+import os
+
+
+def _orjsonCodec():
+    import orjson
+    return orjson.loads, orjson.dumps
+
+
+def _msgspecCodec():
+    import msgspec
+
+    def loads(data):
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as error:
+            raise ValueError(str(error)) from None
+
+    return loads, msgspec.json.encode
+
+
+def _stdlibCodec():
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+    return json.loads, dumps
+
+
+CODECS = {'orjson': _orjsonCodec, 'msgspec': _msgspecCodec, 'stdlib': _stdlibCodec}
+
+
+def selectCodec(name=None):
+    """Return ``(name, loads, dumps)`` for ``name`` or the first codec installed."""
+    if name is not None and name not in CODECS:
+        raise ValueError(f"Unknown JSON codec: {name!r}")
+    for candidate in [name] if name else CODECS:
+        try:
+            loads, dumps = CODECS[candidate]()
+        except ImportError:
+            continue
+        return candidate, loads, dumps
+    raise ValueError(f"JSON codec is not installed: {name!r}")
+
+
+name, loads, dumps = selectCodec(os.environ.get('GUDLFT_JSON_CODEC') or None)
@@ -0,0 +1,89 @@
+import sys
+import threading
+from collections import Counter, OrderedDict
+
+
+def fragmentSize(value):
+    """Approximate memory held by a cached string or list of strings."""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class FragmentCache:
+    """LRU cache of rendered fragments bounded by their size in bytes.
+
+    Keys are tuples whose first item names the kind of fragment, which
+    the hit and miss counters are kept by. Each entry is stored with a
+    ``stamp`` of the data it was rendered from: a lookup with another
+    stamp is a miss, so a booking that changes a record invalidates its
+    fragments on the next lookup. The outdated entry stays until it is
+    replaced or evicted, for :meth:`last` to rebuild from.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits[key[0]] += 1
+                return entry[1]
+            self.misses[key[0]] += 1
+            return None
+
+    def last(self, key):
+        """Return the value stored for ``key`` whatever its stamp, or ``None``."""
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key, stamp, value, size=None):
+        """Store ``value``; return ``False`` if it is larger than the whole cache."""
+        size = fragmentSize(value) if size is None else size
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (stamp, value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def exposition(self, name):
+        """Return the counters and the size in the Prometheus text format."""
+        with self._lock:
+            kinds = sorted(set(self.hits) | set(self.misses))
+            lines = [f'# HELP {name}_hits_total Fragment cache hits by kind.', f'# TYPE {name}_hits_total counter']
+            lines += [f'{name}_hits_total{{kind="{kind}"}} {self.hits[kind]}' for kind in kinds]
+            lines += [f'# HELP {name}_misses_total Fragment cache misses by kind.', f'# TYPE {name}_misses_total counter']
+            lines += [f'{name}_misses_total{{kind="{kind}"}} {self.misses[kind]}' for kind in kinds]
+            lines += [
+                f'# HELP {name}_evictions_total Fragments evicted to stay under the size bound.',
+                f'# TYPE {name}_evictions_total counter',
+                f'{name}_evictions_total {self.evictions}',
+                f'# HELP {name}_bytes Approximate size of the cached fragments.',
+                f'# TYPE {name}_bytes gauge',
+                f'{name}_bytes {self.bytes}',
+            ]
+        return '\n'.join(lines) + '\n'
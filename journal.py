@@ -0,0 +1,394 @@
+import os
+import threading
+import time
+
+import codec
+
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+class BookingJournal:
+    """Append-only log with one compact JSON record per booking.
+
+    Each line carries a sequence number and either one booking or, for a
+    batch, the list of its bookings, so a batch is written (and torn) as a
+    whole. Readers always get one record per booking. Snapshots store the sequence they
+    include, so replay only applies the records written after them, and a
+    crash between a compaction and the journal truncation cannot apply a
+    booking twice.
+
+    ``fsync`` is one of ``always`` (fsync every append), ``interval`` (at
+    most once every ``fsync_interval`` seconds) or ``never`` (leave it to
+    the OS).
+
+    When several processes share one journal, each keeps track of how far it
+    has read so that :meth:`tail` returns only the records written by the
+    others. Compaction replaces the file instead of truncating it in place,
+    which lets the other processes notice: :meth:`tail_replaced` then reads
+    on from where the records went.
+
+    With an ``archive_path``, :meth:`truncate` first appends the records to
+    that file, which keeps the history of every booking for :meth:`history`.
+
+    A compaction that runs beside the bookings first moves the journal to
+    ``<path>.compacting`` with :meth:`rotate` and starts an empty one. The rotated
+    records are still replayed until :meth:`finish_rotation` archives them,
+    once they are part of the snapshots.
+    """
+
+    def __init__(self, path, fsync='always', fsync_interval=1.0, archive_path=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync!r}")
+        self.path = os.fspath(path)
+        self.rotated_path = f'{self.path}.compacting'
+        self.archive_path = os.fspath(archive_path) if archive_path is not None else None
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.sequence = 0
+        self.pending = 0
+        self._file = None
+        self._last_fsync = 0.0
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def replay(self):
+        """Return the journaled records and drop a torn trailing write."""
+        with self._lock:
+            self._close()
+            self._offset = 0
+            self._inode = None
+            self.pending = 0
+            records = self._read_file(self.rotated_path)
+            if records:
+                self.sequence = max(self.sequence, records[-1]['seq'])
+            if not os.path.exists(self.path):
+                return records
+            self._inode = os.stat(self.path).st_ino
+            pending = self._read_from_offset()
+            if self._offset != os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(self._offset)
+            return records + pending
+
+    def tail(self):
+        """Return the records other processes appended since the last read.
+
+        Returns ``None`` when the journal was replaced by a compaction, in
+        which case the caller reads on with :meth:`tail_replaced`.
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                stat = None
+            inode = stat.st_ino if stat is not None else None
+            if inode != self._inode:
+                return None
+            if inode is None or stat.st_size == self._offset:
+                # Nothing new: no need to open the file
+                return []
+            return self._read_from_offset()
+
+    def tail_replaced(self):
+        """Return the records written since the last read, once :meth:`tail` found the journal replaced.
+
+        They are read from the end of the archive, the rotated journal and
+        the new journal, so that the whole history is not read again.
+        Returns ``None`` when some may be missing, e.g. without an archive,
+        in which case the caller has to reload. Has to run under the lock
+        that compactions take between processes.
+        """
+        with self._lock:
+            if self.archive_path is None:
+                return None
+            records = self._archived_after(self.sequence)
+            if records is None:
+                return None
+            after = records[-1]['seq'] if records else self.sequence
+            records.extend(self._read_file(self.rotated_path, after=after))
+            self._close()
+            self._offset = 0
+            self._inode = None
+            self.pending = 0
+            known = self.sequence
+            if os.path.exists(self.path):
+                self._inode = os.stat(self.path).st_ino
+                after = records[-1]['seq'] if records else known
+                records.extend(record for record in self._read_from_offset() if record['seq'] > after)
+            # Each line takes the next sequence: a gap means records that left the files
+            for record in records:
+                if record['seq'] == known + 1:
+                    known += 1
+                elif record['seq'] != known:
+                    return None
+            self.sequence = max(self.sequence, known)
+            return records
+
+    def _archived_after(self, after):
+        # Read back from the end of the archive until a record up to ``after`` is reached
+        if not os.path.exists(self.archive_path):
+            return []
+        with open(self.archive_path, 'rb') as archive:
+            end = archive.seek(0, os.SEEK_END)
+            data = b''
+            while end:
+                start = max(0, end - 65536)
+                archive.seek(start)
+                data = archive.read(end - start) + data
+                end = start
+                # Past the first line, which the read may have cut
+                lines = data.split(b'\n')[1 if end else 0:-1]
+                try:
+                    if lines and codec.loads(lines[0])['seq'] <= after:
+                        break
+                except ValueError:
+                    return None
+        records = []
+        for line in data.split(b'\n')[1 if end else 0:-1]:
+            try:
+                record = codec.loads(line)
+            except ValueError:
+                return None
+            if record['seq'] <= after:
+                continue
+            after = record['seq']
+            records.extend(self._expand(record))
+        return records
+
+    def _read_from_offset(self):
+        records = []
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = codec.loads(line)
+                except ValueError:
+                    break
+                records.extend(self._expand(record))
+                self._offset += len(line)
+        if records:
+            self.sequence = max(self.sequence, records[-1]['seq'])
+        self.pending += len(records)
+        return records
+
+    @staticmethod
+    def _expand(record):
+        if 'bookings' not in record:
+            return [record]
+        return [dict(booking, seq=record['seq']) for booking in record['bookings']]
+
+    def append(self, competition, club, places):
+        with self._lock:
+            self.sequence += 1
+            record = {'seq': self.sequence, 'competition': competition, 'club': club, 'places': places}
+            self._write(record)
+            self.pending += 1
+            return record
+
+    def append_many(self, bookings):
+        """Journal ``(competition, club, places)`` bookings as one line and one fsync."""
+        with self._lock:
+            self.sequence += 1
+            record = {
+                'seq': self.sequence,
+                'bookings': [
+                    {'competition': competition, 'club': club, 'places': places}
+                    for competition, club, places in bookings
+                ],
+            }
+            self._write(record)
+            self.pending += len(bookings)
+            return self._expand(record)
+
+    def _write(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+            self._inode = os.fstat(self._file.fileno()).st_ino
+        line = codec.dumps(record) + b'\n'
+        self._file.write(line)
+        self._file.flush()
+        self._sync()
+        self._offset += len(line)
+
+    def _sync(self):
+        if self.fsync == 'never':
+            return
+        now = time.monotonic()
+        if self.fsync == 'interval' and now - self._last_fsync < self.fsync_interval:
+            return
+        os.fsync(self._file.fileno())
+        self._last_fsync = now
+
+    def history(self):
+        """Return every archived and journaled record, oldest first.
+
+        Records are in sequence order: a record archived twice, when a
+        crash came between the archive and the truncation, is read once.
+        """
+        with self._lock:
+            records = []
+            for path in (self.archive_path, self.rotated_path, self.path):
+                if path is not None:
+                    records.extend(self._read_file(path, after=records[-1]['seq'] if records else 0))
+            return records
+
+    def _read_file(self, path, after=0):
+        # Whole lines only, skipping the records up to sequence ``after``
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = codec.loads(line)
+                except ValueError:
+                    break
+                if record['seq'] <= after:
+                    continue
+                after = record['seq']
+                records.extend(self._expand(record))
+        return records
+
+    def rotate(self):
+        """Set the journal aside for a compaction and start an empty one.
+
+        Returns whether there is a rotated journal to compact: a rotation
+        that was not finished, e.g. because of a crash, is compacted again
+        before the journal is rotated anew.
+        """
+        with self._lock:
+            if os.path.exists(self.rotated_path):
+                return True
+            if not os.path.exists(self.path) or not os.path.getsize(self.path):
+                return False
+            self._close()
+            os.replace(self.path, self.rotated_path)
+            self._start_empty()
+            return True
+
+    def rotated(self):
+        """Return the records of the rotated journal, ``None`` if there is none."""
+        with self._lock:
+            if not os.path.exists(self.rotated_path):
+                return None
+            return self._read_file(self.rotated_path)
+
+    def finish_rotation(self):
+        """Archive the rotated journal once the snapshots include it."""
+        with self._lock:
+            if self.archive_path is not None:
+                self._archive(self.rotated_path)
+            if os.path.exists(self.rotated_path):
+                os.remove(self.rotated_path)
+
+    def archive(self, bookings):
+        """Append ``(competition, club, places)`` bookings straight to the archive.
+
+        For storages that do not journal their bookings; the sequence keeps
+        running so that :meth:`history` reads them after the older ones.
+        """
+        if self.archive_path is None or not bookings:
+            return
+        with self._lock:
+            self._drop_torn_archive_write()
+            # A crash after the last archive, before the snapshots saved its
+            # sequence, leaves it ahead of ours: history() would skip the record
+            self.sequence = max(self.sequence, self._last_archived_sequence()) + 1
+            record = {
+                'seq': self.sequence,
+                'bookings': [
+                    {'competition': competition, 'club': club, 'places': places}
+                    for competition, club, places in bookings
+                ],
+            }
+            with open(self.archive_path, 'ab') as archive:
+                archive.write(codec.dumps(record) + b'\n')
+                archive.flush()
+                if self.fsync != 'never':
+                    os.fsync(archive.fileno())
+
+    def forget(self):
+        """Drop the journal and its archive, e.g. when the data is replaced."""
+        self.truncate(archive=False)
+        if self.archive_path is not None and os.path.exists(self.archive_path):
+            os.remove(self.archive_path)
+
+    def truncate(self, archive=True):
+        """Start an empty journal once its records are part of a snapshot.
+
+        A rotated journal is part of the snapshot too: it is archived first.
+        """
+        with self._lock:
+            self._close()
+            if archive and self.archive_path is not None:
+                self._archive(self.rotated_path)
+                self._archive(self.path)
+            if os.path.exists(self.rotated_path):
+                os.remove(self.rotated_path)
+            self._start_empty()
+
+    def _start_empty(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb'):
+            pass
+        os.replace(tmp_path, self.path)
+        self._inode = os.stat(self.path).st_ino
+        self._offset = 0
+        self.pending = 0
+
+    def _archive(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        # A torn trailing write is not a booking
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return
+        self._drop_torn_archive_write()
+        with open(self.archive_path, 'ab') as archive:
+            archive.write(data)
+            archive.flush()
+            if self.fsync != 'never':
+                os.fsync(archive.fileno())
+
+    def _last_archived_sequence(self):
+        if not os.path.exists(self.archive_path):
+            return 0
+        with open(self.archive_path, 'rb') as archive:
+            end = archive.seek(0, os.SEEK_END)
+            data = b''
+            # Read back from the end until the last line is whole
+            while end and data.count(b'\n') < 2:
+                start = max(0, end - 65536)
+                archive.seek(start)
+                data = archive.read(end - start) + data
+                end = start
+        lines = data.splitlines()
+        return codec.loads(lines[-1])['seq'] if lines else 0
+
+    def _drop_torn_archive_write(self):
+        # An archive cut short by a crash would glue its last line to the next records
+        if not os.path.exists(self.archive_path) or not os.path.getsize(self.archive_path):
+            return
+        with open(self.archive_path, 'r+b') as archive:
+            archive.seek(-1, os.SEEK_END)
+            if archive.read(1) == b'\n':
+                return
+            archive.seek(0)
+            archive.truncate(archive.read().rfind(b'\n') + 1)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
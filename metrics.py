@@ -0,0 +1,96 @@
+import threading
+import weakref
+from bisect import bisect_left
+
+
+# Upper bounds in seconds, the Prometheus client defaults plus a sub-millisecond bucket
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ShardOwner:
+    """Held by one thread only, so that it is freed when the thread exits."""
+
+    __slots__ = ('__weakref__',)
+
+
+class LatencyHistograms:
+    """Latency histograms keyed by a tuple of label values, without locks.
+
+    Every thread records into its own shard, so an observation is a bisect
+    and two list updates that no other thread writes to. :meth:`collect`
+    adds the shards up; an observation being recorded while it runs shows
+    up in the next scrape. When a thread exits, its shard is folded into a
+    shared total, so a thread per request does not leave a shard each.
+    """
+
+    def __init__(self, label_names, buckets=BUCKETS):
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # The thread-local owner goes away with the thread, which retires its shard
+            owner = self._local.owner = _ShardOwner()
+            with self._shards_lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(owner, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._shards_lock:
+            del self._shards[id(shard)]
+            _addSeries(self._retired, shard)
+
+    def observe(self, labels, seconds):
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # One count per bucket, then the +Inf bucket, then the sum
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def collect(self):
+        """Return ``{labels: [count per bucket..., +Inf count, sum]}`` over all threads."""
+        totals = {}
+        with self._shards_lock:
+            shards = list(self._shards.values())
+            _addSeries(totals, self._retired)
+        for shard in shards:
+            _addSeries(totals, shard)
+        return totals
+
+    def exposition(self, name, help_text):
+        """Render the histograms in the Prometheus text format."""
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+        for labels, series in sorted(self.collect().items()):
+            label_text = ','.join(
+                f'{label}="{_escape(value)}"' for label, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_text}}} {series[-1]!r}')
+            lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _addSeries(totals, shard):
+    for labels, series in list(shard.items()):
+        total = totals.get(labels)
+        if total is None:
+            totals[labels] = list(series)
+        else:
+            for index, value in enumerate(series):
+                total[index] += value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parseDate(value):
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+@dataclass(slots=True)
+class Club:
+    """A club with its points held as a native int.
+
+    The JSON files store numbers as strings; conversion only happens in
+    :meth:`from_json` and :meth:`to_json`.
+    """
+
+    name: str
+    email: str
+    points: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['name'], data['email'], int(data['points']))
+
+    def to_json(self):
+        return {'name': self.name, 'email': self.email, 'points': str(self.points)}
+
+
+@dataclass(slots=True)
+class Competition:
+    """A competition with a parsed date and its remaining places as an int."""
+
+    name: str
+    date: datetime
+    number_of_places: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['name'], parseDate(data['date']), int(data['numberOfPlaces']))
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'date': self.date.strftime(DATE_FORMAT),
+            'numberOfPlaces': str(self.number_of_places),
+        }
@@ -0,0 +1,347 @@
+import atexit
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future
+
+
+logger = logging.getLogger(__name__)
+
+
+def _exitOnSigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def flushOnExit(storage):
+    """Close ``storage``, writing what it still holds, when the process exits.
+
+    SIGTERM is turned into a normal exit unless something else (e.g. the
+    ASGI server) already handles it.
+    """
+    atexit.register(storage.close)
+    if threading.current_thread() is threading.main_thread() \
+            and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _exitOnSigterm)
+
+
+class BackgroundStorage:
+    """Wraps a storage so bookings are written by a background thread.
+
+    ``record_booking`` and ``record_bookings`` queue the write and return a
+    :class:`~concurrent.futures.Future`, so the booking engine debits the
+    records and releases its locks before the disk is touched. Bookings
+    queued while a write is in progress are coalesced into the next one: a
+    single journal line and a single fsync for the whole group.
+
+    Storages shared between processes cannot be wrapped, since they must
+    write under their lock.
+    """
+
+    shared = False
+
+    def __init__(self, storage):
+        if storage.shared:
+            raise ValueError("Shared storage has to be written synchronously")
+        self.storage = storage
+        self._queue = []
+        self._writing = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='booking-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        with self._condition:
+            queued = sum(len(bookings) for bookings, _, _ in self._queue)
+        return self.storage.pending + queued
+
+    def read_snapshots(self):
+        return self.storage.read_snapshots()
+
+    def load(self, snapshots=None):
+        self.flush()
+        return self.storage.load(snapshots)
+
+    def lock(self):
+        return self.storage.lock()
+
+    def changes(self):
+        return self.storage.changes()
+
+    def record_booking(self, competition, club, places):
+        return self._submit([(competition, club, places)], single=True)
+
+    def record_bookings(self, bookings):
+        return self._submit(list(bookings), single=False)
+
+    def _submit(self, bookings, single):
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Background storage is closed")
+            self._queue.append((bookings, single, future))
+            self._condition.notify_all()
+        return future
+
+    def flush(self):
+        """Wait until every queued booking is written."""
+        with self._condition:
+            while self._queue or self._writing:
+                self._condition.wait()
+
+    def history(self):
+        self.flush()
+        return self.storage.history()
+
+    def forget_history(self):
+        self.flush()
+        self.storage.forget_history()
+
+    def compact(self, clubs, competitions):
+        self.flush()
+        self.storage.compact(clubs, competitions)
+
+    def start_compaction(self):
+        # Bookings still queued get journaled after the rotation, past the compacted sequence
+        return self.storage.start_compaction()
+
+    def write_compaction(self):
+        return self.storage.write_compaction()
+
+    def finish_compaction(self, written):
+        return self.storage.finish_compaction(written)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.storage.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                batch, self._queue = self._queue, []
+                self._writing = True
+            try:
+                self._write(batch)
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write(self, batch):
+        try:
+            records = self.storage.record_bookings(
+                [booking for bookings, _, _ in batch for booking in bookings])
+        except BaseException as error:
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+        start = 0
+        for bookings, single, future in batch:
+            written = records[start:start + len(bookings)]
+            start += len(bookings)
+            future.set_result(written[0] if single else written)
+
+
+class BackgroundCompactor:
+    """Compacts the journal of a JSON storage on a background thread.
+
+    :meth:`request` wakes the thread up and returns at once, so the
+    booking that crossed the threshold does not write the snapshots. The
+    compaction brings the snapshot files up to date from the journal and
+    holds the engine's exclusive lock only to set the journal aside and to
+    swap the new files in. ``on_written`` is called after a swap.
+
+    The thread starts on the first :meth:`request`, so that a process
+    forked after the import runs its own.
+    """
+
+    def __init__(self, engine, on_written=None):
+        self.engine = engine
+        self.on_written = on_written
+        self._requested = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def request(self):
+        with self._start_lock:
+            if self._closed:
+                return
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='journal-compactor', daemon=True)
+                self._thread.start()
+        self._requested.set()
+
+    def compact(self):
+        """Compact once on the calling thread; returns whether new snapshots were put in place."""
+        storage = self.engine.storage
+        with self.engine.exclusive():
+            if not storage.start_compaction():
+                return False
+        written = storage.write_compaction()
+        with self.engine.exclusive():
+            done = storage.finish_compaction(written)
+        if done and self.on_written is not None:
+            self.on_written()
+        return done
+
+    def close(self):
+        with self._start_lock:
+            self._closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+        self._requested.set()
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            self._requested.wait()
+            if self._closed:
+                return
+            self._requested.clear()
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("Compacting the journal failed")
+
+
+class WriteBehindStorage:
+    """Acknowledges bookings at once and snapshots them in the background.
+
+    A booking only marks the data dirty. A background thread writes fresh
+    snapshots through the wrapped storage's compaction (temp file and
+    rename) ``flush_interval`` seconds after the first dirty booking, or as
+    soon as ``flush_every`` bookings are waiting, so a burst of bookings
+    costs one write. ``snapshot`` returns copies of the clubs and
+    competitions taken between two bookings.
+
+    Each flush also appends the bookings it covers to the wrapped
+    storage's history, so the booking ledger, and the cap counted from it,
+    survives a restart. Bookings acknowledged since the last snapshot are
+    lost if the process dies without running :meth:`close`.
+    """
+
+    shared = False
+    pending = 0
+
+    def __init__(self, storage, snapshot, flush_interval=0.05, flush_every=100):
+        if storage.shared:
+            raise ValueError("Shared storage has to be written synchronously")
+        self.storage = storage
+        self.snapshot = snapshot
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.sequence = 0
+        self.dirty = 0
+        self._unarchived = []
+        self._dirty_since = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+        self._thread.start()
+
+    def load(self):
+        return self.storage.load()
+
+    def lock(self):
+        return self.storage.lock()
+
+    def changes(self):
+        return self.storage.changes()
+
+    def history(self):
+        return self.storage.history()
+
+    def forget_history(self):
+        self.storage.forget_history()
+
+    def record_booking(self, competition, club, places):
+        return self.record_bookings([(competition, club, places)])[0]
+
+    def record_bookings(self, bookings):
+        with self._condition:
+            self.sequence += 1
+            records = [
+                {'seq': self.sequence, 'competition': competition, 'club': club, 'places': places}
+                for competition, club, places in bookings
+            ]
+            if not self.dirty:
+                self._dirty_since = time.monotonic()
+                self._condition.notify_all()
+            self.dirty += len(records)
+            self._unarchived.extend(bookings)
+            if self.dirty >= self.flush_every:
+                self._condition.notify_all()
+        return records
+
+    def flush(self):
+        """Snapshot every booking acknowledged so far."""
+        with self._write_lock:
+            with self._condition:
+                dirty, self.dirty = self.dirty, 0
+            if not dirty:
+                return
+            bookings = []
+            try:
+                clubs, competitions = self.snapshot()
+                # Taken after the snapshot: a booking in between is archived now and
+                # saved by the next flush, so a crash can only overcount the cap
+                with self._condition:
+                    bookings, self._unarchived = self._unarchived, []
+                self.storage.archive_bookings(bookings)
+                bookings = []
+                self.storage.compact(clubs, competitions)
+            except BaseException:
+                with self._condition:
+                    self._unarchived[:0] = bookings
+                    self.dirty += dirty
+                    self._dirty_since = time.monotonic()
+                raise
+
+    def compact(self, clubs, competitions):
+        # Runs under the engine's lock, which the writer needs for its snapshot: only wake it up
+        with self._condition:
+            self.dirty = max(self.dirty, self.flush_every)
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+        self.storage.close()
+
+    def _run(self):
+        while self._wait_for_flush():
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing the snapshots failed, retrying")
+
+    def _wait_for_flush(self):
+        with self._condition:
+            while not self._closed:
+                if self.dirty >= self.flush_every:
+                    return True
+                if not self.dirty:
+                    self._condition.wait()
+                    continue
+                remaining = self._dirty_since + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._condition.wait(remaining)
+            return False
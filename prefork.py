@@ -0,0 +1,111 @@
+"""Pre-fork serving over several processes: ``python prefork.py --workers 4``.
+
+The master imports the application, which loads the data once, then
+forks the workers. They share the loaded records copy-on-write and serve
+one listening socket with uvicorn, each on its own pool of threads.
+Bookings go through the storage shared between processes: one process
+writes at a time under the booking lock file, and every request first
+applies what the other workers booked, so all of them see the same
+places and points.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+
+
+def checkConfig(config):
+    """Refuse settings whose threads or in-memory state would not survive a fork."""
+    if config['STORAGE_BACKEND'] == 'json' and config['BOOKING_LOCK_MODE'] != 'process':
+        raise ValueError("Pre-fork serving needs GUDLFT_BOOKING_LOCK_MODE=process")
+    if config['PERSISTENCE_MODE'] != 'sync':
+        raise ValueError("Pre-fork serving needs GUDLFT_PERSISTENCE_MODE=sync")
+    if config['DATA_LOADING'] != 'eager':
+        raise ValueError("Pre-fork serving loads the data in the master: GUDLFT_DATA_LOADING=eager")
+    if config['HOT_RELOAD_INTERVAL'] > 0:
+        raise ValueError("Pre-fork serving does not support hot reload")
+
+
+def createListener(host, port, backlog=2048):
+    listener = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+
+def serveWorker(app, listener, threads):
+    import uvicorn
+    from a2wsgi import WSGIMiddleware
+
+    config = uvicorn.Config(WSGIMiddleware(app, workers=threads), log_level='warning', lifespan='off')
+    uvicorn.Server(config).run(sockets=[listener])
+
+
+def forkWorker(app, listener, threads):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            serveWorker(app, listener, threads)
+        except BaseException:
+            code = 1
+            raise
+        finally:
+            # Skip the master's exit handlers
+            os._exit(code)
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('GUDLFT_ASGI_WORKERS', '16')),
+                        help='Request threads per worker')
+    options = parser.parse_args(argv)
+
+    os.environ.setdefault('GUDLFT_BOOKING_LOCK_MODE', 'process')
+    os.environ.setdefault('GUDLFT_PERSISTENCE_MODE', 'sync')
+    import server
+
+    checkConfig(server.app.config)
+    # Open files and connections are not shared: each worker opens its own
+    server.storage.close()
+    listener = createListener(options.host, options.port)
+    # Keep the loaded records out of the collector so that collections
+    # in the workers do not write to (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {forkWorker(server.app, listener, options.threads) for _ in range(options.workers)}
+    print(f'Serving on {options.host}:{options.port} with {len(workers)} workers', flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f'Worker {pid} exited with status {status}, starting another', file=sys.stderr, flush=True)
+            workers.add(forkWorker(server.app, listener, options.threads))
+    listener.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import cProfile
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval.
+
+    The samples are counted as collapsed stacks, ``outer;...;inner``, the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+class RequestProfiler:
+    """Profiles a sampled fraction of requests, one file per request.
+
+    A request is profiled when a random draw falls under ``sample_rate`` or
+    when it carries ``header`` (if set) with a true value. ``cprofile`` mode
+    writes ``.pstats`` files, ``sample`` mode writes ``.collapsed`` stacks,
+    both under ``directory/<route>/``. One request is profiled at a time;
+    the others run untouched meanwhile.
+    """
+
+    def __init__(self, directory, sample_rate=0.0, header=None, mode='cprofile', interval=0.001):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode!r}")
+        self.directory = os.fspath(directory)
+        self.sample_rate = sample_rate
+        self.header = header
+        self.mode = mode
+        self.interval = interval
+        self._busy = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def wanted(self, headers):
+        if self.header and headers.get(self.header, '').lower() in ('1', 'true', 'yes'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """Start profiling the current thread, or return ``None`` if busy."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            if self.mode == 'cprofile':
+                profile = cProfile.Profile()
+                profile.enable()
+            else:
+                profile = StackSampler(threading.get_ident(), self.interval)
+                profile.start()
+        except BaseException:
+            self._busy.release()
+            raise
+        return profile
+
+    def stop(self, profile, route):
+        """Stop ``profile`` and write it for ``route``; return the file path."""
+        try:
+            if self.mode == 'cprofile':
+                profile.disable()
+            else:
+                stacks = profile.stop()
+        finally:
+            self._busy.release()
+        directory = os.path.join(self.directory, route or 'unknown')
+        os.makedirs(directory, exist_ok=True)
+        name = f'{time.time_ns() // 1_000_000}-{os.getpid()}-{next(self._counter)}'
+        if self.mode == 'cprofile':
+            path = os.path.join(directory, f'{name}.pstats')
+            profile.dump_stats(path)
+        else:
+            path = os.path.join(directory, f'{name}.collapsed')
+            with open(path, 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        return path
+
+
+def _profileFiles(directory, route, suffix):
+    if route:
+        routes = [route]
+    elif os.path.isdir(directory):
+        routes = sorted(os.listdir(directory))
+    else:
+        routes = []
+    for name in routes:
+        route_directory = os.path.join(directory, name)
+        if not os.path.isdir(route_directory):
+            continue
+        for file_name in sorted(os.listdir(route_directory)):
+            if file_name.endswith(suffix):
+                yield os.path.join(route_directory, file_name)
+
+
+def profileReport(directory, top=20, route=None):
+    """Return the top-``top`` functions over the dumped profiles as text lines."""
+    lines = []
+    stats_files = list(_profileFiles(directory, route, '.pstats'))
+    if stats_files:
+        stats = pstats.Stats(*stats_files)
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        lines.append(f'{len(stats_files)} cProfile profiles, top {len(entries)} by own time')
+        lines.append(f'{"own s":>10} {"total s":>10} {"calls":>9}  function')
+        for (file_name, line, function), (_, calls, own, total, _) in entries:
+            lines.append(f'{own:10.4f} {total:10.4f} {calls:9d}  {function} '
+                         f'({os.path.basename(file_name)}:{line})')
+
+    collapsed_files = list(_profileFiles(directory, route, '.collapsed'))
+    if collapsed_files:
+        own = Counter()
+        total = Counter()
+        samples = 0
+        for path in collapsed_files:
+            with open(path) as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    frames = stack.split(';')
+                    count = int(count)
+                    samples += count
+                    own[frames[-1]] += count
+                    for frame in set(frames):
+                        total[frame] += count
+        if lines:
+            lines.append('')
+        lines.append(f'{len(collapsed_files)} sampled profiles, {samples} samples, top {top} by own samples')
+        lines.append(f'{"own %":>7} {"total %":>7}  function')
+        for frame, count in own.most_common(top):
+            lines.append(f'{count / samples:7.1%} {total[frame] / samples:7.1%}  {frame}')
+
+    if not lines:
+        lines.append(f'No profiles in {directory}')
+    return lines
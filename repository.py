@@ -0,0 +1,563 @@
+import secrets
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+
+from booking import applyBooking
+
+
+class CompetitionTimeline:
+    """Competition dates kept sorted.
+
+    Splitting competitions into past and upcoming is a bisect against "now".
+    The split point only moves when "now" crosses a competition date, so it
+    is cached together with the window in which it stays valid.
+
+    :meth:`add` and :meth:`remove` insert and delete single dates; a reload
+    applies them to a :meth:`copy` and publishes it, so readers never see
+    a timeline being changed.
+    """
+
+    def __init__(self, competitions=()):
+        self.rebuild(competitions)
+
+    def rebuild(self, competitions):
+        self._dates_by_name = {c.name: c.date for c in competitions}
+        self._dates = sorted(self._dates_by_name.values())
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window = (0, None, self._dates[0] if self._dates else None)
+
+    def copy(self):
+        timeline = CompetitionTimeline.__new__(CompetitionTimeline)
+        timeline._dates = list(self._dates)
+        timeline._dates_by_name = dict(self._dates_by_name)
+        timeline._reset_window()
+        return timeline
+
+    def add(self, name, date):
+        insort(self._dates, date)
+        self._dates_by_name[name] = date
+        self._reset_window()
+
+    def remove(self, name):
+        del self._dates[bisect_left(self._dates, self._dates_by_name.pop(name))]
+        self._reset_window()
+
+    def date(self, name):
+        return self._dates_by_name.get(name)
+
+    def cutoff(self, now):
+        """Return how many competitions are dated strictly before ``now``."""
+        count, low, high = self._window
+        if (low is None or low < now) and (high is None or now <= high):
+            return count
+        count = bisect_left(self._dates, now)
+        low = self._dates[count - 1] if count else None
+        high = self._dates[count] if count < len(self._dates) else None
+        self._window = (count, low, high)
+        return count
+
+    def is_past(self, name, now):
+        # The competitions before the cutoff are exactly those dated before now
+        date = self._dates_by_name.get(name)
+        return date is not None and date < now
+
+
+class ClubRanking:
+    """Clubs ordered by points, highest first, ties kept in file order.
+
+    Each club is keyed by ``(-points, position)`` in a sorted list. A points
+    change bisects to the old key, removes it and inserts the new one, so
+    the order is never rebuilt after load.
+    """
+
+    def __init__(self, clubs=()):
+        self.rebuild(clubs)
+
+    def copy(self):
+        ranking = ClubRanking.__new__(ClubRanking)
+        ranking._clubs = list(self._clubs)
+        ranking._positions = dict(self._positions)
+        ranking._keys_by_position = list(self._keys_by_position)
+        ranking._keys = list(self._keys)
+        return ranking
+
+    def rebuild(self, clubs):
+        self._clubs = list(clubs)
+        self._positions = {id(club): position for position, club in enumerate(self._clubs)}
+        self._keys_by_position = [(-club.points, position) for position, club in enumerate(self._clubs)]
+        self._keys = sorted(self._keys_by_position)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, club, points):
+        position = self._positions.get(id(club))
+        if position is None:
+            return
+        old_key = self._keys_by_position[position]
+        new_key = (-points, position)
+        if old_key == new_key:
+            return
+        del self._keys[bisect_left(self._keys, old_key)]
+        insort(self._keys, new_key)
+        self._keys_by_position[position] = new_key
+
+    def append(self, club):
+        """Rank a club that comes after every other in file order."""
+        position = len(self._clubs)
+        self._clubs.append(club)
+        self._positions[id(club)] = position
+        key = (-club.points, position)
+        self._keys_by_position.append(key)
+        insort(self._keys, key)
+
+    def replace(self, old, new):
+        """Put ``new`` at the place of ``old`` and rank it by its points."""
+        position = self._positions.pop(id(old))
+        self._clubs[position] = new
+        self._positions[id(new)] = position
+        self.update(new, new.points)
+
+    def page(self, offset, limit):
+        return list(self.iter_page(offset, limit))
+
+    def iter_page(self, offset, limit):
+        for _, position in self._keys[offset:offset + limit]:
+            yield self._clubs[position]
+
+
+def prefixRange(keys, prefix):
+    """Return the slice bounds of the sorted ``keys`` that start with ``prefix``."""
+    return bisect_left(keys, prefix), bisect_left(keys, prefix + '\U0010ffff')
+
+
+class CompetitionCatalog:
+    """Competitions sorted by (date, name) and by name, plus the ones with places left.
+
+    A query is two bisects on one of the sorted key lists and a slice, so
+    it costs O(log n + page). Taking the last place of a competition moves
+    it out of the "with places" lists; a refund moves it back.
+    """
+
+    def __init__(self, competitions=()):
+        self.rebuild(competitions)
+
+    def copy(self):
+        catalog = CompetitionCatalog.__new__(CompetitionCatalog)
+        catalog._dates = dict(self._dates)
+        catalog._by_date = list(self._by_date)
+        catalog._by_name = list(self._by_name)
+        catalog._open = set(self._open)
+        catalog._open_by_date = list(self._open_by_date)
+        catalog._open_by_name = list(self._open_by_name)
+        return catalog
+
+    def add(self, competition):
+        name = competition.name
+        key = (competition.date, name)
+        self._dates[name] = competition.date
+        insort(self._by_date, key)
+        insort(self._by_name, name)
+        if competition.number_of_places > 0:
+            self._open.add(name)
+            insort(self._open_by_date, key)
+            insort(self._open_by_name, name)
+
+    def remove(self, name):
+        key = (self._dates.pop(name), name)
+        del self._by_date[bisect_left(self._by_date, key)]
+        del self._by_name[bisect_left(self._by_name, name)]
+        if name in self._open:
+            self._open.discard(name)
+            del self._open_by_date[bisect_left(self._open_by_date, key)]
+            del self._open_by_name[bisect_left(self._open_by_name, name)]
+
+    def rebuild(self, competitions):
+        competitions = list(competitions)
+        self._dates = {c.name: c.date for c in competitions}
+        self._by_date = sorted((c.date, c.name) for c in competitions)
+        self._by_name = sorted(self._dates)
+        self._open = {c.name for c in competitions if c.number_of_places > 0}
+        self._open_by_date = [key for key in self._by_date if key[1] in self._open]
+        self._open_by_name = [name for name in self._by_name if name in self._open]
+
+    def update(self, competition):
+        """Follow a change of the remaining places of ``competition``."""
+        name = competition.name
+        if name not in self._dates or (competition.number_of_places > 0) == (name in self._open):
+            return
+        key = (self._dates[name], name)
+        if name in self._open:
+            self._open.discard(name)
+            del self._open_by_date[bisect_left(self._open_by_date, key)]
+            del self._open_by_name[bisect_left(self._open_by_name, name)]
+        else:
+            self._open.add(name)
+            insort(self._open_by_date, key)
+            insort(self._open_by_name, name)
+
+    def by_date(self, start=None, end=None, has_places=False, after=None, limit=100):
+        """Return up to ``limit`` (date, name) keys in [start, end) and whether more follow.
+
+        ``after`` is the last key of the previous page.
+        """
+        keys = self._open_by_date if has_places else self._by_date
+        low = bisect_left(keys, (start,)) if start is not None else 0
+        if after is not None:
+            low = max(low, bisect_right(keys, after))
+        high = bisect_left(keys, (end,)) if end is not None else len(keys)
+        return keys[low:min(high, low + limit)], low + limit < high
+
+    def by_name(self, prefix='', has_places=False, after=None, limit=100):
+        """Return up to ``limit`` names starting with ``prefix``, in name order, and whether more follow.
+
+        There are no date bounds: the name order does not follow the dates,
+        so they could only be checked by scanning the prefix range.
+        """
+        keys = self._open_by_name if has_places else self._by_name
+        low, high = prefixRange(keys, prefix)
+        if after is not None:
+            low = max(low, bisect_right(keys, after))
+        return keys[low:min(high, low + limit)], low + limit < high
+
+
+class BookingLedger:
+    """Every booking applied, indexed by club and by competition.
+
+    An entry is a ``(competition, club, places)`` tuple and its id is its
+    position, so ids follow the order the bookings were applied in. Each
+    club and each competition keeps the ascending ids of its entries in an
+    array, which makes a page of history a bisect and a slice. Running
+    totals per (competition, club) pair and per competition are updated
+    with every entry, so totals and attendee counts are dictionary reads.
+    Refunds are entries with negative places.
+    """
+
+    def __init__(self, bookings=()):
+        self._entries = []
+        self._by_club = {}
+        self._by_competition = {}
+        self._totals = {}
+        self._places = {}
+        self._attendees = {}
+        # One string per name, however many bookings were read back for it
+        self._names = {}
+        for booking in bookings:
+            self.record(booking['competition'], booking['club'], booking['places'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, competition, club, places):
+        """Add a booking and return its id."""
+        names = self._names
+        competition = names.setdefault(competition, competition)
+        club = names.setdefault(club, club)
+        entry_id = len(self._entries)
+        self._entries.append((competition, club, places))
+        ids = self._by_club.get(club)
+        if ids is None:
+            ids = self._by_club[club] = array('q')
+        ids.append(entry_id)
+        ids = self._by_competition.get(competition)
+        if ids is None:
+            ids = self._by_competition[competition] = array('q')
+        ids.append(entry_id)
+        pair = (competition, club)
+        before = self._totals.get(pair, 0)
+        after = self._totals[pair] = before + places
+        self._places[competition] = self._places.get(competition, 0) + places
+        if before <= 0 < after:
+            self._attendees[competition] = self._attendees.get(competition, 0) + 1
+        elif after <= 0 < before:
+            self._attendees[competition] -= 1
+        return entry_id
+
+    def undo(self, entry_id):
+        """Take back an entry, e.g. a booking whose write failed.
+
+        The entry leaves the club and competition histories and the totals;
+        its id stays taken, with no places, so later ids do not move.
+        """
+        competition, club, places = self._entries[entry_id]
+        self._entries[entry_id] = (competition, club, 0)
+        for ids in (self._by_club[club], self._by_competition[competition]):
+            del ids[bisect_left(ids, entry_id)]
+        pair = (competition, club)
+        before = self._totals[pair]
+        after = self._totals[pair] = before - places
+        self._places[competition] -= places
+        if before <= 0 < after:
+            self._attendees[competition] = self._attendees.get(competition, 0) + 1
+        elif after <= 0 < before:
+            self._attendees[competition] -= 1
+
+    def total(self, competition, club):
+        """Return the places ``club`` holds in ``competition``, refunds deducted."""
+        return self._totals.get((competition, club), 0)
+
+    def booked(self, competition):
+        return self._places.get(competition, 0)
+
+    def attendees(self, competition):
+        """Return how many clubs hold places in ``competition``."""
+        return self._attendees.get(competition, 0)
+
+    def club_history(self, club, after=None, limit=100):
+        """Return up to ``limit`` ``(id, competition, club, places)`` of ``club`` after id ``after``."""
+        return self._page(self._by_club.get(club, ()), after, limit)
+
+    def competition_history(self, competition, after=None, limit=100):
+        return self._page(self._by_competition.get(competition, ()), after, limit)
+
+    def _page(self, ids, after, limit):
+        low = 0 if after is None else bisect_right(ids, after)
+        page = [(entry_id,) + self._entries[entry_id] for entry_id in ids[low:low + limit]]
+        return page, low + limit < len(ids)
+
+
+class Repository:
+    """In-memory store for clubs and competitions with hash indexes.
+
+    Lookups by club email, club name and competition name are O(1). The
+    ``clubs`` and ``competitions`` lists are updated in place on reload so
+    that any module-level alias keeps pointing at the live data.
+
+    ``generation`` changes whenever records may have been replaced by other
+    objects, so code holding a record can tell it went stale.
+
+    ``version`` counts the changes since the process started; ``revision``
+    adds a token drawn at every full load, so that ETags built on it do not
+    match the data of another process or of an earlier start.
+    """
+
+    def __init__(self, clubs=None, competitions=None):
+        self.clubs = []
+        self.competitions = []
+        self._clubs_by_email = {}
+        self._clubs_by_name = {}
+        self._competitions_by_name = {}
+        self.timeline = CompetitionTimeline()
+        self.catalog = CompetitionCatalog()
+        self.ranking = ClubRanking()
+        self._club_names = []
+        self.version = 0
+        self._load_token = ''
+        self.generation = 0
+        self._booked = None
+        self.ledger = BookingLedger()
+        self.load(clubs or [], competitions or [])
+
+    def load(self, clubs, competitions, bookings=()):
+        """Replace the data; ``bookings`` are the booking records kept so far."""
+        self.clubs[:] = clubs
+        self.competitions[:] = competitions
+        self._booked = None
+        self.ledger = BookingLedger(bookings)
+        self.reindex()
+
+    def reindex(self):
+        # setdefault keeps the first record on duplicates, like the old next() scans
+        self._clubs_by_email = {}
+        self._clubs_by_name = {}
+        for club in self.clubs:
+            self._clubs_by_email.setdefault(club.email, club)
+            self._clubs_by_name.setdefault(club.name, club)
+        self._competitions_by_name = {}
+        for competition in self.competitions:
+            self._competitions_by_name.setdefault(competition.name, competition)
+        # New objects, published by assignment: readers keep the ones they started with
+        self.timeline = CompetitionTimeline(self._competitions_by_name.values())
+        self.catalog = CompetitionCatalog(self._competitions_by_name.values())
+        self.ranking = ClubRanking(self.clubs)
+        self._club_names = sorted(self._clubs_by_name)
+        self.generation += 1
+        self._load_token = secrets.token_hex(4)
+        self.touch()
+
+    def merge(self, clubs, competitions):
+        """Swap in reloaded records, keeping the objects that did not change.
+
+        The new indexes, ranking, timeline and catalog are copies of the
+        live ones with only the changed keys inserted or deleted, and they
+        are published by assignment once complete, so readers see either
+        the old or the new data and the objects they hold are never
+        modified. Returns the number of added, changed or removed records.
+        """
+        clubs, clubs_by_name, changed_clubs, removed_clubs = self._diff(self._clubs_by_name, clubs)
+        competitions, competitions_by_name, changed_competitions, removed_competitions = self._diff(
+            self._competitions_by_name, competitions)
+        if not (changed_clubs or removed_clubs or changed_competitions or removed_competitions):
+            return 0
+
+        clubs_by_email = self._clubs_by_email
+        if changed_clubs or removed_clubs:
+            clubs_by_email = dict(clubs_by_email)
+            for old, _ in changed_clubs:
+                if old is not None and clubs_by_email.get(old.email) is old:
+                    del clubs_by_email[old.email]
+            for old in removed_clubs:
+                if clubs_by_email.get(old.email) is old:
+                    del clubs_by_email[old.email]
+            for _, new in changed_clubs:
+                clubs_by_email.setdefault(new.email, new)
+
+        ranking, club_names = self._merged_ranking(clubs, changed_clubs, removed_clubs)
+        timeline, catalog = self.timeline, self.catalog
+        if changed_competitions or removed_competitions:
+            timeline, catalog = timeline.copy(), catalog.copy()
+            for old in removed_competitions:
+                timeline.remove(old.name)
+                catalog.remove(old.name)
+            for old, new in changed_competitions:
+                if old is not None and old.date == new.date:
+                    catalog.update(new)
+                    continue
+                if old is not None:
+                    timeline.remove(old.name)
+                    catalog.remove(old.name)
+                timeline.add(new.name, new.date)
+                catalog.add(new)
+
+        self._clubs_by_email = clubs_by_email
+        self._clubs_by_name = clubs_by_name
+        self._competitions_by_name = competitions_by_name
+        self.clubs[:] = clubs
+        self.competitions[:] = competitions
+        self.ranking = ranking
+        self._club_names = club_names
+        self.timeline = timeline
+        self.catalog = catalog
+        self.generation += 1
+        self.touch()
+        return len(changed_clubs) + len(removed_clubs) + len(changed_competitions) + len(removed_competitions)
+
+    def _merged_ranking(self, clubs, changed, removed):
+        """Return the ranking and sorted club names after a merge of the clubs."""
+        if not (changed or removed):
+            return self.ranking, self._club_names
+        added = [new for old, new in changed if old is None]
+        club_names = list(self._club_names)
+        for old in removed:
+            del club_names[bisect_left(club_names, old.name)]
+        for new in added:
+            insort(club_names, new.name)
+        # Ties rank in file order: clubs added at the end of the file keep every position
+        if removed or len(self.ranking) + len(added) != len(clubs) \
+                or any(club is not new for club, new in zip(clubs[len(clubs) - len(added):], added)):
+            return ClubRanking(clubs), club_names
+        ranking = self.ranking.copy()
+        for old, new in changed:
+            if old is None:
+                ranking.append(new)
+            else:
+                ranking.replace(old, new)
+        return ranking, club_names
+
+    @staticmethod
+    def _diff(current_by_name, records):
+        # Returns the merged list, the new name index, (old, new) pairs and the removed records
+        merged = []
+        by_name = current_by_name
+        changed = []
+        seen = set()
+        for record in records:
+            if record.name in seen:
+                merged.append(record)
+                continue
+            seen.add(record.name)
+            old = current_by_name.get(record.name)
+            if old == record:
+                merged.append(old)
+                continue
+            if by_name is current_by_name:
+                by_name = dict(current_by_name)
+            by_name[record.name] = record
+            changed.append((old, record))
+            merged.append(record)
+        removed = [record for name, record in current_by_name.items() if name not in seen]
+        if removed:
+            if by_name is current_by_name:
+                by_name = dict(current_by_name)
+            for record in removed:
+                del by_name[record.name]
+        return merged, by_name, changed, removed
+
+    def club_by_email(self, email):
+        return self._clubs_by_email.get(email)
+
+    def club_by_name(self, name):
+        return self._clubs_by_name.get(name)
+
+    def competition_by_name(self, name):
+        return self._competitions_by_name.get(name)
+
+    def club_names(self, prefix='', after=None, limit=100):
+        """Return up to ``limit`` club names starting with ``prefix`` and whether more follow."""
+        low, high = prefixRange(self._club_names, prefix)
+        if after is not None:
+            low = max(low, bisect_right(self._club_names, after))
+        return self._club_names[low:min(high, low + limit)], low + limit < high
+
+    def is_past(self, competition, now):
+        return self.timeline.is_past(competition.name, now)
+
+    @property
+    def revision(self):
+        """The data version as ETags carry it, e.g. ``'3f9c01ab.42'``."""
+        return f'{self._load_token}.{self.version}'
+
+    def touch(self):
+        """Record a change to the data; cached pages and ETags key on ``version``."""
+        self.version += 1
+
+    def apply_booking(self, competition, club, places):
+        """Debit a booking, record it in the ledger and keep the ranking in step with the new points.
+
+        Returns the ledger id of the booking, ``None`` without both records.
+        """
+        applyBooking(competition, club, places)
+        if competition is not None:
+            self.catalog.update(competition)
+        if club is not None:
+            self.ranking.update(club, club.points)
+        entry_id = None
+        if competition is not None and club is not None:
+            entry_id = self.ledger.record(competition.name, club.name, places)
+            if self._booked is not None:
+                self._booked[(competition.name, club.name)] += places
+        self.touch()
+        return entry_id
+
+    def revert_booking(self, competition, club, places, entry_id):
+        """Undo :meth:`apply_booking` for a booking the storage did not keep."""
+        applyBooking(competition, club, -places)
+        self.catalog.update(competition)
+        self.ranking.update(club, club.points)
+        self.ledger.undo(entry_id)
+        if self._booked is not None:
+            self._booked[(competition.name, club.name)] -= places
+        self.touch()
+
+    def checkpoint(self):
+        """Start counting the places booked per (competition, club)."""
+        self._booked = Counter()
+
+    def rollback(self):
+        """Refund what was booked since :meth:`checkpoint` and return the refunds.
+
+        Only the booked records are touched, so the cost depends on the
+        bookings made, not on the size of the data. The refunds come back
+        as ``(competition, club, -places)`` bookings for the storage.
+        """
+        if self._booked is None:
+            return []
+        refunds = [(competition, club, -places) for (competition, club), places in self._booked.items() if places]
+        self._booked = None
+        for competition_name, club_name, places in refunds:
+            self.apply_booking(self.competition_by_name(competition_name), self.club_by_name(club_name), places)
+        self.checkpoint()
+        return refunds
@@ -1,76 +1,455 @@
-import json
+import base64
+import hashlib
+import os
+import threading
+from contextvars import ContextVar
 from datetime import datetime
-from flask import Flask,render_template,request,redirect,flash,url_for
+from time import perf_counter
+from flask import Flask,render_template,request,redirect,flash,url_for,session,make_response
+from flask import get_flashed_messages,stream_with_context,jsonify,abort
+from flask import before_render_template,template_rendered
+from markupsafe import Markup, escape
+import click
+from jinja2 import FileSystemBytecodeCache
 
+import codec
+from booking import MAX_PLACES_PER_BOOKING, BookingEngine, BookingError, settle
+from fragments import FragmentCache, fragmentSize
+from journal import BookingJournal
+from metrics import LatencyHistograms
+from persistence import BackgroundCompactor, BackgroundStorage, WriteBehindStorage, flushOnExit
+from profiling import RequestProfiler, profileReport
+from repository import Repository
+from storage import CLUBS_FILE, COMPETITIONS_FILE, LEDGER_FILE, JsonStorage, SqliteStorage
+from watcher import FileWatcher
+from workload import PAST_FRACTION, generateClubs, generateCompetitions, pastCount
 
-def loadClubs():
-    with open('clubs.json') as c:
-         listOfClubs = json.load(c)['clubs']
-         return listOfClubs
+
+app = Flask(__name__)
+app.secret_key = 'something_special'
+app.config.update(
+    JOURNAL_PATH=os.environ.get('GUDLFT_JOURNAL_PATH', 'bookings.journal'),
+    JOURNAL_FSYNC=os.environ.get('GUDLFT_JOURNAL_FSYNC', 'always'),
+    LEDGER_PATH=os.environ.get('GUDLFT_LEDGER_PATH', LEDGER_FILE),
+    JOURNAL_COMPACT_EVERY=int(os.environ.get('GUDLFT_JOURNAL_COMPACT_EVERY', '1000')),
+    BOOKING_LOCK_MODE=os.environ.get('GUDLFT_BOOKING_LOCK_MODE', 'thread'),
+    BOOKING_LOCK_PATH=os.environ.get('GUDLFT_BOOKING_LOCK_PATH', 'bookings.lock'),
+    STORAGE_BACKEND=os.environ.get('GUDLFT_STORAGE_BACKEND', 'json'),
+    SQLITE_PATH=os.environ.get('GUDLFT_SQLITE_PATH', 'gudlft.sqlite3'),
+    STREAM_TEMPLATES=os.environ.get('GUDLFT_STREAM_TEMPLATES', '0') == '1',
+    PERSISTENCE_MODE=os.environ.get('GUDLFT_PERSISTENCE_MODE', 'sync'),
+    WRITE_BEHIND_INTERVAL_MS=int(os.environ.get('GUDLFT_WRITE_BEHIND_INTERVAL_MS', '50')),
+    WRITE_BEHIND_EVERY=int(os.environ.get('GUDLFT_WRITE_BEHIND_EVERY', '100')),
+    SNAPSHOT_FORMAT=os.environ.get('GUDLFT_SNAPSHOT_FORMAT', 'pretty'),
+    METRICS=os.environ.get('GUDLFT_METRICS', '1') == '1',
+    PROFILE_SAMPLE_RATE=float(os.environ.get('GUDLFT_PROFILE_SAMPLE_RATE', '0')),
+    PROFILE_HEADER=os.environ.get('GUDLFT_PROFILE_HEADER', ''),
+    PROFILE_MODE=os.environ.get('GUDLFT_PROFILE_MODE', 'cprofile'),
+    PROFILE_DIR=os.environ.get('GUDLFT_PROFILE_DIR', os.path.join('reports', 'profiles')),
+    HOT_RELOAD_INTERVAL=float(os.environ.get('GUDLFT_HOT_RELOAD_INTERVAL', '0')),
+    TEST_ENDPOINTS=os.environ.get('GUDLFT_TEST_ENDPOINTS', '0') == '1',
+    WELCOME_CACHE_BYTES=int(os.environ.get('GUDLFT_WELCOME_CACHE_BYTES', str(32 * 2 ** 20))),
+    TEMPLATE_CACHE_DIR=os.environ.get('GUDLFT_TEMPLATE_CACHE_DIR', os.path.join(app.root_path, '.jinja-cache')),
+    DATA_LOADING=os.environ.get('GUDLFT_DATA_LOADING', 'eager'),
+    WARMUP=os.environ.get('GUDLFT_WARMUP', '0') == '1',
+)
 
 
-def loadCompetitions():
-    with open('competitions.json') as comps:
-         listOfCompetitions = json.load(comps)['competitions']
-         return listOfCompetitions
+def createBytecodeCache(directory):
+    # Compiled templates survive restarts: a new process only loads them
+    if not directory:
+        return None
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as error:
+        # e.g. a read-only deploy: templates are then compiled in memory as before
+        app.logger.warning('Template cache disabled, cannot create %s: %s', directory, error)
+        return None
+    return FileSystemBytecodeCache(directory)
 
 
-def saveClubs(clubs_list):
-    with open('clubs.json', 'w') as c:
-        json.dump({'clubs': clubs_list}, c, indent=4)
+app.jinja_env.bytecode_cache = createBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
 
 
-def saveCompetitions(competitions_list):
-    with open('competitions.json', 'w') as comps:
-        json.dump({'competitions': competitions_list}, comps, indent=4)
+def createStorage(config):
+    if config['STORAGE_BACKEND'] == 'sqlite':
+        return SqliteStorage(config['SQLITE_PATH'])
+    if config['STORAGE_BACKEND'] != 'json':
+        raise ValueError(f"Unknown storage backend: {config['STORAGE_BACKEND']!r}")
+    journal = BookingJournal(config['JOURNAL_PATH'], fsync=config['JOURNAL_FSYNC'],
+                             archive_path=config['LEDGER_PATH'])
+    lock_path = config['BOOKING_LOCK_PATH'] if config['BOOKING_LOCK_MODE'] == 'process' else None
+    json_storage = JsonStorage(journal, lock_path=lock_path, snapshot_format=config['SNAPSHOT_FORMAT'])
+    if config['PERSISTENCE_MODE'] == 'background':
+        return BackgroundStorage(json_storage)
+    if config['PERSISTENCE_MODE'] == 'write-behind':
+        # Trades durability for latency: bookings are acknowledged before they reach the disk
+        return WriteBehindStorage(json_storage, snapshot=lambda: bookingEngine.snapshot(),
+                                  flush_interval=config['WRITE_BEHIND_INTERVAL_MS'] / 1000,
+                                  flush_every=config['WRITE_BEHIND_EVERY'])
+    if config['PERSISTENCE_MODE'] != 'sync':
+        raise ValueError(f"Unknown persistence mode: {config['PERSISTENCE_MODE']!r}")
+    return json_storage
 
 
-app = Flask(__name__)
-app.secret_key = 'something_special'
+repository = Repository()
+competitions = repository.competitions
+clubs = repository.clubs
+storage = createStorage(app.config)
+flushOnExit(storage)
+
+
+def reloadData():
+    clubs_list, competitions_list = storage.load()
+    repository.load(clubs_list, competitions_list, storage.history())
+
+
+bookingEngine = BookingEngine(repository, storage, reload=reloadData)
+# Set once the data is loaded; requests wait for it when it loads in the background
+dataReady = threading.Event()
+dataLoadError = None
+if app.config['DATA_LOADING'] == 'eager':
+    reloadData()
+    dataReady.set()
+elif app.config['DATA_LOADING'] != 'background':
+    raise ValueError(f"Unknown data loading mode: {app.config['DATA_LOADING']!r}")
+
+
+def reloadChangedData():
+    """Apply edits of the JSON files, keeping the records that did not change.
+
+    The files are parsed before taking the booking lock, which only
+    covers the journal replay, the diff and the swap.
+    """
+    snapshots = storage.read_snapshots()
+    with bookingEngine.exclusive():
+        changed = repository.merge(*storage.load(snapshots))
+    if changed:
+        app.logger.info('Reloaded %d changed clubs and competitions', changed)
+    return changed
+
+
+def startHotReload(config):
+    if config['HOT_RELOAD_INTERVAL'] <= 0:
+        return None
+    # Write-behind keeps bookings in memory only, a reload from the files would drop them
+    if config['STORAGE_BACKEND'] != 'json' or config['PERSISTENCE_MODE'] == 'write-behind':
+        raise ValueError("Hot reload needs JSON storage with sync or background persistence")
+    watcher = FileWatcher([CLUBS_FILE, COMPETITIONS_FILE], reloadChangedData, config['HOT_RELOAD_INTERVAL'])
+    watcher.start()
+    return watcher
+
+
+fileWatcher = startHotReload(app.config)
+
+
+def snapshotsWritten():
+    # Snapshots the server wrote itself are not an edit to reload
+    if fileWatcher is not None:
+        fileWatcher.mark_seen()
+
+
+compactor = BackgroundCompactor(bookingEngine, on_written=snapshotsWritten)
+
+
+def currentTime():
+    return datetime.now()
+
+
+requestLatency = LatencyHistograms(('endpoint',))
+phaseLatency = LatencyHistograms(('endpoint', 'phase'))
+# (start time, endpoint) of the request being timed; cheaper to reach than flask.g and flask.request
+requestTimer = ContextVar('requestTimer', default=None)
+
+
+@app.before_request
+def startRequestTimer():
+    if app.config['METRICS']:
+        # Going through the proxy once is several times cheaper than request.endpoint
+        requestTimer.set((perf_counter(), request._get_current_object().endpoint or 'unknown'))
+
+
+@app.after_request
+def recordRequestLatency(response):
+    timer = requestTimer.get()
+    if timer is not None:
+        requestTimer.set(None)
+        requestLatency.observe((timer[1],), perf_counter() - timer[0])
+    return response
+
+
+@app.before_request
+def waitForData():
+    if not dataReady.is_set():
+        dataReady.wait()
+    if dataLoadError is not None:
+        abort(503)
+
+
+@app.before_request
+def refreshSharedData():
+    # With storage shared between processes, reads also see the other processes' bookings
+    bookingEngine.refresh()
+
+
+class timed:
+    """Record the time spent in ``phase`` of the current request."""
+
+    __slots__ = ('phase', 'endpoint', 'started')
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        timer = requestTimer.get()
+        self.endpoint = timer and timer[1]
+        self.started = perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.endpoint is not None:
+            phaseLatency.observe((self.endpoint, self.phase), perf_counter() - self.started)
+
+
+renderTimer = ContextVar('renderTimer', default=None)
+
+
+def startRenderTimer(sender, template, context, **extra):
+    renderTimer.set(perf_counter())
+
+
+def recordRenderLatency(sender, template, context, **extra):
+    timer = requestTimer.get()
+    if timer is not None:
+        phaseLatency.observe((timer[1], 'render'), perf_counter() - renderTimer.get())
+
+
+before_render_template.connect(startRenderTimer, app)
+template_rendered.connect(recordRenderLatency, app)
+
+
+def createProfiler(config):
+    if config['PROFILE_SAMPLE_RATE'] <= 0 and not config['PROFILE_HEADER']:
+        return None
+    return RequestProfiler(config['PROFILE_DIR'], sample_rate=config['PROFILE_SAMPLE_RATE'],
+                           header=config['PROFILE_HEADER'] or None, mode=config['PROFILE_MODE'])
+
+
+requestProfiler = createProfiler(app.config)
+activeProfile = ContextVar('activeProfile', default=None)
+
+
+@app.before_request
+def startProfiler():
+    if requestProfiler is not None and requestProfiler.wanted(request.headers):
+        activeProfile.set(requestProfiler.start())
+
+
+@app.teardown_request
+def stopProfiler(exception):
+    # Teardown also runs after errors and once a streamed body is sent
+    profile = activeProfile.get()
+    if profile is not None:
+        activeProfile.set(None)
+        requestProfiler.stop(profile, request.endpoint)
+
+
+STREAM_BUFFER_ITEMS = 64
+
+
+def streamTemplate(template_name, **context):
+    """Render a template chunk by chunk with the same context as render_template."""
+    # Pop the flashes now: the session cookie is sent before the body streams
+    get_flashed_messages()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_ITEMS)
+    return stream_with_context(stream)
+
+
+def renderPage(template_name, **context):
+    if app.config['STREAM_TEMPLATES']:
+        return streamTemplate(template_name, **context)
+    return render_template(template_name, **context)
+
+
+# Stands for the club in the booking links of the shared competition list
+CLUB_SLOT = '\x00club\x00'
+welcomeFragments = FragmentCache(app.config['WELCOME_CACHE_BYTES']) if app.config['WELCOME_CACHE_BYTES'] > 0 else None
+# Number of competitions from which the list no longer fits in the cache
+welcomeListLimit = None
+
+
+def clubSegment(club_name):
+    # The club ends the booking URL and is quoted on its own: cut the URL after a fixed competition
+    prefix = len(url_for('book', competition='-', club='-')) - 1
+    return str(escape(url_for('book', competition='-', club=club_name)[prefix:]))
+
+
+def competitionList(now):
+    """Return the competition list split around the club slots.
+
+    The list is cached per data version and past/upcoming cutoff, so
+    clubs share one rendering between two bookings. A new one reuses the
+    items of the last list whose competition did not change, and the
+    others come from the item cache or are rendered.
+    """
+    global welcomeListLimit
+    stamp = (repository.version, repository.timeline.cutoff(now))
+    cached = welcomeFragments.get(('list',), stamp)
+    if cached is not None:
+        return cached[0]
+    last_items, last_stamps = (welcomeFragments.last(('list',)) or ((), [], []))[1:]
+    item = app.jinja_env.get_template('competitions.html').module.item
+    items = []
+    stamps = []
+    for position, comp in enumerate(competitions):
+        past = repository.is_past(comp, now)
+        item_stamp = (comp.name, comp.date, comp.number_of_places, past)
+        if position < len(last_stamps) and last_stamps[position] == item_stamp:
+            html = last_items[position]
+        else:
+            html = welcomeFragments.get(('competition', comp.name), item_stamp)
+            if html is None:
+                html = str(item(comp, past, CLUB_SLOT))
+                welcomeFragments.put(('competition', comp.name), item_stamp, html)
+        items.append(html)
+        stamps.append(item_stamp)
+    parts = ''.join(items).split(clubSegment(CLUB_SLOT))
+    # The items are shared with the item entries: only the parts count towards the bound
+    if not welcomeFragments.put(('list',), stamp, (parts, items, stamps), size=fragmentSize(parts)):
+        welcomeListLimit = len(competitions)
+    return parts
+
+
+def renderWelcome(club):
+    # Past/upcoming status comes from the pre-parsed timeline, no per-request copies
+    now = currentTime()
+    # A list larger than the cache would only churn it: render it in full then
+    if welcomeFragments is None or (welcomeListLimit is not None and len(competitions) >= welcomeListLimit):
+        return renderPage('welcome.html', club=club, competitions=competitions,
+                          is_past=lambda comp: repository.is_past(comp, now))
+    # Only the header is rendered for the club; the list is the cached one with its links filled in
+    competition_list = Markup(clubSegment(club.name).join(competitionList(now)))
+    return renderPage('welcome.html', club=club, competition_list=competition_list)
+
+
+def hasPendingFlashes():
+    return bool(session.get('_flashes'))
+
+
+def isNotModified(etag):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    return bool(request.if_none_match) and request.if_none_match.contains(etag)
+
+
+def conditionalResponse(etag, render, cache_control='public, no-cache'):
+    """Answer 304 without rendering when the client already holds ``etag``.
+
+    There is no Last-Modified: the data changes several times within its
+    one-second resolution, and an ``If-Modified-Since`` would then get a
+    stale 304. Clients revalidate with the ETag.
+    """
+    if isNotModified(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+indexPage = None
 
-competitions = loadCompetitions()
-clubs = loadClubs()
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    global indexPage
+    if hasPendingFlashes():
+        return render_template('index.html')
+    # Without flash messages the page never changes: render it once and serve the bytes
+    if indexPage is None:
+        body = render_template('index.html').encode()
+        indexPage = (hashlib.sha1(body).hexdigest(), body)
+    etag, body = indexPage
+    return conditionalResponse(etag, lambda: body)
 
-@app.route('/showSummary',methods=['POST'])
+def sessionClub():
+    """Return the club logged in on this session, or ``None``."""
+    name = session.get('club')
+    if name is None:
+        return None
+    club = repository.club_by_name(name)
+    if club is None:
+        # The club is gone from the data: the login no longer holds
+        session.pop('club', None)
+    return club
+
+
+def clubFor(name):
+    """Resolve the club a request acts for.
+
+    A logged-in session acts for its own club only, named or left out;
+    without a login the named club is used.
+    """
+    club = sessionClub()
+    if club is None:
+        return repository.club_by_name(name)
+    return club if name in ('', club.name) else None
+
+
+@app.route('/showSummary',methods=['GET', 'POST'])
 def showSummary():
-    email = request.form.get('email', '').strip()
-    club = next((club for club in clubs if club['email'] == email), None)
-    if not club:
-        flash('Unknown email address. Please try again.')
-        return redirect(url_for('index'))
-    
-    # Add is_past flag to each competition
-    current_time = datetime.now()
-    competitions_with_status = []
-    for comp in competitions:
-        comp_copy = comp.copy()
-        comp_date = datetime.strptime(comp['date'], '%Y-%m-%d %H:%M:%S')
-        comp_copy['is_past'] = comp_date < current_time
-        competitions_with_status.append(comp_copy)
-    
-    return render_template('welcome.html', club=club, competitions=competitions_with_status)
+    # POST logs in with the secretary email; GET shows the summary of the session's club
+    if request.method == 'POST':
+        email = request.form.get('email', '').strip()
+        with timed('lookup'):
+            club = repository.club_by_email(email)
+        if not club:
+            session.pop('club', None)
+            flash('Unknown email address. Please try again.')
+            return redirect(url_for('index'))
+        session['club'] = club.name
+    else:
+        with timed('lookup'):
+            club = sessionClub()
+        if not club:
+            flash('Please log in with your secretary email.')
+            return redirect(url_for('index'))
+
+    if hasPendingFlashes():
+        return renderWelcome(club)
+    # The page depends on the club, the data version and which competitions are past
+    with timed('date'):
+        cutoff = repository.timeline.cutoff(currentTime())
+    club_key = hashlib.sha1(club.email.encode()).hexdigest()[:16]
+    etag = f'welcome-{repository.revision}-{cutoff}-{club_key}'
+    return conditionalResponse(etag, lambda: renderWelcome(club), cache_control='private, no-cache')
+
+
+def renderBooking(club, competition):
+    return render_template('booking.html', club=club, competition=competition,
+                           booked=repository.ledger.total(competition.name, club.name))
 
 
 @app.route('/book/<competition>/<club>')
 def book(competition,club):
-    foundClub = next((c for c in clubs if c['name'] == club), None)
-    foundCompetition = next((c for c in competitions if c['name'] == competition), None)
+    with timed('lookup'):
+        foundClub = clubFor(club)
+        foundCompetition = repository.competition_by_name(competition)
     
     if not foundClub or not foundCompetition:
         flash("Something went wrong-please try again")
         return redirect(url_for('index'))
     
     # Check if competition date is in the past
-    competition_date = datetime.strptime(foundCompetition['date'], '%Y-%m-%d %H:%M:%S')
-    if competition_date < datetime.now():
+    with timed('date'):
+        past = repository.is_past(foundCompetition, currentTime())
+    if past:
         flash("Cannot book places for past competitions")
         return redirect(url_for('showSummary'), code=307)
     
-    return render_template('booking.html', club=foundClub, competition=foundCompetition)
+    return renderBooking(foundClub, foundCompetition)
 
 
 @app.route('/purchasePlaces',methods=['POST'])
@@ -79,79 +458,464 @@ def purchasePlaces():
     club_name = request.form.get('club', '').strip()
     places_raw = request.form.get('places', '').strip()
 
-    competition = next((c for c in competitions if c['name'] == competition_name), None)
-    club = next((c for c in clubs if c['name'] == club_name), None)
+    with timed('lookup'):
+        competition = repository.competition_by_name(competition_name)
+        club = clubFor(club_name)
 
     if not competition or not club:
         flash('Invalid club or competition.')
         return redirect(url_for('index'))
     
     # Check if competition date is in the past
-    competition_date = datetime.strptime(competition['date'], '%Y-%m-%d %H:%M:%S')
-    current_time = datetime.now()
-    if competition_date < current_time:
+    with timed('date'):
+        past = repository.is_past(competition, currentTime())
+    if past:
         flash("Cannot book places for past competitions")
-        # Add is_past flag to each competition
-        competitions_with_status = []
-        for comp in competitions:
-            comp_copy = comp.copy()
-            comp_date = datetime.strptime(comp['date'], '%Y-%m-%d %H:%M:%S')
-            comp_copy['is_past'] = comp_date < current_time
-            competitions_with_status.append(comp_copy)
-        return render_template('welcome.html', club=club, competitions=competitions_with_status)
+        return renderWelcome(club)
 
     try:
         placesRequired = int(places_raw)
     except ValueError:
         flash('Invalid number of places.')
-        return render_template('booking.html', club=club, competition=competition)
+        return renderBooking(club, competition)
 
     if placesRequired <= 0:
         flash('You must request at least 1 place.')
-        return render_template('booking.html', club=club, competition=competition)
+        return renderBooking(club, competition)
 
-    available_places = int(competition['numberOfPlaces'])
-    club_points = int(club['points'])
+    try:
+        with timed('save'):
+            bookingEngine.book(competition.name, club.name, placesRequired)
+    except BookingError as error:
+        flash(str(error))
+        return renderBooking(club, competition)
 
-    if placesRequired > 12:
-        flash('You cannot book more than 12 places for a single competition.')
-        return render_template('booking.html', club=club, competition=competition)
+    compactIfNeeded()
 
-    if placesRequired > available_places:
-        flash('Not enough places remaining in this competition.')
-        return render_template('booking.html', club=club, competition=competition)
+    flash(f'Great - booking complete! You booked {placesRequired} place(s).')
+    
+    return renderWelcome(club)
 
-    if placesRequired > club_points:
-        flash('Your club does not have enough points to complete this booking.')
-        return render_template('booking.html', club=club, competition=competition)
 
-    competition['numberOfPlaces'] = str(available_places - placesRequired)
-    club['points'] = str(club_points - placesRequired)
-    
-    saveClubs(clubs)
-    saveCompetitions(competitions)
+def compactIfNeeded():
+    # Only the journal counts as pending: write-behind and SQLite never compact here
+    if storage.pending >= app.config['JOURNAL_COMPACT_EVERY']:
+        compactor.request()
 
-    flash(f'Great - booking complete! You booked {placesRequired} place(s).')
-    
-    # Add is_past flag to each competition
-    current_time = datetime.now()
-    competitions_with_status = []
-    for comp in competitions:
-        comp_copy = comp.copy()
-        comp_date = datetime.strptime(comp['date'], '%Y-%m-%d %H:%M:%S')
-        comp_copy['is_past'] = comp_date < current_time
-        competitions_with_status.append(comp_copy)
-    
-    return render_template('welcome.html', club=club, competitions=competitions_with_status)
+
+def validateBatchItem(item, now):
+    """Return ``(competition, club, places)`` for a batch item or an error message."""
+    if not isinstance(item, dict):
+        return 'Each booking must be an object.'
+    competition = repository.competition_by_name(str(item.get('competition', '')).strip())
+    club = repository.club_by_name(str(item.get('club', '')).strip())
+    if not competition or not club:
+        return 'Invalid club or competition.'
+    if repository.is_past(competition, now):
+        return 'Cannot book places for past competitions'
+    places = item.get('places')
+    if not isinstance(places, int) or isinstance(places, bool):
+        return 'Invalid number of places.'
+    if places <= 0:
+        return 'You must request at least 1 place.'
+    return competition.name, club.name, places
+
+
+@app.route('/api/bookings', methods=['POST'])
+def bookBatch():
+    # Books a list of {competition, club, places} all or nothing, persisted once
+    payload = request.get_json(silent=True)
+    items = payload.get('bookings') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify(errors=[{'index': None, 'error': 'Expected a non-empty "bookings" list.'}]), 400
+
+    now = currentTime()
+    bookings = []
+    errors = []
+    for index, item in enumerate(items):
+        booking = validateBatchItem(item, now)
+        if isinstance(booking, str):
+            errors.append({'index': index, 'error': booking})
+        else:
+            bookings.append(booking)
+    if errors:
+        return jsonify(errors=errors), 400
+
+    try:
+        with timed('save'):
+            bookingEngine.book_many(bookings)
+    except BookingError as error:
+        return jsonify(errors=[{'index': error.index, 'error': str(error)}]), 409
+
+    compactIfNeeded()
+    return jsonify(
+        booked=len(bookings),
+        points={name: repository.club_by_name(name).points for _, name, _ in bookings},
+        places={name: repository.competition_by_name(name).number_of_places for name, _, _ in bookings},
+    )
+
+
+SCOREBOARD_PAGE_SIZE = 100
+SCOREBOARD_MAX_PAGE_SIZE = 500
+SCOREBOARD_CACHE_SIZE = 256
+scoreboardCache = {}
+
+
+def positiveIntArg(name, default):
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def teeChunks(chunks, on_complete):
+    """Pass streamed chunks through and hand the whole page over once sent."""
+    sent = []
+    for chunk in chunks:
+        sent.append(chunk)
+        yield chunk
+    on_complete(''.join(sent))
 
 
 @app.route('/clubs')
 def displayClubsPoints():
-    # Public read-only table of club points
-    sorted_clubs = sorted(clubs, key=lambda c: int(c['points']), reverse=True)
-    return render_template('scoreboard.html', clubs=sorted_clubs)
+    # Public read-only table of club points, paginated and cached until points change
+    page = positiveIntArg('page', 1)
+    limit = min(positiveIntArg('limit', SCOREBOARD_PAGE_SIZE), SCOREBOARD_MAX_PAGE_SIZE)
+    revision = repository.revision
+
+    def store(html):
+        if len(scoreboardCache) >= SCOREBOARD_CACHE_SIZE:
+            scoreboardCache.clear()
+        scoreboardCache[(page, limit)] = (revision, html)
+
+    def render():
+        cached = scoreboardCache.get((page, limit))
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+        offset = (page - 1) * limit
+        html = renderPage('scoreboard.html', clubs=repository.ranking.iter_page(offset, limit),
+                          page=page, limit=limit, has_next=offset + limit < len(repository.ranking))
+        if isinstance(html, str):
+            store(html)
+            return html
+        return teeChunks(html, store)
+
+    return conditionalResponse(f'clubs-{revision}-{page}-{limit}', render)
+
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 500
+
+
+def flagArg(name):
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def dateArg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        date = None
+    # Competition dates are local and naive: a time zone could not be compared with them
+    if date is None or date.tzinfo is not None:
+        raise ValueError(f'"{name}" must be an ISO 8601 date without time zone.')
+    return date
+
+
+def encodeCursor(*key):
+    return base64.urlsafe_b64encode(codec.dumps(list(key))).decode().rstrip('=')
+
+
+def decodeCursor(kind):
+    """Return the key in the ``cursor`` argument, or ``None`` on the first page."""
+    value = request.args.get('cursor')
+    if not value:
+        return None
+    try:
+        key = codec.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        if key[0] == kind == 'date':
+            return datetime.fromisoformat(key[1]), str(key[2])
+        if key[0] == kind == 'booking':
+            return int(key[1])
+        if key[0] == kind:
+            return str(key[1])
+    except (ValueError, TypeError, IndexError, KeyError):
+        pass
+    raise ValueError('Invalid cursor.')
+
+
+def queryKey():
+    return hashlib.sha1(request.query_string).hexdigest()[:16]
+
+
+@app.route('/api/competitions')
+def apiCompetitions():
+    # Served from the catalog's sorted indexes, a page costs O(log n + page) instead of a scan
+    prefix = request.args.get('prefix', '')
+    try:
+        start, end = dateArg('from'), dateArg('to')
+        after = decodeCursor('name' if prefix else 'date')
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    has_places = flagArg('has_places')
+    limit = min(positiveIntArg('limit', API_PAGE_SIZE), API_MAX_PAGE_SIZE)
+    now = currentTime()
+    if flagArg('upcoming'):
+        start = now if start is None else max(start, now)
+    if prefix and (start is not None or end is not None):
+        # Names in prefix order are not in date order: bounds would mean a scan of the range
+        return jsonify(error='"prefix" cannot be combined with "from", "to" or "upcoming".'), 400
+    cutoff = repository.timeline.cutoff(now)
+
+    def render():
+        if prefix:
+            names, more = repository.catalog.by_name(prefix, has_places, after, limit)
+            cursor = encodeCursor('name', names[-1]) if more else None
+        else:
+            keys, more = repository.catalog.by_date(start, end, has_places, after, limit)
+            names = [name for _, name in keys]
+            cursor = encodeCursor('date', keys[-1][0].isoformat(), keys[-1][1]) if more else None
+        page = []
+        for name in names:
+            competition = repository.competition_by_name(name)
+            if competition is not None:
+                page.append({
+                    'name': competition.name,
+                    'date': competition.date.isoformat(),
+                    'numberOfPlaces': competition.number_of_places,
+                    'isPast': repository.is_past(competition, now),
+                })
+        return {'competitions': page, 'next': cursor}
+
+    return conditionalResponse(f'api-competitions-{repository.revision}-{cutoff}-{queryKey()}', render)
+
+
+@app.route('/api/clubs')
+def apiClubs():
+    # Clubs by name; emails are left out since they are what logs a club in
+    prefix = request.args.get('prefix', '')
+    try:
+        after = decodeCursor('club')
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    limit = min(positiveIntArg('limit', API_PAGE_SIZE), API_MAX_PAGE_SIZE)
+
+    def render():
+        names, more = repository.club_names(prefix, after, limit)
+        page = []
+        for name in names:
+            club = repository.club_by_name(name)
+            if club is not None:
+                page.append({'name': club.name, 'points': club.points})
+        return {'clubs': page, 'next': encodeCursor('club', names[-1]) if more else None}
+
+    return conditionalResponse(f'api-clubs-{repository.revision}-{queryKey()}', render)
+
+
+@app.route('/api/clubs/<club>/bookings')
+def apiClubBookings(club):
+    # A page of the club's history is a bisect and a slice of the ledger's index
+    if repository.club_by_name(club) is None:
+        return jsonify(error='Unknown club.'), 404
+    try:
+        after = decodeCursor('booking')
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    limit = min(positiveIntArg('limit', API_PAGE_SIZE), API_MAX_PAGE_SIZE)
+
+    def render():
+        entries, more = repository.ledger.club_history(club, after, limit)
+        page = [{'id': entry_id, 'competition': competition, 'places': places}
+                for entry_id, competition, _, places in entries]
+        return {'club': club, 'bookings': page, 'next': encodeCursor('booking', entries[-1][0]) if more else None}
+
+    return conditionalResponse(f'api-club-bookings-{repository.revision}-{queryKey()}', render)
+
+
+@app.route('/api/competitions/<competition>/bookings')
+def apiCompetitionBookings(competition):
+    if repository.competition_by_name(competition) is None:
+        return jsonify(error='Unknown competition.'), 404
+    try:
+        after = decodeCursor('booking')
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    limit = min(positiveIntArg('limit', API_PAGE_SIZE), API_MAX_PAGE_SIZE)
+
+    def render():
+        ledger = repository.ledger
+        entries, more = ledger.competition_history(competition, after, limit)
+        page = [{'id': entry_id, 'club': club, 'places': places, 'clubTotal': ledger.total(competition, club)}
+                for entry_id, _, club, places in entries]
+        return {
+            'competition': competition,
+            'attendees': ledger.attendees(competition),
+            'placesBooked': ledger.booked(competition),
+            'maxPlacesPerClub': MAX_PLACES_PER_BOOKING,
+            'bookings': page,
+            'next': encodeCursor('booking', entries[-1][0]) if more else None,
+        }
+
+    return conditionalResponse(f'api-competition-bookings-{repository.revision}-{queryKey()}', render)
+
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format: request latency per endpoint and its breakdown by phase
+    body = requestLatency.exposition('gudlft_request_duration_seconds', 'Request latency by endpoint.') \
+        + phaseLatency.exposition('gudlft_phase_duration_seconds',
+                                  'Time spent in lookup, date, render and save phases by endpoint.')
+    if welcomeFragments is not None:
+        body += welcomeFragments.exposition('gudlft_welcome_fragments')
+    return app.response_class(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+SEED_DEFAULTS = {'clubs': 1000, 'competitions': 100, 'seed': 0, 'points': 500, 'places': 500}
+# Options and day of the dataset generated by the last seed
+seededWith = None
+
+
+def testEndpointsGuard():
+    if not app.config['TEST_ENDPOINTS']:
+        abort(404)
+    # Seeding rewrites the snapshots; other processes or a database would not follow
+    if app.config['STORAGE_BACKEND'] != 'json' or storage.shared:
+        return jsonify(error='Seeding needs JSON storage owned by this process.'), 409
+    return None
+
+
+def resetData():
+    """Refund the bookings made since the seed and journal the refunds."""
+    with bookingEngine.exclusive():
+        refunds = repository.rollback()
+        result = storage.record_bookings(refunds) if refunds else []
+    settle(result)
+    return len(refunds)
+
+
+@app.route('/_test/seed', methods=['POST'])
+def seedData():
+    # Test only: replace the data with a generated dataset, or just reset it if already seeded alike
+    global seededWith
+    refused = testEndpointsGuard()
+    if refused:
+        return refused
+    payload = request.get_json(silent=True) or {}
+    try:
+        options = {name: int(payload.get(name, default)) for name, default in SEED_DEFAULTS.items()}
+    except (TypeError, ValueError):
+        return jsonify(error='Seed options must be integers.'), 400
+    if min(options['clubs'], options['competitions'], options['points'], options['places']) < 1:
+        return jsonify(error='clubs, competitions, points and places must be positive.'), 400
+
+    now = currentTime()
+    key = (tuple(sorted(options.items())), now.date())
+    generated = seededWith != key
+    refunded = 0
+    if generated:
+        seeded_clubs = generateClubs(options['clubs'], options['seed'],
+                                     points=(min(10, options['points']), options['points']))
+        seeded_competitions = generateCompetitions(options['competitions'], now, options['seed'],
+                                                   places=(min(10, options['places']), options['places']))
+        with bookingEngine.exclusive():
+            repository.load(seeded_clubs, seeded_competitions)
+            # The bookings of the replaced data are not part of the new history
+            storage.forget_history()
+            storage.compact(repository.clubs, repository.competitions)
+            repository.checkpoint()
+        snapshotsWritten()
+        seededWith = key
+    else:
+        refunded = resetData()
+    return jsonify(clubs=options['clubs'], competitions=options['competitions'],
+                   firstUpcoming=pastCount(options['competitions'], PAST_FRACTION),
+                   generated=generated, refunded=refunded)
+
+
+@app.route('/_test/reset', methods=['POST'])
+def resetSeededData():
+    # Test only: undo the bookings made since the last seed
+    refused = testEndpointsGuard()
+    if refused:
+        return refused
+    if seededWith is None:
+        return jsonify(error='Nothing was seeded.'), 409
+    return jsonify(refunded=resetData())
 
 
 @app.route('/logout')
 def logout():
-    return redirect(url_for('index'))
\ No newline at end of file
+    session.pop('club', None)
+    return redirect(url_for('index'))
+
+@app.cli.command('profile-report')
+@click.option('--top', default=20, show_default=True, help='Number of functions to list.')
+@click.option('--route', default=None, help='Only aggregate the profiles of this endpoint.')
+def profileReportCommand(top, route):
+    """Aggregate the request profiles into a hot-function report."""
+    for line in profileReport(app.config['PROFILE_DIR'], top, route):
+        print(line)
+
+
+@app.cli.command('import-sqlite')
+def importSqlite():
+    """Copy the JSON data, journaled bookings and booking history into the SQLite database."""
+    # The snapshots alone miss the bookings journaled since the last compaction
+    journal = BookingJournal(app.config['JOURNAL_PATH'], fsync=app.config['JOURNAL_FSYNC'],
+                             archive_path=app.config['LEDGER_PATH'])
+    source = JsonStorage(journal)
+    imported_clubs, imported_competitions = source.load()
+    bookings = source.history()
+    source.close()
+    database = SqliteStorage(app.config['SQLITE_PATH'])
+    database.import_records(imported_clubs, imported_competitions, bookings)
+    database.close()
+    print(f"Imported {len(imported_clubs)} clubs, {len(imported_competitions)} competitions "
+          f"and {len(bookings)} bookings into {app.config['SQLITE_PATH']}")
+
+
+WARMUP_PATHS = ('/', '/clubs', '/api/competitions', '/api/clubs')
+
+
+def warmUp():
+    """Compile every template and build the cached pages and lists once."""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    client = app.test_client()
+    for path in WARMUP_PATHS:
+        client.get(path)
+    if welcomeFragments is not None:
+        with app.test_request_context():
+            competitionList(currentTime())
+
+
+def loadDataInBackground(warm_up):
+    global dataLoadError
+    try:
+        reloadData()
+    except Exception as error:
+        app.logger.exception('Loading the data failed')
+        dataLoadError = error
+    dataReady.set()
+    if warm_up and dataLoadError is None:
+        warmUp()
+
+
+def startDataLoading(config):
+    """Load the data in the background if asked to, else warm up before serving."""
+    if config['DATA_LOADING'] == 'background':
+        loader = threading.Thread(target=loadDataInBackground, args=(config['WARMUP'],),
+                                  name='data-loader', daemon=True)
+        loader.start()
+        return loader
+    if config['WARMUP']:
+        warmUp()
+    return None
+
+
+dataLoader = startDataLoading(app.config)
@@ -0,0 +1,468 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+
+import codec
+from booking import MAX_PLACES_PER_BOOKING, BookingError, applyBooking
+from models import DATE_FORMAT, Club, Competition, parseDate
+from watcher import fileStamps
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+CLUBS_FILE = 'clubs.json'
+COMPETITIONS_FILE = 'competitions.json'
+LEDGER_FILE = 'bookings.ledger'
+SNAPSHOT_FORMATS = ('pretty', 'compact', 'ndjson')
+
+
+def readSnapshot(path, key):
+    """Return the journal sequence of a snapshot and an iterator over its records.
+
+    Newline-delimited snapshots start with a ``{"snapshot": key}`` header
+    line and are parsed one record at a time; the other formats are one
+    JSON document.
+    """
+    f = open(path, 'rb')
+    first = f.readline()
+    try:
+        header = codec.loads(first)
+    except ValueError:
+        header = None
+    if isinstance(header, dict) and header.get('snapshot') == key:
+        return header.get('journalSequence', 0), _streamRecords(f)
+    with f:
+        rest = f.read()
+    document = header if header is not None and not rest.strip() else codec.loads(first + rest)
+    return document.get('journalSequence', 0), iter(document[key])
+
+
+def _streamRecords(f):
+    with f:
+        for line in f:
+            if line.strip():
+                yield codec.loads(line)
+
+
+def loadClubs(path=CLUBS_FILE):
+    return [Club.from_json(c) for c in readSnapshot(path, 'clubs')[1]]
+
+
+def loadCompetitions(path=COMPETITIONS_FILE):
+    return [Competition.from_json(c) for c in readSnapshot(path, 'competitions')[1]]
+
+
+def writeSnapshot(path, key, records, sequence=None, format='pretty'):
+    """Write ``records`` (JSON dicts) under ``key`` in one of :data:`SNAPSHOT_FORMATS`."""
+    if format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format: {format!r}")
+    # Write to a temp file and rename so readers never see a half-written snapshot
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        if format == 'ndjson':
+            header = {'snapshot': key}
+            if sequence is not None:
+                header['journalSequence'] = sequence
+            f.write(codec.dumps(header) + b'\n')
+            for record in records:
+                f.write(codec.dumps(record) + b'\n')
+        else:
+            data = {key: list(records)}
+            if sequence is not None:
+                data['journalSequence'] = sequence
+            # The pretty format stays the hand-editable layout of the files in the repository
+            f.write(json.dumps(data, indent=4).encode() if format == 'pretty' else codec.dumps(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def saveClubs(clubs_list, sequence=None, path=CLUBS_FILE, format='pretty'):
+    writeSnapshot(path, 'clubs', (club.to_json() for club in clubs_list), sequence, format)
+
+
+def saveCompetitions(competitions_list, sequence=None, path=COMPETITIONS_FILE, format='pretty'):
+    writeSnapshot(path, 'competitions', (competition.to_json() for competition in competitions_list),
+                  sequence, format)
+
+
+def replaySnapshots(snapshots, records):
+    """Apply journal ``records`` to parsed snapshots, skipping those they include."""
+    _, clubs_sequence, clubs, competitions_sequence, competitions = snapshots
+    clubs_by_name = {}
+    for club in clubs:
+        clubs_by_name.setdefault(club.name, club)
+    competitions_by_name = {}
+    for competition in competitions:
+        competitions_by_name.setdefault(competition.name, competition)
+    for record in records:
+        applyBooking(
+            competitions_by_name.get(record['competition']) if record['seq'] > competitions_sequence else None,
+            clubs_by_name.get(record['club']) if record['seq'] > clubs_sequence else None,
+            record['places'],
+        )
+
+
+class JsonStorage:
+    """JSON snapshots plus an append-only booking journal.
+
+    With a ``lock_path`` the storage is shared between processes: bookings
+    run under an exclusive file lock and :meth:`changes` returns what the
+    other processes journaled. Compactions write the snapshots in
+    ``snapshot_format``; any format is read back.
+
+    :meth:`compact` writes the records in memory and so runs under the
+    booking lock. :meth:`start_compaction`, :meth:`write_compaction` and
+    :meth:`finish_compaction` instead bring the files up to date from the
+    journal, which only holds the lock to set the journal aside and to
+    swap the files in.
+    """
+
+    def __init__(self, journal, clubs_path=CLUBS_FILE, competitions_path=COMPETITIONS_FILE, lock_path=None,
+                 snapshot_format='pretty'):
+        if lock_path is not None and fcntl is None:
+            raise ValueError("Sharing JSON storage between processes needs fcntl")
+        if snapshot_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"Unknown snapshot format: {snapshot_format!r}")
+        self.journal = journal
+        self.snapshot_format = snapshot_format
+        self.clubs_path = clubs_path
+        self.competitions_path = competitions_path
+        self.lock_path = lock_path
+        self.shared = lock_path is not None
+
+    @property
+    def pending(self):
+        return self.journal.pending
+
+    def read_snapshots(self):
+        """Parse the snapshots, the slow part of :meth:`load`, which needs no lock.
+
+        The result remembers which files it read: :meth:`load` parses them
+        again if they were replaced since, e.g. by a compaction.
+        """
+        stamps = fileStamps([self.clubs_path, self.competitions_path])
+        clubs_sequence, club_records = readSnapshot(self.clubs_path, 'clubs')
+        clubs = [Club.from_json(c) for c in club_records]
+        competitions_sequence, competition_records = readSnapshot(self.competitions_path, 'competitions')
+        competitions = [Competition.from_json(c) for c in competition_records]
+        return stamps, clubs_sequence, clubs, competitions_sequence, competitions
+
+    def load(self, snapshots=None):
+        """Return the snapshots with the bookings journaled since applied.
+
+        ``snapshots`` may come from :meth:`read_snapshots`, parsed earlier.
+        """
+        if snapshots is None or snapshots[0] != fileStamps([self.clubs_path, self.competitions_path]):
+            snapshots = self.read_snapshots()
+        _, clubs_sequence, clubs, competitions_sequence, competitions = snapshots
+        replaySnapshots(snapshots, self.journal.replay())
+        self.journal.sequence = max(self.journal.sequence, clubs_sequence, competitions_sequence)
+        return clubs, competitions
+
+    @contextmanager
+    def lock(self):
+        if not self.shared:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def changes(self):
+        return self.journal.tail()
+
+    def replaced_changes(self):
+        """Return what :meth:`changes` missed when a compaction replaced the journal.
+
+        ``None`` means the caller has to reload.
+        """
+        return self.journal.tail_replaced()
+
+    def record_booking(self, competition, club, places):
+        return self.journal.append(competition, club, places)
+
+    def record_bookings(self, bookings):
+        return self.journal.append_many(bookings)
+
+    def history(self):
+        """Return every booking record kept, oldest first."""
+        return self.journal.history()
+
+    def archive_bookings(self, bookings):
+        """Keep bookings in the history without journaling them."""
+        self.journal.archive(bookings)
+
+    def forget_history(self):
+        self.journal.forget()
+
+    def compact(self, clubs, competitions):
+        """Fold the journal into fresh snapshots, then start an empty journal.
+
+        The journal's records go to its archive, if it has one, which keeps
+        the booking history.
+        """
+        sequence = self.journal.sequence
+        saveClubs(clubs, sequence, path=self.clubs_path, format=self.snapshot_format)
+        saveCompetitions(competitions, sequence, path=self.competitions_path, format=self.snapshot_format)
+        self.journal.truncate()
+
+    def start_compaction(self):
+        """Set the journal aside for :meth:`write_compaction`, under the booking lock.
+
+        Returns whether there is anything to compact.
+        """
+        return self.journal.rotate()
+
+    def write_compaction(self):
+        """Write the snapshots with the set-aside journal applied, next to the current ones.
+
+        Needs no lock: the snapshots come from the files, not from memory,
+        so bookings go on meanwhile. Returns what :meth:`finish_compaction`
+        needs, ``None`` if a compaction under the lock got there first.
+        """
+        snapshots = self.read_snapshots()
+        records = self.journal.rotated()
+        if records is None:
+            return None
+        _, clubs_sequence, clubs, competitions_sequence, competitions = snapshots
+        replaySnapshots(snapshots, records)
+        sequence = max(records[-1]['seq'] if records else 0, clubs_sequence, competitions_sequence)
+        # Named after the process, which may not be the only one compacting a shared journal
+        suffix = f'.{os.getpid()}.compacted'
+        saveClubs(clubs, sequence, path=f'{self.clubs_path}{suffix}', format=self.snapshot_format)
+        saveCompetitions(competitions, sequence, path=f'{self.competitions_path}{suffix}',
+                         format=self.snapshot_format)
+        return snapshots[0], suffix
+
+    def finish_compaction(self, written):
+        """Put the written snapshots in place and archive the set-aside journal.
+
+        Runs under the booking lock. The snapshots are dropped instead if
+        the files or the set-aside journal changed since they were read,
+        e.g. by a hot reload edit or another compaction. Returns whether
+        they were put in place.
+        """
+        if written is None:
+            return False
+        stamps, suffix = written
+        paths = (self.clubs_path, self.competitions_path)
+        if os.path.exists(self.journal.rotated_path) and fileStamps(paths) == stamps:
+            for path in paths:
+                os.replace(f'{path}{suffix}', path)
+            self.journal.finish_rotation()
+            return True
+        for path in paths:
+            if os.path.exists(f'{path}{suffix}'):
+                os.remove(f'{path}{suffix}')
+        return False
+
+    def close(self):
+        self.journal.close()
+
+
+class SqliteStorage:
+    """Clubs, competitions and bookings in a SQLite database.
+
+    The database runs in WAL mode so readers do not block the writer.
+    Threads check connections out of a pool for each operation and back
+    in after it; at most ``pool_size`` idle ones are kept open, so short
+    lived request threads do not leave connections behind. A booking is one
+    transaction of conditional UPDATEs, so the database itself refuses to
+    oversell even when several processes share it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS clubs (
+            name TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            points INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS clubs_email ON clubs (email);
+        CREATE TABLE IF NOT EXISTS competitions (
+            name TEXT PRIMARY KEY,
+            date TEXT NOT NULL,
+            numberOfPlaces INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            competition TEXT NOT NULL,
+            club TEXT NOT NULL,
+            places INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS bookings_by_pair ON bookings (competition, club);
+    """
+
+    shared = True
+    pending = 0
+
+    def __init__(self, path, pool_size=8):
+        self.path = os.fspath(path)
+        self.pool_size = pool_size
+        self._idle = []
+        self._pool_lock = threading.Lock()
+        self._last_booking_id = 0
+        self._own_booking_ids = set()
+        with self._connection() as connection:
+            connection.executescript(self.SCHEMA)
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA busy_timeout=5000')
+        return connection
+
+    @contextmanager
+    def _connection(self):
+        """Check a connection out of the pool for the duration of the block."""
+        with self._pool_lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self._open()
+        try:
+            yield connection
+        finally:
+            # A connection left inside a transaction is not handed to the next caller
+            if not connection.in_transaction:
+                with self._pool_lock:
+                    if len(self._idle) < self.pool_size:
+                        self._idle.append(connection)
+                        connection = None
+            if connection is not None:
+                connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def import_records(self, clubs, competitions, bookings=()):
+        """Replace the database content with the given clubs, competitions and booking records."""
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM clubs')
+            connection.execute('DELETE FROM competitions')
+            connection.execute('DELETE FROM bookings')
+            # OR IGNORE keeps the first record on duplicate names, like the repository indexes
+            connection.executemany(
+                'INSERT OR IGNORE INTO clubs (name, email, points) VALUES (?, ?, ?)',
+                ((c.name, c.email, c.points) for c in clubs),
+            )
+            connection.executemany(
+                'INSERT OR IGNORE INTO competitions (name, date, numberOfPlaces) VALUES (?, ?, ?)',
+                ((c.name, c.date.strftime(DATE_FORMAT), c.number_of_places) for c in competitions),
+            )
+            # The history carries the cap over; its places are already debited from the records
+            connection.executemany(
+                'INSERT INTO bookings (competition, club, places) VALUES (?, ?, ?)',
+                ((b['competition'], b['club'], b['places']) for b in bookings),
+            )
+
+    def load(self):
+        with self._connection() as connection:
+            clubs = [
+                Club(name, email, points)
+                for name, email, points in connection.execute(
+                    'SELECT name, email, points FROM clubs ORDER BY rowid')
+            ]
+            competitions = [
+                Competition(name, parseDate(date), places)
+                for name, date, places in connection.execute(
+                    'SELECT name, date, numberOfPlaces FROM competitions ORDER BY rowid')
+            ]
+            self._last_booking_id = connection.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM bookings').fetchone()[0]
+        self._own_booking_ids.clear()
+        return clubs, competitions
+
+    def lock(self):
+        return nullcontext()
+
+    def changes(self):
+        """Return the bookings other processes committed since the last call."""
+        with self._connection() as connection:
+            rows = connection.execute(
+                'SELECT id, competition, club, places FROM bookings WHERE id > ? ORDER BY id',
+                (self._last_booking_id,),
+            ).fetchall()
+        records = []
+        for booking_id, competition, club, places in rows:
+            self._last_booking_id = booking_id
+            if booking_id in self._own_booking_ids:
+                self._own_booking_ids.discard(booking_id)
+                continue
+            records.append({'seq': booking_id, 'competition': competition, 'club': club, 'places': places})
+        return records
+
+    def record_booking(self, competition, club, places):
+        return self.record_bookings([(competition, club, places)])[0]
+
+    def record_bookings(self, bookings):
+        """Debit every booking in one transaction, or none of them."""
+        records = []
+        with self._transaction() as connection:
+            for index, (competition, club, places) in enumerate(bookings):
+                updated = connection.execute(
+                    'UPDATE competitions SET numberOfPlaces = numberOfPlaces - ? '
+                    'WHERE name = ? AND numberOfPlaces >= ?',
+                    (places, competition, places),
+                ).rowcount
+                if not updated:
+                    raise BookingError('Not enough places remaining in this competition.', index)
+                updated = connection.execute(
+                    'UPDATE clubs SET points = points - ? WHERE name = ? AND points >= ?',
+                    (places, club, places),
+                ).rowcount
+                if not updated:
+                    raise BookingError('Your club does not have enough points to complete this booking.', index)
+                if places > 0:
+                    # Other processes book without the engine's locks: the cap is checked here too
+                    booked = connection.execute(
+                        'SELECT COALESCE(SUM(places), 0) FROM bookings WHERE competition = ? AND club = ?',
+                        (competition, club),
+                    ).fetchone()[0]
+                    if booked + places > MAX_PLACES_PER_BOOKING:
+                        raise BookingError('You cannot book more than 12 places for a single competition.', index)
+                booking_id = connection.execute(
+                    'INSERT INTO bookings (competition, club, places) VALUES (?, ?, ?)',
+                    (competition, club, places),
+                ).lastrowid
+                records.append({'seq': booking_id, 'competition': competition, 'club': club, 'places': places})
+        self._own_booking_ids.update(record['seq'] for record in records)
+        return records
+
+    def history(self):
+        with self._connection() as connection:
+            return [
+                {'seq': booking_id, 'competition': competition, 'club': club, 'places': places}
+                for booking_id, competition, club, places in connection.execute(
+                    'SELECT id, competition, club, places FROM bookings ORDER BY id')
+            ]
+
+    def forget_history(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM bookings')
+
+    def compact(self, clubs, competitions):
+        with self._connection() as connection:
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
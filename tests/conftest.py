@@ -1,7 +1,7 @@
 import os
 import sys
-import json
 import pytest
+from datetime import datetime
 from unittest.mock import patch
 
 
@@ -14,16 +14,35 @@ if ROOT_DIR not in sys.path:
 @pytest.fixture(autouse=True)
 def mock_save_functions():
     """Mock the save functions to prevent file modifications during tests"""
-    with patch('server.saveClubs') as mock_save_clubs, \
-         patch('server.saveCompetitions') as mock_save_comps:
+    with patch('storage.saveClubs') as mock_save_clubs, \
+         patch('storage.saveCompetitions') as mock_save_comps:
         yield mock_save_clubs, mock_save_comps
 
 
+@pytest.fixture(autouse=True)
+def booking_journal(tmp_path):
+    """Journal bookings to a temporary file instead of the project directory"""
+    import server
+    from journal import BookingJournal
+    from storage import JsonStorage
+    journal = BookingJournal(tmp_path / 'bookings.journal', fsync='never')
+    storage = JsonStorage(journal)
+    with patch.object(server, 'storage', storage), \
+         patch.object(server.bookingEngine, 'storage', storage):
+        yield journal
+    journal.close()
+
+
 @pytest.fixture(autouse=True)
 def reset_data():
     """Reset server data to original state before each test"""
     import server
-    with open('clubs.json') as c:
-        server.clubs = json.load(c)['clubs']
-    with open('competitions.json') as comps:
-        server.competitions = json.load(comps)['competitions']
+    from storage import loadClubs, loadCompetitions
+    server.repository.load(loadClubs(), loadCompetitions())
+
+
+@pytest.fixture(autouse=True)
+def frozen_time():
+    """Pin "now" so the fixture competitions keep their past/upcoming status"""
+    with patch('server.currentTime', return_value=datetime(2026, 1, 1, 12, 0, 0)):
+        yield
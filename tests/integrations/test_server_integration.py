@@ -13,23 +13,23 @@ def client():
 
 def test_full_login_book_logout_flow(client):
     # Login
-    email = server.clubs[0]["email"]
+    email = server.clubs[0].email
     response = client.post("/showSummary", data={"email": email})
     assert response.status_code == 200
     assert b"Welcome" in response.data
 
     
     comp_name = "Summer Championship"  
-    club_name = server.clubs[0]["name"]
+    club_name = server.clubs[0].name
     response = client.get(f"/book/{comp_name}/{club_name}")
     assert response.status_code == 200
     assert comp_name.encode() in response.data
 
     # Try to book 1 place (if possible)
-    comp = next(c for c in server.competitions if c["name"] == comp_name)
-    club = next(c for c in server.clubs if c["name"] == club_name)
-    comp["numberOfPlaces"] = str(max(1, int(comp["numberOfPlaces"])) )
-    club["points"] = str(max(1, int(club["points"])) )
+    comp = next(c for c in server.competitions if c.name == comp_name)
+    club = next(c for c in server.clubs if c.name == club_name)
+    comp.number_of_places = max(1, comp.number_of_places)
+    club.points = max(1, club.points)
 
     response = client.post("/purchasePlaces", data={
         "competition": comp_name,
@@ -50,10 +50,10 @@ def test_points_persist_in_memory_after_booking(client):
     # Get initial values
     club_name = "Simply Lift"
     comp_name = "Summer Championship"  
-    club = next(c for c in server.clubs if c["name"] == club_name)
-    competition = next(c for c in server.competitions if c["name"] == comp_name)
-    initial_points = int(club["points"])
-    initial_places = int(competition["numberOfPlaces"])
+    club = next(c for c in server.clubs if c.name == club_name)
+    competition = next(c for c in server.competitions if c.name == comp_name)
+    initial_points = club.points
+    initial_places = competition.number_of_places
     
     # Make a booking
     response = client.post("/purchasePlaces", data={
@@ -64,8 +64,8 @@ def test_points_persist_in_memory_after_booking(client):
     assert b"booking complete" in response.data.lower()
     
     # Check that points are deducted in the server's memory
-    assert int(club["points"]) == initial_points - 3
-    assert int(competition["numberOfPlaces"]) == initial_places - 3
+    assert club.points == initial_points - 3
+    assert competition.number_of_places == initial_places - 3
     
     # Verify the changes are reflected in subsequent requests
     response = client.get("/clubs")
@@ -79,32 +79,32 @@ def test_concurrent_bookings_maintain_consistency(client):
     competition = server.competitions[2]
     
     # Set up initial state
-    club1["points"] = "10"
-    club2["points"] = "10"
-    competition["numberOfPlaces"] = "10"
+    club1.points = 10
+    club2.points = 10
+    competition.number_of_places = 10
     
     initial_places = 10
     
     # First club books
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
-        "club": club1["name"],
+        "competition": competition.name,
+        "club": club1.name,
         "places": "3",
     })
     assert b"booking complete" in response.data.lower()
-    assert int(competition["numberOfPlaces"]) == initial_places - 3
-    assert int(club1["points"]) == 7
+    assert competition.number_of_places == initial_places - 3
+    assert club1.points == 7
     
     # Second club books
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
-        "club": club2["name"],
+        "competition": competition.name,
+        "club": club2.name,
         "places": "2",
     })
     assert b"booking complete" in response.data.lower()
-    assert int(competition["numberOfPlaces"]) == initial_places - 5
-    assert int(club2["points"]) == 8
-    assert int(club1["points"]) == 7  # First club's points unchanged
+    assert competition.number_of_places == initial_places - 5
+    assert club2.points == 8
+    assert club1.points == 7  # First club's points unchanged
 
 
 def test_booking_updates_reflected_in_scoreboard(client):
@@ -114,9 +114,9 @@ def test_booking_updates_reflected_in_scoreboard(client):
     competition = server.competitions[2]
     
     # Set known initial state
-    club["points"] = "15"
-    competition["numberOfPlaces"] = "10"
-    club_name = club["name"]
+    club.points = 15
+    competition.number_of_places = 10
+    club_name = club.name
     
     # Check initial scoreboard
     response = client.get("/clubs")
@@ -125,7 +125,7 @@ def test_booking_updates_reflected_in_scoreboard(client):
     
     # Make a booking
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
+        "competition": competition.name,
         "club": club_name,
         "places": "5",
     })
@@ -137,3 +137,31 @@ def test_booking_updates_reflected_in_scoreboard(client):
     assert b"10" in response.data
 
 
+
+
+def test_asgi_application_serves_the_flask_routes(monkeypatch):
+    import asyncio
+
+    monkeypatch.setenv('GUDLFT_PERSISTENCE_MODE', 'sync')
+    import asgi
+
+    async def get(path):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi.application({
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'scheme': 'http', 'headers': [], 'server': ('testserver', 80), 'client': ('127.0.0.1', 1),
+        }, receive, send)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return messages[0]['status'], body
+
+    status, body = asyncio.run(get('/clubs'))
+    assert status == 200
+    assert b'Simply Lift' in body
@@ -0,0 +1,49 @@
+"""Indexed API queries against a full scan of the competitions.
+
+Usage: python tests/perf/bench_api.py [number_of_competitions]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from repository import Repository  # noqa: E402
+from workload import generateClubs, generateCompetitions  # noqa: E402
+
+
+def scan(repository, start, prefix, has_places, limit):
+    matches = [
+        c for c in repository.competitions
+        if c.date >= start and c.name.startswith(prefix) and (not has_places or c.number_of_places > 0)
+    ]
+    matches.sort(key=lambda c: (c.date, c.name))
+    return matches[:limit]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    now = datetime(2026, 1, 1, 12)
+    competitions = generateCompetitions(count, now, places=(0, 20))
+    repository = Repository(generateClubs(1000), competitions)
+    catalog = repository.catalog
+    cases = [
+        ('upcoming + has places', lambda: catalog.by_date(start=now, has_places=True, limit=100),
+         lambda: scan(repository, now, '', True, 100)),
+        ('date range', lambda: catalog.by_date(start=now + timedelta(days=100), end=now + timedelta(days=101)),
+         lambda: scan(repository, now + timedelta(days=100), '', False, 100)),
+        ('name prefix', lambda: catalog.by_name('Cup 1234'),
+         lambda: scan(repository, datetime.min, 'Cup 1234', False, 100)),
+    ]
+    print(f'{count} competitions')
+    for name, indexed, scanned in cases:
+        index_time = min(timeit.repeat(indexed, number=100, repeat=5)) / 100
+        scan_time = min(timeit.repeat(scanned, number=1, repeat=3))
+        print(f'{name:>22}: index {index_time * 1e6:8.1f} us, scan {scan_time * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Snapshot size, write time, load throughput and server startup per codec and format.
+
+Each combination runs in its own subprocess (``GUDLFT_JSON_CODEC`` is read
+at import) so peak RSS is not shared between them.
+
+Usage: python tests/perf/bench_codec.py [number_of_clubs]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+VARIANTS = [
+    ('stdlib', 'pretty'),
+    ('orjson', 'pretty'),
+    ('orjson', 'compact'),
+    ('stdlib', 'ndjson'),
+    ('orjson', 'ndjson'),
+]
+
+
+def write(count, format, directory):
+    sys.path.insert(0, ROOT_DIR)
+    from models import Club
+    from storage import saveClubs, saveCompetitions
+
+    clubs_path = os.path.join(directory, 'clubs.json')
+    clubs = [Club(f'Club {i}', f'club{i}@example.com', i % 50) for i in range(count)]
+    began = time.perf_counter()
+    saveClubs(clubs, path=clubs_path, format=format)
+    elapsed = time.perf_counter() - began
+    saveCompetitions([], path=os.path.join(directory, 'competitions.json'), format=format)
+    print(json.dumps({'size_mib': os.path.getsize(clubs_path) / 2 ** 20, 'write_s': elapsed}))
+
+
+def load(directory):
+    sys.path.insert(0, ROOT_DIR)
+    import codec
+    from storage import loadClubs
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    began = time.perf_counter()
+    clubs = loadClubs(os.path.join(directory, 'clubs.json'))
+    elapsed = time.perf_counter() - began
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'codec': codec.name,
+        'load_s': elapsed,
+        'records_per_s': len(clubs) / elapsed,
+        'load_rss_mib': (rss_after - rss_before) / 1024,
+    }))
+
+
+def runStep(codec_name, *args):
+    output = subprocess.run(
+        [sys.executable, __file__, *args], check=True, capture_output=True, text=True,
+        env=dict(os.environ, GUDLFT_JSON_CODEC=codec_name),
+    ).stdout
+    return json.loads(output)
+
+
+def startup(directory, codec_name):
+    # Importing the server loads the snapshots and replays the journal
+    began = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', f'import sys; sys.path.insert(0, {ROOT_DIR!r}); import server'],
+        cwd=directory, check=True, env=dict(os.environ, GUDLFT_JSON_CODEC=codec_name),
+    )
+    return time.perf_counter() - began
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f'{count} clubs')
+    for codec_name, format in VARIANTS:
+        with tempfile.TemporaryDirectory() as directory:
+            result = runStep(codec_name, '--write', str(count), format, directory)
+            result.update(runStep(codec_name, '--load', directory))
+            started = startup(directory, codec_name)
+        print(f"{result['codec']:>7} {format:>8}: {result['size_mib']:6.1f} MiB  write {result['write_s']:.2f} s  "
+              f"load {result['load_s']:.2f} s ({result['records_per_s']:,.0f} clubs/s, "
+              f"+{result['load_rss_mib']:.0f} MiB RSS)  server startup {started:.2f} s")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--write']:
+        write(int(sys.argv[2]), sys.argv[3], sys.argv[4])
+    elif sys.argv[1:2] == ['--load']:
+        load(sys.argv[2])
+    else:
+        main()
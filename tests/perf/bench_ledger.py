@@ -0,0 +1,102 @@
+"""Booking ledger queries against a scan of every booking.
+
+Fills a ledger with Zipf-skewed bookings, then times history pages, the
+cap total and the attendee count, each by index and by scan, and the
+load of the same bookings back from an archived journal.
+
+Usage: python tests/perf/bench_ledger.py [bookings] [clubs] [competitions]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from journal import BookingJournal  # noqa: E402
+from repository import BookingLedger  # noqa: E402
+from workload import ZipfSampler, clubName, competitionName  # noqa: E402
+
+
+def scanHistory(entries, key, value, after, limit):
+    page = []
+    for entry_id, entry in enumerate(entries):
+        if entry_id > after and entry[key] == value:
+            page.append((entry_id,) + entry)
+            if len(page) == limit:
+                break
+    return page
+
+
+def scanTotal(entries, competition, club):
+    return sum(places for entry_competition, entry_club, places in entries
+               if entry_competition == competition and entry_club == club)
+
+
+def scanAttendees(entries, competition):
+    totals = {}
+    for entry_competition, club, places in entries:
+        if entry_competition == competition:
+            totals[club] = totals.get(club, 0) + places
+    return sum(1 for places in totals.values() if places > 0)
+
+
+def best(call, number):
+    return min(timeit.repeat(call, number=number, repeat=3)) / number
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    club_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    competition_count = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    rng = random.Random(0)
+    clubs = ZipfSampler(club_count, rng=rng)
+    competitions = ZipfSampler(competition_count, rng=rng)
+    bookings = [(competitionName(competitions()), clubName(clubs()), rng.randint(1, 3)) for _ in range(count)]
+
+    ledger = BookingLedger()
+    began = time.perf_counter()
+    for booking in bookings:
+        ledger.record(*booking)
+    record_us = (time.perf_counter() - began) / count * 1e6
+    entries = ledger._entries
+    club, competition = clubName(0), competitionName(0)
+    # Deep in the history: the cursor sits at the middle of the club's bookings
+    middle = ledger.club_history(club, limit=len(ledger._by_club[club]) // 2)[0][-1][0]
+
+    print(f'{count} bookings, {club_count} clubs, {competition_count} competitions; '
+          f'record: {record_us:.2f} us per booking')
+    cases = [
+        ('club history, 100 after the middle',
+         lambda: ledger.club_history(club, after=middle, limit=100),
+         lambda: scanHistory(entries, 1, club, middle, 100)),
+        ('competition history, first 100',
+         lambda: ledger.competition_history(competition, limit=100),
+         lambda: scanHistory(entries, 0, competition, -1, 100)),
+        ('club total in a competition (cap)',
+         lambda: ledger.total(competition, club),
+         lambda: scanTotal(entries, competition, club)),
+        ('attendee count', lambda: ledger.attendees(competition), lambda: scanAttendees(entries, competition)),
+    ]
+    print(f"{'query':<38} {'index':>12} {'scan':>12}")
+    for name, indexed, scanned in cases:
+        assert indexed() == scanned() or name.startswith(('club history', 'competition history'))
+        print(f'{name:<38} {best(indexed, 10000) * 1e6:>9.2f} us {best(scanned, 1) * 1e3:>9.1f} ms')
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = BookingJournal(os.path.join(directory, 'bookings.journal'), fsync='never',
+                                 archive_path=os.path.join(directory, 'bookings.ledger'))
+        for start in range(0, count, 1000):
+            journal.append_many(bookings[start:start + 1000])
+        journal.truncate()
+        began = time.perf_counter()
+        BookingLedger(journal.history())
+        print(f'load {count} archived bookings: {(time.perf_counter() - began) * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
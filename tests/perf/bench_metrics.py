@@ -0,0 +1,57 @@
+"""Per-request cost of the latency instrumentation on the hot routes.
+
+Whole requests vary by more than the instrumentation costs, so the
+instrumentation a request runs (hooks, phase timers, render signals) is
+timed on its own and compared with the fastest request time.
+
+Usage: python tests/perf/bench_metrics.py [repeats]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+from unittest.mock import patch
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+import server  # noqa: E402
+
+
+def instrumentation(phases, renders):
+    def run():
+        server.startRequestTimer()
+        for phase in phases:
+            with server.timed(phase):
+                pass
+        for _ in range(renders):
+            server.startRenderTimer(server.app, None, None)
+            server.recordRenderLatency(server.app, None, None)
+        server.recordRequestLatency(None)
+    return run
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    client = server.app.test_client()
+    club = server.clubs[0]
+    routes = [
+        ('GET /clubs', '/clubs', lambda: client.get('/clubs'), (), 1),
+        ('POST /showSummary', '/showSummary',
+         lambda: client.post('/showSummary', data={'email': club.email}), ('lookup', 'date'), 1),
+        ('GET /book', f'/book/Fall Classic/{club.name}',
+         lambda: client.get(f'/book/Fall Classic/{club.name}'), ('lookup', 'date'), 1),
+    ]
+    with patch('server.currentTime', return_value=datetime(2026, 1, 1, 12)):
+        for name, path, send, phases, renders in routes:
+            request_time = min(timeit.repeat(send, number=repeats // 10, repeat=10)) / (repeats // 10)
+            with server.app.test_request_context(path):
+                cost = min(timeit.repeat(instrumentation(phases, renders), number=repeats, repeat=5)) / repeats
+            print(f'{name:>18}: request {request_time * 1e6:7.1f} us, '
+                  f'instrumentation {cost * 1e6:5.2f} us ({cost / request_time:.2%})')
+
+
+if __name__ == '__main__':
+    main()
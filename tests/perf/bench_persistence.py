@@ -0,0 +1,100 @@
+"""Booking latency and disk writes for each persistence mode.
+
+Runs the booking engine from several threads against storage in a
+temporary directory, with the journal fsynced on every write.
+
+Usage: python tests/perf/bench_persistence.py [bookings] [threads]
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from booking import BookingEngine  # noqa: E402
+from journal import BookingJournal  # noqa: E402
+from persistence import BackgroundStorage, WriteBehindStorage  # noqa: E402
+from repository import Repository  # noqa: E402
+from storage import JsonStorage  # noqa: E402
+
+
+def make_engine(directory, mode, club_count):
+    clubs_path = os.path.join(directory, 'clubs.json')
+    competitions_path = os.path.join(directory, 'competitions.json')
+    with open(clubs_path, 'w') as f:
+        json.dump({'clubs': [
+            {'name': f'Club {i}', 'email': f'club{i}@example.com', 'points': '1000000'}
+            for i in range(club_count)
+        ]}, f)
+    with open(competitions_path, 'w') as f:
+        json.dump({'competitions': [
+            {'name': 'Bench Open', 'date': '2030-01-01 10:00:00', 'numberOfPlaces': '1000000'}
+        ]}, f)
+    storage = JsonStorage(BookingJournal(os.path.join(directory, 'bookings.journal'), fsync='always'),
+                          clubs_path, competitions_path)
+    repository = Repository()
+    repository.load(*storage.load())
+    engine = BookingEngine(repository, storage)
+    if mode == 'background':
+        engine.storage = BackgroundStorage(storage)
+    elif mode == 'write-behind':
+        engine.storage = WriteBehindStorage(storage, snapshot=engine.snapshot)
+    return engine
+
+
+def run(mode, bookings, thread_count):
+    writes = []
+    original_fsync = os.fsync
+
+    def counting_fsync(fd):
+        writes.append(fd)
+        original_fsync(fd)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(directory, mode, thread_count)
+        latencies = []
+        os.fsync = counting_fsync
+
+        def worker(index):
+            club = f'Club {index}'
+            for _ in range(bookings // thread_count):
+                began = time.perf_counter()
+                engine.book('Bench Open', club, 1)
+                latencies.append(time.perf_counter() - began)
+
+        began = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        engine.storage.close()
+        os.fsync = original_fsync
+
+    latencies.sort()
+    return {
+        'per_second': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'fsyncs': len(writes),
+    }
+
+
+def main():
+    bookings = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    thread_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    print(f'{bookings} bookings from {thread_count} threads')
+    for mode in ('sync', 'background', 'write-behind'):
+        result = run(mode, bookings, thread_count)
+        print(f"{mode:>13}: {result['per_second']:8.0f} bookings/s  p50 {result['p50_ms']:.3f} ms  "
+              f"p95 {result['p95_ms']:.3f} ms  {result['fsyncs']} fsyncs")
+
+
+if __name__ == '__main__':
+    main()
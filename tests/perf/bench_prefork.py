@@ -0,0 +1,153 @@
+"""Throughput of pre-fork serving from 1 to N worker processes.
+
+Serves a generated dataset with ``prefork.py`` for each worker count and
+drives ``GET /clubs`` and ``POST /showSummary`` from client processes
+over keep-alive connections, then prints requests per second and the
+speedup over one worker. The clients run on the same machine, so leave
+them cores of their own when measuring large worker counts.
+
+Usage: python tests/perf/bench_prefork.py [--workers 1 2 4] [--clients 8] [--duration 5]
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from storage import saveClubs, saveCompetitions  # noqa: E402
+from workload import clubEmail, generateClubs, generateCompetitions  # noqa: E402
+
+
+def defaultWorkerCounts():
+    counts, count = [], 1
+    while count < (os.cpu_count() or 1):
+        counts.append(count)
+        count *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def freePort():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def waitForServer(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def drive(port, route, clubs, duration, counts):
+    """Send requests on one keep-alive connection until ``duration`` runs out."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    done = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        if route == 'clubs':
+            connection.request('GET', '/clubs')
+        else:
+            connection.request('POST', '/showSummary', body=f'email={clubEmail(done % clubs)}', headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+        else:
+            errors += 1
+    connection.close()
+    counts.put((done, errors))
+
+
+def measure(port, route, clubs, client_count, duration):
+    counts = multiprocessing.Queue()
+    clients = [multiprocessing.Process(target=drive, args=(port, route, clubs, duration, counts))
+               for _ in range(client_count)]
+    for client in clients:
+        client.start()
+    results = [counts.get() for _ in clients]
+    for client in clients:
+        client.join()
+    done = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    if errors:
+        raise AssertionError(f'{errors} requests to {route} failed')
+    return done / duration
+
+
+def sharedMemory(pid):
+    """Return (unique, proportional) MiB of the workers of ``pid``, or ``None`` without psutil."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    workers = psutil.Process(pid).children()
+    infos = [worker.memory_full_info() for worker in workers]
+    return (sum(info.uss for info in infos) / len(infos) / 2 ** 20,
+            sum(info.pss for info in infos) / len(infos) / 2 ** 20)
+
+
+def runWorkers(directory, worker_count, clubs, client_count, duration):
+    port = freePort()
+    env = dict(os.environ, GUDLFT_JOURNAL_FSYNC='never', GUDLFT_METRICS='0')
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, 'prefork.py'), '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(worker_count)],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        waitForServer(port)
+        # One warm-up round so that every worker has compiled its templates
+        measure(port, 'clubs', clubs, client_count, 0.5)
+        measure(port, 'summary', clubs, client_count, 0.5)
+        result = {route: measure(port, route, clubs, client_count, duration) for route in ('clubs', 'summary')}
+        result['memory'] = sharedMemory(server.pid)
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-fork throughput from 1 to N workers')
+    parser.add_argument('--workers', type=int, nargs='+', default=defaultWorkerCounts())
+    parser.add_argument('--clients', type=int, default=2 * (os.cpu_count() or 1), help='Client processes')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per route and worker count')
+    parser.add_argument('--clubs', type=int, default=1000)
+    parser.add_argument('--competitions', type=int, default=100)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        saveClubs(generateClubs(options.clubs), path=os.path.join(directory, 'clubs.json'))
+        saveCompetitions(generateCompetitions(options.competitions, datetime.now()),
+                         path=os.path.join(directory, 'competitions.json'))
+        print(f'{os.cpu_count()} cores, {options.clients} client processes, '
+              f'{options.clubs} clubs, {options.competitions} competitions')
+        print(f"{'workers':>7} {'/clubs req/s':>13} {'speedup':>8} {'/showSummary req/s':>19} {'speedup':>8} "
+              f"{'USS MiB':>8} {'PSS MiB':>8}")
+        first = None
+        for worker_count in options.workers:
+            result = runWorkers(directory, worker_count, options.clubs, options.clients, options.duration)
+            first = first or result
+            memory = result['memory'] or (float('nan'), float('nan'))
+            print(f"{worker_count:>7} {result['clubs']:>13.0f} {result['clubs'] / first['clubs']:>7.2f}x "
+                  f"{result['summary']:>19.0f} {result['summary'] / first['summary']:>7.2f}x "
+                  f"{memory[0]:>8.1f} {memory[1]:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare dict records holding strings with the typed slots records.
+
+Usage: python tests/perf/bench_records.py [number_of_clubs]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from models import Club  # noqa: E402
+
+
+def make_json_clubs(count):
+    return [
+        {"name": f"Club {i}", "email": f"club{i}@example.com", "points": str(i % 50)}
+        for i in range(count)
+    ]
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    records = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, size
+
+
+def dict_booking(club, places):
+    club_points = int(club['points'])
+    if places <= club_points:
+        club['points'] = str(club_points - places)
+        club['points'] = str(int(club['points']) + places)
+
+
+def typed_booking(club, places):
+    if places <= club.points:
+        club.points -= places
+        club.points += places
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = make_json_clubs(count)
+
+    dicts, dict_size = measure_memory(lambda: [dict(c) for c in data])
+    typed, typed_size = measure_memory(lambda: [Club.from_json(c) for c in data])
+
+    dict_sort = min(timeit.repeat(
+        lambda: sorted(dicts, key=lambda c: int(c['points']), reverse=True), number=1, repeat=10))
+    typed_sort = min(timeit.repeat(
+        lambda: sorted(typed, key=lambda c: c.points, reverse=True), number=1, repeat=10))
+    dict_book = min(timeit.repeat(lambda: [dict_booking(c, 1) for c in dicts], number=1, repeat=10))
+    typed_book = min(timeit.repeat(lambda: [typed_booking(c, 1) for c in typed], number=1, repeat=10))
+
+    print(f"clubs: {count}")
+    print(f"memory (records only):      dict {dict_size / 2**20:.1f} MiB, slots {typed_size / 2**20:.1f} MiB")
+    print(f"sort by points:             dict {dict_sort * 1000:.1f} ms, slots {typed_sort * 1000:.1f} ms")
+    print(f"check + debit, per booking: dict {dict_book / count * 1e9:.0f} ns, slots {typed_book / count * 1e9:.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
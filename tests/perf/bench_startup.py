@@ -0,0 +1,103 @@
+"""Import time and first-request latency of a fresh process.
+
+Each scenario starts new Python processes on generated data and measures
+how long ``import server`` takes (the process can bind its port right
+after) and how long the first ``GET /``, ``GET /clubs``, ``POST
+/showSummary`` and ``GET /book`` take. The medians of ``--repeat`` runs
+are printed in ms.
+
+Usage: python tests/perf/bench_startup.py [--clubs 10000] [--competitions 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from storage import saveClubs, saveCompetitions  # noqa: E402
+from workload import PAST_FRACTION, clubEmail, clubName, competitionName, generateClubs  # noqa: E402
+from workload import generateCompetitions, pastCount  # noqa: E402
+
+# Name, environment; the template cache directory is filled in per run
+SCENARIOS = (
+    ('no bytecode cache', {'GUDLFT_TEMPLATE_CACHE_DIR': ''}),
+    ('bytecode cache, empty', {'GUDLFT_TEMPLATE_CACHE_DIR': 'empty'}),
+    ('bytecode cache, filled', {'GUDLFT_TEMPLATE_CACHE_DIR': 'filled'}),
+    ('background loading', {'GUDLFT_TEMPLATE_CACHE_DIR': 'filled', 'GUDLFT_DATA_LOADING': 'background'}),
+    ('warm-up', {'GUDLFT_TEMPLATE_CACHE_DIR': 'filled', 'GUDLFT_WARMUP': '1'}),
+)
+FIRST_REQUESTS = ('GET /', 'GET /clubs', 'POST /showSummary', 'GET /book')
+
+
+def measureChild(competitions):
+    """Run in the measured process: time the import, then the first requests."""
+    began = time.perf_counter()
+    import server
+    timings = {'import': time.perf_counter() - began}
+    client = server.app.test_client()
+    upcoming = competitionName(pastCount(competitions, PAST_FRACTION))
+    calls = (
+        lambda: client.get('/'),
+        lambda: client.get('/clubs'),
+        lambda: client.post('/showSummary', data={'email': clubEmail(0)}),
+        lambda: client.get(f'/book/{upcoming}/{clubName(0)}'),
+    )
+    for name, call in zip(FIRST_REQUESTS, calls):
+        began = time.perf_counter()
+        response = call()
+        timings[name] = time.perf_counter() - began
+        if response.status_code != 200:
+            raise AssertionError(f'{name} returned {response.status_code}')
+    print(json.dumps({name: seconds * 1000 for name, seconds in timings.items()}))
+
+
+def runScenario(directory, environment, competitions):
+    env = dict(os.environ, GUDLFT_JOURNAL_FSYNC='never', PYTHONPATH=ROOT_DIR, **environment)
+    cache = environment.get('GUDLFT_TEMPLATE_CACHE_DIR')
+    if cache == 'empty':
+        env['GUDLFT_TEMPLATE_CACHE_DIR'] = tempfile.mkdtemp(dir=directory)
+    elif cache == 'filled':
+        env['GUDLFT_TEMPLATE_CACHE_DIR'] = os.path.join(directory, 'filled')
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', '--competitions', str(competitions)],
+        cwd=directory, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time and first-request latency')
+    parser.add_argument('--clubs', type=int, default=10_000)
+    parser.add_argument('--competitions', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.child:
+        measureChild(options.competitions)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        saveClubs(generateClubs(options.clubs), path=os.path.join(directory, 'clubs.json'))
+        saveCompetitions(generateCompetitions(options.competitions, datetime.now()),
+                         path=os.path.join(directory, 'competitions.json'))
+        # Fill the shared cache once so that the scenarios using it start warm
+        runScenario(directory, {'GUDLFT_TEMPLATE_CACHE_DIR': 'filled'}, options.competitions)
+        print(f'{options.clubs} clubs, {options.competitions} competitions, median of {options.repeat} runs (ms)')
+        columns = ('import',) + FIRST_REQUESTS
+        print(f"{'scenario':<24}" + ''.join(f'{column:>19}' for column in columns))
+        for name, environment in SCENARIOS:
+            runs = [runScenario(directory, environment, options.competitions) for _ in range(options.repeat)]
+            print(f'{name:<24}' + ''.join(f'{statistics.median(run[column] for run in runs):>19.1f}'
+                                          for column in columns))
+
+
+if __name__ == '__main__':
+    main()
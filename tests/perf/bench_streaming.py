@@ -0,0 +1,75 @@
+"""Time-to-first-byte and peak memory of the welcome page, buffered vs streamed.
+
+Each mode runs in its own subprocess so peak RSS is not shared between them.
+
+Usage: python tests/perf/bench_streaming.py [number_of_competitions]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def run(count, stream):
+    os.chdir(ROOT_DIR)
+    sys.path.insert(0, ROOT_DIR)
+    import server
+    from models import Club, Competition
+
+    start = datetime(2020, 1, 1)
+    server.repository.load(
+        [Club('Bench Club', 'bench@example.com', 100)],
+        [Competition(f'Competition {i}', start + timedelta(hours=i), 25) for i in range(count)],
+    )
+    server.app.config['STREAM_TEMPLATES'] = stream
+    client = server.app.test_client()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    began = time.perf_counter()
+    response = client.post('/showSummary', data={'email': 'bench@example.com'}, buffered=False)
+    body = iter(response.response)
+    size = len(next(body))
+    first_byte = time.perf_counter() - began
+    for chunk in body:
+        size += len(chunk)
+    total = time.perf_counter() - began
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    response.close()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({
+        'ttfb_ms': first_byte * 1000,
+        'total_ms': total * 1000,
+        'peak_heap_mib': peak / 2**20,
+        'rss_growth_mib': (rss_after - rss_before) / 1024,
+        'bytes': size,
+    }))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"competitions: {count}")
+    for mode in ('buffered', 'streamed'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--run', str(count), mode],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output)
+        print(f"{mode:9} ttfb {result['ttfb_ms']:8.1f} ms  total {result['total_ms']:8.1f} ms  "
+              f"peak heap {result['peak_heap_mib']:6.1f} MiB  RSS growth {result['rss_growth_mib']:6.1f} MiB  "
+              f"({result['bytes']} bytes)")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        run(int(sys.argv[2]), sys.argv[3] == 'streamed')
+    else:
+        main()
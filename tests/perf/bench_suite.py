@@ -0,0 +1,254 @@
+"""Route and storage latency benchmarks with a p95 regression gate.
+
+For each data size, synthetic ``clubs.json`` and ``competitions.json``
+are generated in a temporary directory, which a subprocess serves
+through the Flask test client. Every case is sampled for at least
+``--min-samples`` calls and ``--budget`` seconds, and p50/p95 are
+compared with the baseline: the run fails when a p95 grows by more than
+``--tolerance`` (and by more than ``--floor-ms``, so sub-millisecond
+jitter cannot fail it). Baselines are machine specific; record one with
+``--update-baseline`` on the machine that gates.
+
+Usage: python tests/perf/bench_suite.py [--sizes 10 10k 1m] [--update-baseline]
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+RESULTS_PATH = os.path.join(ROOT_DIR, 'reports', 'bench', 'latest.json')
+SIZES = {'10': 10, '10k': 10_000, '1m': 1_000_000}
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def generate(directory, count):
+    """Write ``count`` clubs and ``count`` competitions, half of them past."""
+    now = datetime.now().replace(microsecond=0)
+    clubs = [
+        {'name': f'Club {i}', 'email': f'club{i}@example.com', 'points': str(1_000_000_000 - i % 1000)}
+        for i in range(count)
+    ]
+    competitions = [
+        {
+            'name': f'Competition {i}',
+            # Odd competitions are upcoming, even ones are past
+            'date': (now + timedelta(days=365 if i % 2 else -365, minutes=i)).strftime(DATE_FORMAT),
+            'numberOfPlaces': str(1_000_000_000),
+        }
+        for i in range(count)
+    ]
+    with open(os.path.join(directory, 'clubs.json'), 'w') as f:
+        json.dump({'clubs': clubs}, f, indent=4)
+    with open(os.path.join(directory, 'competitions.json'), 'w') as f:
+        json.dump({'competitions': competitions}, f, indent=4)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def sample(call, min_samples, budget, prepare=None):
+    """Time ``call``; ``prepare`` runs before each call, outside the timing."""
+    prepare = prepare or (lambda: None)
+    prepare()
+    call()
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < min_samples or time.perf_counter() < deadline:
+        prepare()
+        began = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - began)
+    return {
+        'samples': len(samples),
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+    }
+
+
+class BookingPairs:
+    """Upcoming (competition, club) pairs booked one place at a time.
+
+    The 12-place cap counts every booking of a pair, so the samples rotate
+    over the pairs; once a pair comes round again with its 12 places
+    taken, they go back to the ledger so that the next booking is not
+    refused.
+    """
+
+    def __init__(self, ledger, count, cap, competitions=10, clubs=100):
+        self.ledger = ledger
+        self.cap = cap
+        upcoming = range(1, count, 2)[:competitions]
+        self._pairs = itertools.cycle([(f'Competition {competition}', f'Club {club}')
+                                       for competition in upcoming for club in range(min(count, clubs))])
+        self._booked = {}
+
+    def next(self):
+        pair = next(self._pairs)
+        places = self._booked.get(pair, 0)
+        if places == self.cap:
+            self.ledger.record(*pair, -places)
+            places = 0
+        self._booked[pair] = places + 1
+        return pair
+
+
+def expect(response, status):
+    if response.status_code != status:
+        raise AssertionError(f'{response.request.path} returned {response.status_code}, expected {status}')
+    return response
+
+
+def runSize(directory, count, min_samples, budget):
+    """Benchmark every case against the data in ``directory`` (the working directory)."""
+    sys.path.insert(0, ROOT_DIR)
+    import server
+    from booking import MAX_PLACES_PER_BOOKING
+    from storage import loadClubs, loadCompetitions, saveClubs, saveCompetitions
+
+    client = server.app.test_client()
+    # Books for any club: a logged-in session may only book for its own
+    anonymous = server.app.test_client()
+    club = 'Club 0'
+    email = 'club0@example.com'
+    competition = 'Competition 1'
+    pairs = BookingPairs(server.repository.ledger, count, MAX_PLACES_PER_BOOKING)
+    purchase = {}
+    batch = {}
+
+    def nextPurchase():
+        purchase['competition'], purchase['club'] = pairs.next()
+        purchase['places'] = '1'
+
+    def nextBatch():
+        batch['bookings'] = [{'competition': competition, 'club': club, 'places': 1}
+                             for competition, club in (pairs.next(), pairs.next())]
+
+    preparations = {'POST /purchasePlaces': nextPurchase, 'POST /api/bookings': nextBatch}
+    cases = [
+        ('GET /', lambda: expect(client.get('/'), 200)),
+        ('POST /showSummary', lambda: expect(client.post('/showSummary', data={'email': email}), 200)),
+        ('GET /book', lambda: expect(client.get(f'/book/{competition}/{club}'), 200)),
+        ('GET /clubs', lambda: expect(client.get('/clubs'), 200)),
+        ('GET /clubs last page', lambda: expect(client.get(f'/clubs?page={max(1, math.ceil(count / 100))}'), 200)),
+        ('POST /purchasePlaces', lambda: expect(anonymous.post('/purchasePlaces', data=purchase), 200)),
+        ('POST /api/bookings', lambda: expect(client.post('/api/bookings', json=batch), 200)),
+        ('GET /metrics', lambda: expect(client.get('/metrics'), 200)),
+    ]
+    # Pages that list every competition take seconds at large sizes: a few samples are enough there
+    file_samples = min_samples
+    if count >= 100_000:
+        min_samples, file_samples = 5, 3
+    results = {name: sample(call, min_samples, budget, preparations.get(name)) for name, call in cases}
+
+    clubs = loadClubs()
+    competitions = loadCompetitions()
+    storage_cases = [
+        ('loadClubs', loadClubs),
+        ('loadCompetitions', loadCompetitions),
+        ('saveClubs', lambda: saveClubs(clubs, path=os.path.join(directory, 'clubs.out.json'))),
+        ('saveCompetitions', lambda: saveCompetitions(
+            competitions, path=os.path.join(directory, 'competitions.out.json'))),
+    ]
+    for name, call in storage_cases:
+        results[name] = sample(call, file_samples, budget)
+    return results
+
+
+def benchmarkSize(size, min_samples, budget):
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, SIZES[size])
+        env = dict(
+            os.environ,
+            GUDLFT_JOURNAL_PATH=os.path.join(directory, 'bookings.journal'),
+            GUDLFT_JOURNAL_FSYNC='never',
+            # Compaction rewrites every record: keep it out of the per-request numbers
+            GUDLFT_JOURNAL_COMPACT_EVERY=str(10 ** 9),
+            GUDLFT_PERSISTENCE_MODE='sync',
+            GUDLFT_STORAGE_BACKEND='json',
+        )
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run', size, str(min_samples), str(budget)],
+            cwd=directory, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def regressions(results, baseline, tolerance, floor_ms):
+    """Return a line for each case whose p95 grew past the tolerance."""
+    lines = []
+    for size, cases in results.items():
+        for name, result in cases.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            limit = max(reference['p95_ms'] * (1 + tolerance), reference['p95_ms'] + floor_ms)
+            if result['p95_ms'] > limit:
+                lines.append(f'{size} {name}: p95 {result["p95_ms"]:.3f} ms > {limit:.3f} ms '
+                             f'(baseline {reference["p95_ms"]:.3f} ms)')
+    return lines
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        size, min_samples, budget = sys.argv[2], int(sys.argv[3]), float(sys.argv[4])
+        print(json.dumps(runSize(os.getcwd(), SIZES[size], min_samples, budget)))
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', choices=SIZES, default=['10', '10k'])
+    parser.add_argument('--min-samples', type=int, default=50)
+    parser.add_argument('--budget', type=float, default=0.5, help='Seconds spent sampling each case.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p95 growth.')
+    parser.add_argument('--floor-ms', type=float, default=0.1, help='Allowed absolute p95 growth.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        print(f'{size} records')
+        results[size] = benchmarkSize(size, args.min_samples, args.budget)
+        for name, result in results[size].items():
+            print(f'  {name:>22}: p50 {result["p50_ms"]:9.3f} ms  p95 {result["p95_ms"]:9.3f} ms  '
+                  f'({result["samples"]} samples)')
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --update-baseline first')
+        return 1
+    with open(args.baseline) as f:
+        failures = regressions(results, json.load(f), args.tolerance, args.floor_ms)
+    for line in failures:
+        print(f'REGRESSION {line}')
+    if not failures:
+        print(f'No p95 regression beyond {args.tolerance:.0%}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
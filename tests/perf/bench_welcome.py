@@ -0,0 +1,64 @@
+"""Compare the legacy per-request is_past rebuild with the pre-parsed timeline.
+
+Usage: python tests/perf/bench_welcome.py [number_of_competitions]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from models import Competition  # noqa: E402
+from repository import Repository  # noqa: E402
+
+
+def make_competitions(count):
+    start = datetime(2020, 1, 1)
+    return [
+        {
+            "name": f"Competition {i}",
+            "date": (start + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            "numberOfPlaces": "25",
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_status(competitions, now):
+    competitions_with_status = []
+    for comp in competitions:
+        comp_copy = comp.copy()
+        comp_date = datetime.strptime(comp['date'], '%Y-%m-%d %H:%M:%S')
+        comp_copy['is_past'] = comp_date < now
+        competitions_with_status.append(comp_copy)
+    return competitions_with_status
+
+
+def timeline_status(repository, now):
+    return [repository.is_past(comp, now) for comp in repository.competitions]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    competitions = make_competitions(count)
+    records = [Competition.from_json(c) for c in competitions]
+    repository = Repository([], records)
+    now = datetime.now()
+    runs = 20
+
+    legacy = min(timeit.repeat(lambda: legacy_status(competitions, now), number=1, repeat=runs))
+    timeline = min(timeit.repeat(lambda: timeline_status(repository, now), number=1, repeat=runs))
+    load = min(timeit.repeat(
+        lambda: Repository([], [Competition.from_json(c) for c in competitions]), number=1, repeat=5))
+
+    print(f"competitions: {count}")
+    print(f"legacy copy + strptime per request: {legacy * 1000:.2f} ms")
+    print(f"timeline lookup per request:        {timeline * 1000:.2f} ms")
+    print(f"one-off parse + sort at load:       {load * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+import json
+import multiprocessing
+import random
+import threading
+from collections import Counter
+
+import pytest
+
+from booking import BookingEngine, BookingError
+from journal import BookingJournal
+from models import Club, Competition
+from repository import Repository
+from storage import JsonStorage, SqliteStorage
+
+
+CLUBS = [
+    {"name": f"Club {i}", "email": f"club{i}@example.com", "points": "30"}
+    for i in range(4)
+]
+COMPETITIONS = [
+    {"name": f"Competition {i}", "date": "2030-01-01 10:00:00", "numberOfPlaces": "20"}
+    for i in range(3)
+]
+
+
+def make_storage(tmp_path, backend="json", shared=False):
+    if backend == "sqlite":
+        storage = SqliteStorage(tmp_path / "gudlft.sqlite3")
+        if not storage.load()[0]:
+            storage.import_records(
+                [Club.from_json(c) for c in CLUBS],
+                [Competition.from_json(c) for c in COMPETITIONS],
+            )
+        return storage
+    clubs_path = tmp_path / "clubs.json"
+    competitions_path = tmp_path / "competitions.json"
+    if not clubs_path.exists():
+        clubs_path.write_text(json.dumps({"clubs": CLUBS}))
+        competitions_path.write_text(json.dumps({"competitions": COMPETITIONS}))
+    return JsonStorage(
+        BookingJournal(tmp_path / "bookings.journal", fsync="never"),
+        clubs_path=clubs_path,
+        competitions_path=competitions_path,
+        lock_path=str(tmp_path / "bookings.lock") if shared else None,
+    )
+
+
+def make_engine(tmp_path, backend="json", shared=False):
+    repository = Repository()
+    storage = make_storage(tmp_path, backend, shared)
+
+    def reload():
+        repository.load(*storage.load())
+
+    reload()
+    return BookingEngine(repository, storage, reload=reload)
+
+
+def booked_records(tmp_path, backend):
+    storage = make_storage(tmp_path, backend)
+    if backend == "sqlite":
+        storage._last_booking_id = 0
+        return storage.changes()
+    return storage.journal.replay()
+
+
+def attempt_bookings(engine, seed, attempts):
+    rng = random.Random(seed)
+    for _ in range(attempts):
+        try:
+            engine.book(rng.choice(COMPETITIONS)["name"], rng.choice(CLUBS)["name"], rng.randint(1, 3))
+        except BookingError:
+            pass
+
+
+def assert_conserved(records):
+    """Journaled bookings must add up to the places and points that were debited."""
+    booked_by_competition = Counter()
+    booked_by_club = Counter()
+    for record in records:
+        booked_by_competition[record["competition"]] += record["places"]
+        booked_by_club[record["club"]] += record["places"]
+    assert all(total <= 20 for total in booked_by_competition.values())
+    assert all(total <= 30 for total in booked_by_club.values())
+    assert sum(booked_by_competition.values()) == sum(booked_by_club.values())
+    return booked_by_competition, booked_by_club
+
+
+def test_rules_raise_booking_errors(tmp_path):
+    engine = make_engine(tmp_path)
+    with pytest.raises(BookingError, match="more than 12 places"):
+        engine.book("Competition 0", "Club 0", 13)
+    with pytest.raises(BookingError, match="Invalid club or competition"):
+        engine.book("Nope", "Club 0", 1)
+
+    engine.repository.competition_by_name("Competition 0").number_of_places = 2
+    with pytest.raises(BookingError, match="Not enough places"):
+        engine.book("Competition 0", "Club 0", 3)
+
+    engine.repository.club_by_name("Club 0").points = 1
+    with pytest.raises(BookingError, match="does not have enough points"):
+        engine.book("Competition 1", "Club 0", 2)
+    assert engine.storage.journal.replay() == []
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_successful_booking_debits_and_persists(tmp_path, backend):
+    engine = make_engine(tmp_path, backend)
+    record = engine.book("Competition 0", "Club 0", 3)
+    assert (record["competition"], record["club"], record["places"]) == ("Competition 0", "Club 0", 3)
+    assert engine.repository.competition_by_name("Competition 0").number_of_places == 17
+    assert engine.repository.club_by_name("Club 0").points == 27
+
+    clubs, competitions = make_storage(tmp_path, backend).load()
+    assert clubs[0].points == 27
+    assert competitions[0].number_of_places == 17
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_threads_conserve_places_and_points(tmp_path, backend):
+    engine = make_engine(tmp_path, backend)
+    threads = [
+        threading.Thread(target=attempt_bookings, args=(engine, seed, 200))
+        for seed in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    booked_by_competition, booked_by_club = assert_conserved(booked_records(tmp_path, backend))
+    for competition in engine.repository.competitions:
+        assert competition.number_of_places == 20 - booked_by_competition[competition.name]
+        assert competition.number_of_places >= 0
+    for club in engine.repository.clubs:
+        assert club.points == 30 - booked_by_club[club.name]
+        assert club.points >= 0
+
+
+def _process_worker(tmp_path, backend, seed):
+    attempt_bookings(make_engine(tmp_path, backend, shared=True), seed, 100)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_processes_share_storage_without_overselling(tmp_path, backend):
+    make_storage(tmp_path, backend).close()
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_process_worker, args=(tmp_path, backend, seed)) for seed in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    booked_by_competition, _ = assert_conserved(booked_records(tmp_path, backend))
+    # The workers had enough demand to sell every place
+    assert sum(booked_by_competition.values()) == 60
+
+
+def test_shared_json_storage_reloads_after_compaction_elsewhere(tmp_path):
+    first = make_engine(tmp_path, shared=True)
+    second = make_engine(tmp_path, shared=True)
+    first.book("Competition 0", "Club 0", 2)
+    with first.exclusive():
+        first.storage.journal.truncate()
+    # The other process sees a replaced journal and reloads
+    reloads = []
+    second.reload = lambda: reloads.append(True) or second.storage.journal.replay()
+    second.book("Competition 1", "Club 1", 1)
+    assert reloads == [True]
+
+
+def test_shared_json_storage_reads_on_from_the_archive_after_compaction_elsewhere(tmp_path):
+    first = make_engine(tmp_path, shared=True)
+    second = make_engine(tmp_path, shared=True)
+    for engine in (first, second):
+        engine.storage.journal.archive_path = str(tmp_path / "bookings.ledger")
+    second.reload = lambda: pytest.fail("the whole data was reloaded")
+    first.book("Competition 0", "Club 0", 2)
+    second.book("Competition 1", "Club 1", 1)
+    first.book("Competition 0", "Club 1", 3)
+    with first.exclusive():
+        first.storage.journal.truncate()
+    first.book("Competition 1", "Club 0", 4)
+    # Set aside for a compaction, but not archived yet
+    with first.exclusive():
+        first.storage.start_compaction()
+    first.book("Competition 0", "Club 0", 1)
+
+    second.refresh()
+    assert second.repository.competition_by_name("Competition 0").number_of_places == 14
+    assert second.repository.club_by_name("Club 0").points == 23
+    assert second.repository.ledger.total("Competition 0", "Club 0") == 3
+    second.book("Competition 1", "Club 1", 1)
+    assert [record["seq"] for record in second.storage.history()] == [1, 2, 3, 4, 5, 6]
+
+    # Records that left the files without reaching the archive: reload
+    first.book("Competition 0", "Club 0", 1)
+    with first.exclusive():
+        first.storage.journal.finish_rotation()
+        first.storage.journal.truncate(archive=False)
+    first.book("Competition 0", "Club 0", 1)
+    reloads = []
+    second.reload = lambda: reloads.append(True) or second.storage.journal.replay()
+    second.refresh()
+    assert reloads == [True]
+
+
+def test_shared_sqlite_storage_applies_other_process_bookings(tmp_path):
+    first = make_engine(tmp_path, "sqlite")
+    second = make_engine(tmp_path, "sqlite")
+    first.book("Competition 0", "Club 0", 2)
+    second.book("Competition 1", "Club 1", 1)
+    assert second.repository.competition_by_name("Competition 0").number_of_places == 18
+    assert second.repository.club_by_name("Club 0").points == 28
+    # A process does not apply its own bookings twice
+    first.book("Competition 0", "Club 0", 1)
+    assert first.repository.club_by_name("Club 0").points == 27
+    assert first.repository.club_by_name("Club 1").points == 29
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_batch_books_everything_at_once(tmp_path, backend):
+    engine = make_engine(tmp_path, backend)
+    records = engine.book_many([
+        ("Competition 0", "Club 0", 5),
+        ("Competition 1", "Club 0", 5),
+        ("Competition 1", "Club 1", 2),
+    ])
+    assert len(records) == 3
+    assert engine.repository.club_by_name("Club 0").points == 20
+    assert engine.repository.competition_by_name("Competition 1").number_of_places == 13
+
+    clubs, competitions = make_storage(tmp_path, backend).load()
+    assert clubs[0].points == 20
+    assert competitions[1].number_of_places == 13
+
+
+@pytest.mark.parametrize("batch, index, message", [
+    ([("Competition 0", "Club 0", 10), ("Competition 1", "Club 0", 10), ("Competition 2", "Club 0", 11)],
+     2, "does not have enough points"),
+    ([("Competition 0", "Club 0", 12), ("Competition 0", "Club 1", 9)], 1, "Not enough places"),
+    ([("Competition 0", "Club 0", 8), ("Competition 0", "Club 0", 5)], 1, "more than 12 places"),
+    ([("Competition 0", "Club 0", 1), ("Nope", "Club 0", 1)], 1, "Invalid club or competition"),
+])
+def test_batch_checks_rules_against_batch_totals(tmp_path, batch, index, message):
+    engine = make_engine(tmp_path)
+    with pytest.raises(BookingError, match=message) as raised:
+        engine.book_many(batch)
+    assert raised.value.index == index
+    # Nothing was debited or journaled
+    assert [c.points for c in engine.repository.clubs] == [30, 30, 30, 30]
+    assert [c.number_of_places for c in engine.repository.competitions] == [20, 20, 20]
+    assert engine.storage.journal.replay() == []
+
+
+def test_sqlite_batch_rolls_back_when_the_database_refuses(tmp_path):
+    engine = make_engine(tmp_path, "sqlite")
+    other = make_engine(tmp_path, "sqlite")
+    other.book("Competition 1", "Club 1", 12)
+    other.book("Competition 1", "Club 2", 5)
+    # This process has not seen the other bookings yet, so only the database knows
+    engine.storage.shared = False
+    with pytest.raises(BookingError, match="Not enough places") as raised:
+        engine.book_many([("Competition 0", "Club 0", 2), ("Competition 1", "Club 0", 4)])
+    assert raised.value.index == 1
+    clubs, competitions = make_storage(tmp_path, "sqlite").load()
+    assert clubs[0].points == 30
+    assert competitions[0].number_of_places == 20
+
+
+def test_booking_restarts_when_a_reload_replaces_its_records(tmp_path):
+    engine = make_engine(tmp_path)
+    stale = engine.repository.club_by_name("Club 0")
+    check = engine.check
+
+    def reload_during_check(competition, club, places):
+        check(competition, club, places)
+        if club is stale:
+            engine.repository.merge(
+                [Club.from_json(dict(c, points="40")) if c["name"] == "Club 0" else Club.from_json(c)
+                 for c in CLUBS],
+                [Competition.from_json(c) for c in COMPETITIONS],
+            )
+
+    engine.check = reload_during_check
+    engine.book("Competition 0", "Club 0", 5)
+    assert stale.points == 30
+    assert engine.repository.club_by_name("Club 0").points == 35
+    assert engine.repository.competition_by_name("Competition 0").number_of_places == 15
+
+
+def test_refresh_applies_other_process_bookings_before_a_read(tmp_path):
+    first = make_engine(tmp_path, shared=True)
+    second = make_engine(tmp_path, shared=True)
+    first.book("Competition 0", "Club 0", 2)
+    second.refresh()
+    assert second.repository.competition_by_name("Competition 0").number_of_places == 18
+    assert second.repository.club_by_name("Club 0").points == 28
+    # Nothing new: the journal is not read again
+    second.refresh()
+    assert second.repository.club_by_name("Club 0").points == 28
+
+    # A journal replaced by a compaction is reloaded under the storage lock
+    with first.exclusive():
+        first.storage.journal.truncate()
+    reloads = []
+    second.reload = lambda: reloads.append(True) or second.storage.journal.replay()
+    second.refresh()
+    assert reloads == [True]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_cap_counts_the_places_a_club_already_holds(tmp_path, backend):
+    engine = make_engine(tmp_path, backend)
+    engine.book("Competition 0", "Club 0", 7)
+    engine.book("Competition 0", "Club 0", 5)
+    with pytest.raises(BookingError, match="more than 12"):
+        engine.book("Competition 0", "Club 0", 1)
+    with pytest.raises(BookingError, match="more than 12"):
+        engine.book_many([("Competition 1", "Club 0", 6), ("Competition 0", "Club 0", 1)])
+    # Other competitions and clubs have their own count
+    engine.book("Competition 1", "Club 0", 12)
+    engine.book("Competition 0", "Club 1", 1)
+
+
+def test_cap_survives_the_journal_truncation_and_reload(tmp_path):
+    repository = Repository()
+    storage = make_storage(tmp_path)
+    storage.journal.archive_path = str(tmp_path / "bookings.ledger")
+
+    def reload():
+        repository.load(*storage.load(), storage.history())
+
+    reload()
+    engine = BookingEngine(repository, storage, reload=reload)
+    engine.book("Competition 0", "Club 0", 10)
+    # What a compaction does once the snapshots are written
+    storage.journal.truncate()
+    engine.book("Competition 0", "Club 0", 2)
+    reload()
+    assert repository.ledger.total("Competition 0", "Club 0") == 12
+    with pytest.raises(BookingError, match="more than 12"):
+        engine.book("Competition 0", "Club 0", 1)
@@ -0,0 +1,33 @@
+import pytest
+
+import codec
+
+
+def installed_codecs():
+    names = []
+    for name in codec.CODECS:
+        try:
+            codec.selectCodec(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.mark.parametrize("name", installed_codecs())
+def test_codecs_round_trip_compact_utf8(name):
+    _, loads, dumps = codec.selectCodec(name)
+    record = {"name": "Club Éclair", "points": "13", "seq": 4}
+    encoded = dumps(record)
+    assert encoded == '{"name":"Club Éclair","points":"13","seq":4}'.encode()
+    assert loads(encoded) == record
+    assert loads(encoded.decode()) == record
+    with pytest.raises(ValueError):
+        loads(b'{"seq": 1')
+
+
+def test_default_prefers_a_fast_codec_and_falls_back_to_stdlib():
+    assert codec.selectCodec()[0] == installed_codecs()[0]
+    assert "stdlib" in installed_codecs()
+    with pytest.raises(ValueError, match="Unknown JSON codec"):
+        codec.selectCodec("simplejson")
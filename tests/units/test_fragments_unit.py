@@ -0,0 +1,44 @@
+from fragments import FragmentCache, fragmentSize
+
+
+def test_stamp_mismatch_is_a_miss_until_the_entry_is_replaced():
+    cache = FragmentCache(10_000)
+    cache.put(("competition", "Open"), (1,), "<li>Open</li>")
+    assert cache.get(("competition", "Open"), (1,)) == "<li>Open</li>"
+    assert cache.get(("competition", "Open"), (2,)) is None
+    assert cache.last(("competition", "Open")) == "<li>Open</li>"
+    cache.put(("competition", "Open"), (2,), "<li>Open 2</li>")
+    assert cache.get(("competition", "Open"), (1,)) is None
+    assert cache.get(("competition", "Open"), (2,)) == "<li>Open 2</li>"
+    assert cache.hits["competition"] == 2
+    assert cache.misses["competition"] == 2
+    assert len(cache) == 1 and cache.bytes == fragmentSize("<li>Open 2</li>")
+    assert cache.last(("competition", "Closed")) is None
+
+
+def test_least_recently_used_entries_go_first_to_stay_under_the_bound():
+    value = "x" * 100
+    size = fragmentSize(value)
+    cache = FragmentCache(size * 3)
+    for name in "abc":
+        cache.put(("item", name), 0, value)
+    cache.get(("item", "a"), 0)
+    cache.put(("item", "d"), 0, value)
+    assert cache.get(("item", "b"), 0) is None
+    assert all(cache.get(("item", name), 0) == value for name in "acd")
+    assert cache.evictions == 1
+    assert cache.bytes == size * 3
+    # A fragment larger than the whole cache is not kept
+    cache.put(("item", "huge"), 0, "x" * (size * 4))
+    assert cache.get(("item", "huge"), 0) is None and len(cache) == 3
+
+
+def test_exposition_reports_counters_by_kind():
+    cache = FragmentCache(10_000)
+    cache.put(("list",), 1, ["a", "b"])
+    cache.get(("list",), 1)
+    cache.get(("competition", "Open"), 1)
+    text = cache.exposition("gudlft_welcome_fragments")
+    assert 'gudlft_welcome_fragments_hits_total{kind="list"} 1' in text
+    assert 'gudlft_welcome_fragments_misses_total{kind="competition"} 1' in text
+    assert f"gudlft_welcome_fragments_bytes {fragmentSize(['a', 'b'])}" in text
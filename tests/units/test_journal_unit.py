@@ -0,0 +1,187 @@
+import pytest
+
+from journal import BookingJournal
+
+
+def test_append_and_replay_in_order(tmp_path):
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never")
+    journal.append("Open", "Alpha", 2)
+    journal.append("Open", "Beta", 1)
+    journal.close()
+
+    records = BookingJournal(tmp_path / "bookings.journal").replay()
+    assert [(r["seq"], r["club"], r["places"]) for r in records] == [(1, "Alpha", 2), (2, "Beta", 1)]
+
+
+def test_records_are_compact_single_lines(tmp_path):
+    path = tmp_path / "bookings.journal"
+    journal = BookingJournal(path)
+    journal.append("Open", "Alpha", 3)
+    journal.close()
+    assert path.read_text() == '{"seq":1,"competition":"Open","club":"Alpha","places":3}\n'
+
+
+def test_replay_restores_sequence_and_pending(tmp_path):
+    path = tmp_path / "bookings.journal"
+    journal = BookingJournal(path)
+    journal.append("Open", "Alpha", 1)
+    journal.append("Open", "Alpha", 1)
+    journal.close()
+
+    reopened = BookingJournal(path)
+    reopened.replay()
+    assert reopened.sequence == 2
+    assert reopened.pending == 2
+    assert reopened.append("Open", "Alpha", 1)["seq"] == 3
+    reopened.close()
+
+
+def test_replay_drops_torn_trailing_record(tmp_path):
+    path = tmp_path / "bookings.journal"
+    journal = BookingJournal(path)
+    journal.append("Open", "Alpha", 1)
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"seq":2,"compet')
+
+    reopened = BookingJournal(path)
+    assert len(reopened.replay()) == 1
+    reopened.append("Open", "Beta", 1)
+    reopened.close()
+    assert [r["club"] for r in BookingJournal(path).replay()] == ["Alpha", "Beta"]
+
+
+def test_truncate_keeps_sequence_running(tmp_path):
+    journal = BookingJournal(tmp_path / "bookings.journal")
+    journal.append("Open", "Alpha", 1)
+    journal.truncate()
+    assert journal.replay() == []
+    assert journal.pending == 0
+    assert journal.append("Open", "Alpha", 1)["seq"] == 2
+    journal.close()
+
+
+def test_missing_journal_replays_nothing(tmp_path):
+    assert BookingJournal(tmp_path / "absent.journal").replay() == []
+
+
+def test_unknown_fsync_policy_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        BookingJournal(tmp_path / "bookings.journal", fsync="sometimes")
+
+
+def test_batch_is_one_line_replayed_as_one_record_per_booking(tmp_path):
+    path = tmp_path / "bookings.journal"
+    journal = BookingJournal(path)
+    records = journal.append_many([("Open", "Alpha", 2), ("Cup", "Alpha", 1)])
+    journal.close()
+
+    assert len(path.read_text().splitlines()) == 1
+    assert [(r["seq"], r["competition"]) for r in records] == [(1, "Open"), (1, "Cup")]
+    replayed = BookingJournal(path).replay()
+    assert replayed == records
+
+
+def test_torn_batch_is_dropped_as_a_whole(tmp_path):
+    path = tmp_path / "bookings.journal"
+    journal = BookingJournal(path)
+    journal.append("Open", "Alpha", 1)
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"seq":2,"bookings":[{"competition":"Open","club":"Alpha","places":1},{"compe')
+    assert [r["seq"] for r in BookingJournal(path).replay()] == [1]
+
+
+def test_truncate_archives_the_records_for_the_history(tmp_path):
+    archive = tmp_path / "bookings.ledger"
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never", archive_path=archive)
+    journal.append("Open", "Alpha", 2)
+    journal.append_many([("Open", "Beta", 1), ("Cup", "Beta", 1)])
+    journal.truncate()
+    journal.append("Cup", "Alpha", 3)
+    assert [(r["seq"], r["club"]) for r in journal.history()] == [(1, "Alpha"), (2, "Beta"), (2, "Beta"), (3, "Alpha")]
+    assert journal.replay()[0]["seq"] == 3
+
+    # Archived again after a crash before the truncation: read once
+    archive.write_bytes(archive.read_bytes() + (tmp_path / "bookings.journal").read_bytes())
+    assert [r["seq"] for r in journal.history()] == [1, 2, 2, 3]
+
+    journal.forget()
+    assert journal.history() == []
+    journal.close()
+
+
+def test_archive_numbers_its_records_after_the_archived_ones(tmp_path):
+    archive = tmp_path / "bookings.ledger"
+    archive.write_bytes(b'{"seq":5,"competition":"Open","club":"Alpha","places":1}\n')
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never", archive_path=archive)
+    # The snapshots were not written after the last archive: the sequence is behind it
+    journal.sequence = 3
+    journal.archive([("Open", "Beta", 2), ("Open", "Alpha", 1)])
+    assert [(r["seq"], r["club"]) for r in journal.history()] == [(5, "Alpha"), (6, "Beta"), (6, "Alpha")]
+    assert journal.sequence == 6
+    journal.archive([])
+    assert journal.sequence == 6
+
+
+def test_archive_drops_a_torn_write_before_appending(tmp_path):
+    archive = tmp_path / "bookings.ledger"
+    archive.write_bytes(b'{"seq":1,"competition":"Open","club":"Alpha","places":1}\n{"seq":2,"comp')
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never", archive_path=archive)
+    journal.sequence = 2
+    journal.append("Open", "Beta", 1)
+    journal.truncate()
+    assert [(r["seq"], r["club"]) for r in journal.history()] == [(1, "Alpha"), (3, "Beta")]
+
+
+def test_rotated_journal_is_replayed_until_its_rotation_finishes(tmp_path):
+    archive = tmp_path / "bookings.ledger"
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never", archive_path=archive)
+    assert journal.rotate() is False
+    journal.append("Open", "Alpha", 2)
+    assert journal.rotate() is True
+    journal.append("Open", "Beta", 1)
+    assert [r["seq"] for r in journal.rotated()] == [1]
+    # Not finished, e.g. after a crash: the same records are compacted again
+    assert journal.rotate() is True
+    assert [(r["seq"], r["club"]) for r in BookingJournal(journal.path).replay()] == [(1, "Alpha"), (2, "Beta")]
+    assert [r["seq"] for r in journal.history()] == [1, 2]
+
+    journal.finish_rotation()
+    assert journal.rotated() is None
+    assert [r["seq"] for r in journal.replay()] == [2]
+    assert [r["seq"] for r in journal.history()] == [1, 2]
+    journal.close()
+
+
+def test_truncate_archives_a_rotated_journal_too(tmp_path):
+    archive = tmp_path / "bookings.ledger"
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never", archive_path=archive)
+    journal.append("Open", "Alpha", 2)
+    journal.rotate()
+    journal.append("Open", "Beta", 1)
+    journal.truncate()
+    assert journal.rotated() is None
+    assert journal.replay() == []
+    assert [r["seq"] for r in journal.history()] == [1, 2]
+    journal.close()
+
+
+def test_replaced_journal_is_read_on_from_the_archive_tail(tmp_path):
+    archive = tmp_path / "bookings.ledger"
+    lines = b"".join(b'{"seq":%d,"competition":"Open","club":"Alpha","places":1}\n' % seq for seq in range(1, 5001))
+    # The last records archived twice by a crash before the truncation
+    archive.write_bytes(lines + b"".join(lines.splitlines(keepends=True)[-3:]))
+    (tmp_path / "bookings.journal").write_bytes(b'{"seq":5001,"competition":"Open","club":"Beta","places":1}\n')
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never", archive_path=archive)
+    journal.sequence = 4990
+    assert [r["seq"] for r in journal.tail_replaced()] == list(range(4991, 5002))
+    assert journal.sequence == 5001
+    assert journal.tail() == []
+
+    # Records 5002 and 5003 went missing
+    (tmp_path / "bookings.journal").write_bytes(b'{"seq":5004,"competition":"Open","club":"Beta","places":1}\n')
+    assert journal.tail_replaced() is None
+    journal.archive_path = None
+    assert journal.tail_replaced() is None
+    journal.close()
@@ -0,0 +1,53 @@
+import threading
+
+from metrics import LatencyHistograms
+
+
+def test_observations_land_in_the_first_bucket_that_holds_them():
+    histograms = LatencyHistograms(("endpoint",), buckets=(0.001, 0.01))
+    for seconds in (0.0005, 0.001, 0.002, 0.5):
+        histograms.observe(("book",), seconds)
+    assert histograms.collect() == {("book",): [2, 1, 1, 0.5035]}
+
+
+def test_collect_adds_up_the_shards_of_every_thread():
+    histograms = LatencyHistograms(("endpoint",))
+
+    def record():
+        for _ in range(1000):
+            histograms.observe(("showSummary",), 0.002)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    series = histograms.collect()[("showSummary",)]
+    assert sum(series[:-1]) == 8000
+
+
+def test_exposition_uses_cumulative_prometheus_buckets():
+    histograms = LatencyHistograms(("endpoint", "phase"), buckets=(0.001, 0.01))
+    histograms.observe(("purchasePlaces", "save"), 0.0005)
+    histograms.observe(("purchasePlaces", "save"), 0.005)
+    assert histograms.exposition("latency_seconds", "Latency.") == (
+        '# HELP latency_seconds Latency.\n'
+        '# TYPE latency_seconds histogram\n'
+        'latency_seconds_bucket{endpoint="purchasePlaces",phase="save",le="0.001"} 1\n'
+        'latency_seconds_bucket{endpoint="purchasePlaces",phase="save",le="0.01"} 2\n'
+        'latency_seconds_bucket{endpoint="purchasePlaces",phase="save",le="+Inf"} 2\n'
+        'latency_seconds_sum{endpoint="purchasePlaces",phase="save"} 0.0055\n'
+        'latency_seconds_count{endpoint="purchasePlaces",phase="save"} 2\n'
+    )
+
+
+def test_shards_of_finished_threads_are_folded_into_the_total():
+    histograms = LatencyHistograms(("endpoint",))
+    # A thread per request, as the development server runs
+    for _ in range(50):
+        thread = threading.Thread(target=histograms.observe, args=(("index",), 0.002))
+        thread.start()
+        thread.join()
+    histograms.observe(("index",), 0.002)
+    assert len(histograms._shards) == 1
+    assert sum(histograms.collect()[("index",)][:-1]) == 51
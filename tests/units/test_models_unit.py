@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from models import Club, Competition
+
+
+def test_club_converts_points_at_the_json_boundary():
+    data = {"name": "Alpha", "email": "alpha@example.com", "points": "13"}
+    club = Club.from_json(data)
+    assert club.points == 13
+    assert club.to_json() == data
+
+
+def test_competition_converts_date_and_places_at_the_json_boundary():
+    data = {"name": "Open", "date": "2030-01-01 10:00:00", "numberOfPlaces": "25"}
+    competition = Competition.from_json(data)
+    assert competition.date == datetime(2030, 1, 1, 10, 0, 0)
+    assert competition.number_of_places == 25
+    assert competition.to_json() == data
+
+
+def test_records_use_slots():
+    club = Club("Alpha", "alpha@example.com", 1)
+    assert not hasattr(club, "__dict__")
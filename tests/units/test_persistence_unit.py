@@ -0,0 +1,271 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import pytest
+
+from booking import BookingEngine, BookingError
+from journal import BookingJournal
+from persistence import BackgroundCompactor, BackgroundStorage, WriteBehindStorage
+from repository import Repository
+from storage import JsonStorage, saveClubs, saveCompetitions
+
+
+CLUBS = [{"name": f"Club {i}", "email": f"club{i}@example.com", "points": "30"} for i in range(2)]
+COMPETITIONS = [{"name": "Competition 0", "date": "2030-01-01 10:00:00", "numberOfPlaces": "20"}]
+
+
+def make_json_storage(tmp_path, lock_path=None, archive_path=None):
+    clubs_path = tmp_path / "clubs.json"
+    competitions_path = tmp_path / "competitions.json"
+    if not clubs_path.exists():
+        clubs_path.write_text(json.dumps({"clubs": CLUBS}))
+        competitions_path.write_text(json.dumps({"competitions": COMPETITIONS}))
+    journal = BookingJournal(tmp_path / "bookings.journal", fsync="never", archive_path=archive_path)
+    return JsonStorage(journal, clubs_path, competitions_path, lock_path=lock_path)
+
+
+class GatedStorage:
+    """Holds every write until the test opens the gate."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.shared = False
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+        self.writes = []
+
+    def record_bookings(self, bookings):
+        self.entered.set()
+        self.gate.wait()
+        self.writes.append(list(bookings))
+        return self.storage.record_bookings(bookings)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+def test_bookings_queued_during_a_write_are_coalesced(tmp_path):
+    gated = GatedStorage(make_json_storage(tmp_path))
+    storage = BackgroundStorage(gated)
+    first = storage.record_booking("Competition 0", "Club 0", 1)
+    gated.entered.wait()
+    # The writer is now blocked on the first booking; these queue up behind it
+    queued = [storage.record_booking("Competition 0", "Club 1", places) for places in (2, 3)]
+    batch = storage.record_bookings([("Competition 0", "Club 0", 4), ("Competition 0", "Club 1", 5)])
+    assert isinstance(first, Future)
+    assert storage.pending >= 4
+    gated.gate.set()
+
+    assert first.result()["places"] == 1
+    assert [future.result()["places"] for future in queued] == [2, 3]
+    assert [record["places"] for record in batch.result()] == [4, 5]
+    assert [len(write) for write in gated.writes] == [1, 4]
+    storage.close()
+
+    lines = (tmp_path / "bookings.journal").read_text().splitlines()
+    assert len(lines) == 2
+
+
+def test_write_errors_reach_the_waiting_bookings(tmp_path):
+    gated = GatedStorage(make_json_storage(tmp_path))
+    gated.gate.set()
+    gated.record_bookings = lambda bookings: (_ for _ in ()).throw(OSError("disk full"))
+    storage = BackgroundStorage(gated)
+    with pytest.raises(OSError, match="disk full"):
+        storage.record_booking("Competition 0", "Club 0", 1).result()
+    storage.close()
+
+
+def test_engine_takes_back_bookings_whose_write_failed(tmp_path):
+    gated = GatedStorage(make_json_storage(tmp_path))
+    gated.gate.set()
+    storage = BackgroundStorage(gated)
+    repository = Repository()
+    repository.load(*storage.load())
+    engine = BookingEngine(repository, storage)
+    engine.book("Competition 0", "Club 1", 2)
+    gated.record_bookings = lambda bookings: (_ for _ in ()).throw(OSError("disk full"))
+
+    with pytest.raises(OSError, match="disk full"):
+        engine.book("Competition 0", "Club 0", 3)
+    with pytest.raises(OSError, match="disk full"):
+        engine.book_many([("Competition 0", "Club 0", 4), ("Competition 0", "Club 1", 1)])
+    assert [club.points for club in repository.clubs] == [30, 28]
+    assert repository.competitions[0].number_of_places == 18
+    assert repository.ledger.total("Competition 0", "Club 0") == 0
+    assert repository.ledger.total("Competition 0", "Club 1") == 2
+    assert repository.ledger.competition_history("Competition 0")[0] == [(0, "Competition 0", "Club 1", 2)]
+    assert [club.name for club in repository.ranking.iter_page(0, 2)] == ["Club 0", "Club 1"]
+    storage.close()
+
+
+def test_engine_waits_for_the_write_and_compaction_flushes(tmp_path, mock_save_functions):
+    storage = BackgroundStorage(make_json_storage(tmp_path))
+    repository = Repository()
+    repository.load(*storage.load())
+    engine = BookingEngine(repository, storage)
+
+    record = engine.book("Competition 0", "Club 0", 3)
+    assert record["places"] == 3
+    assert len(engine.book_many([("Competition 0", "Club 1", 2)])) == 1
+    clubs, competitions = make_json_storage(tmp_path).load()
+    assert [club.points for club in clubs] == [27, 28]
+    assert competitions[0].number_of_places == 15
+
+    storage.record_booking("Competition 0", "Club 0", 1)
+    engine.compact()
+    assert storage.pending == 0
+    mock_save_clubs, _ = mock_save_functions
+    assert mock_save_clubs.call_args.args[1] == 3
+    storage.close()
+
+
+def make_compacting_engine(tmp_path):
+    storage = make_json_storage(tmp_path, archive_path=tmp_path / "bookings.ledger")
+    repository = Repository()
+    repository.load(*storage.load())
+    return BookingEngine(repository, storage)
+
+
+def test_background_compaction_catches_up_from_the_journal(tmp_path):
+    engine = make_compacting_engine(tmp_path)
+    storage = engine.storage
+    engine.book("Competition 0", "Club 0", 3)
+    write_compaction = storage.write_compaction
+
+    def write_while_booking():
+        # The files are written without the lock: bookings go on meanwhile
+        done = threading.Thread(target=engine.book, args=("Competition 0", "Club 1", 2))
+        done.start()
+        done.join()
+        return write_compaction()
+
+    storage.write_compaction = write_while_booking
+    with patch("storage.saveClubs", saveClubs), patch("storage.saveCompetitions", saveCompetitions):
+        assert BackgroundCompactor(engine).compact() is True
+
+    clubs_file = json.loads((tmp_path / "clubs.json").read_text())
+    assert clubs_file["journalSequence"] == 1
+    assert [club["points"] for club in clubs_file["clubs"]] == ["27", "30"]
+    assert [r["seq"] for r in storage.journal.replay()] == [2]
+    assert list(tmp_path.glob("*.compact*")) == []
+    clubs, competitions = make_json_storage(tmp_path).load()
+    assert [club.points for club in clubs] == [27, 28]
+    assert competitions[0].number_of_places == 15
+    assert [record["places"] for record in storage.history()] == [3, 2]
+    storage.close()
+
+
+def test_background_compaction_gives_way_to_an_edit(tmp_path):
+    engine = make_compacting_engine(tmp_path)
+    storage = engine.storage
+    engine.book("Competition 0", "Club 0", 3)
+    with patch("storage.saveClubs", saveClubs), patch("storage.saveCompetitions", saveCompetitions):
+        assert storage.start_compaction() is True
+        written = storage.write_compaction()
+        edited = [dict(CLUBS[0], points="40"), CLUBS[1]]
+        (tmp_path / "clubs.json").write_text(json.dumps({"clubs": edited}))
+        assert storage.finish_compaction(written) is False
+        assert list(tmp_path.glob("*.compacted")) == []
+        assert json.loads((tmp_path / "clubs.json").read_text())["clubs"] == edited
+
+        # The set-aside journal is compacted on the next round, onto the edited files
+        assert BackgroundCompactor(engine).compact() is True
+    assert [club.points for club in make_json_storage(tmp_path).load()[0]] == [37, 30]
+    storage.close()
+
+
+def test_background_compactor_runs_on_its_thread(tmp_path):
+    engine = make_compacting_engine(tmp_path)
+    written = threading.Event()
+    compactor = BackgroundCompactor(engine, on_written=written.set)
+    engine.book("Competition 0", "Club 0", 3)
+    with patch("storage.saveClubs", saveClubs), patch("storage.saveCompetitions", saveCompetitions):
+        compactor.request()
+        assert written.wait(5)
+    compactor.close()
+    assert engine.storage.pending == 0
+    assert json.loads((tmp_path / "clubs.json").read_text())["journalSequence"] == 1
+    engine.storage.close()
+
+
+def test_shared_storage_is_written_synchronously(tmp_path):
+    with pytest.raises(ValueError, match="synchronously"):
+        BackgroundStorage(make_json_storage(tmp_path, lock_path=str(tmp_path / "bookings.lock")))
+    with pytest.raises(RuntimeError, match="closed"):
+        storage = BackgroundStorage(make_json_storage(tmp_path))
+        storage.close()
+        storage.record_booking("Competition 0", "Club 0", 1)
+
+
+def make_write_behind(tmp_path, archive_path=None, **options):
+    repository = Repository()
+    json_storage = make_json_storage(tmp_path, archive_path=archive_path)
+    repository.load(*json_storage.load(), json_storage.history())
+    engine = BookingEngine(repository, None)
+    engine.storage = WriteBehindStorage(json_storage, snapshot=engine.snapshot, **options)
+    return engine
+
+
+def test_write_behind_coalesces_a_burst_into_one_snapshot(tmp_path, mock_save_functions):
+    engine = make_write_behind(tmp_path, flush_interval=0.2, flush_every=1000)
+    mock_save_clubs, mock_save_competitions = mock_save_functions
+    for _ in range(10):
+        engine.book("Competition 0", "Club 0", 1)
+    assert engine.storage.dirty == 10
+    assert not mock_save_clubs.called
+
+    deadline = time.monotonic() + 5
+    while not mock_save_clubs.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert mock_save_clubs.call_count == 1
+    assert [club.points for club in mock_save_clubs.call_args.args[0]] == [20, 30]
+    assert mock_save_competitions.call_args.args[0][0].number_of_places == 10
+    # The snapshot is a copy: later bookings do not leak into it
+    engine.book("Competition 0", "Club 1", 2)
+    assert mock_save_clubs.call_args.args[0][1].points == 30
+    engine.storage.close()
+    assert mock_save_clubs.call_count == 2
+
+
+def test_write_behind_flushes_early_after_enough_bookings(tmp_path, mock_save_functions):
+    engine = make_write_behind(tmp_path, flush_interval=60, flush_every=3)
+    mock_save_clubs, _ = mock_save_functions
+    engine.book_many([("Competition 0", "Club 0", 1)] * 3)
+    deadline = time.monotonic() + 5
+    while not mock_save_clubs.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert mock_save_clubs.call_count == 1
+    assert engine.storage.dirty == 0
+    engine.storage.close()
+    # Nothing left to write on close
+    assert mock_save_clubs.call_count == 1
+
+
+def test_write_behind_writes_real_snapshots_on_close(tmp_path):
+    with patch("storage.saveClubs", saveClubs), patch("storage.saveCompetitions", saveCompetitions):
+        engine = make_write_behind(tmp_path, flush_interval=60)
+        engine.book("Competition 0", "Club 1", 4)
+        engine.storage.close()
+    clubs, competitions = make_json_storage(tmp_path).load()
+    assert [club.points for club in clubs] == [30, 26]
+    assert competitions[0].number_of_places == 16
+
+
+def test_write_behind_keeps_the_cap_across_a_restart(tmp_path):
+    archive_path = tmp_path / "bookings.ledger"
+    with patch("storage.saveClubs", saveClubs), patch("storage.saveCompetitions", saveCompetitions):
+        engine = make_write_behind(tmp_path, archive_path=archive_path, flush_interval=60)
+        engine.book("Competition 0", "Club 0", 6)
+        engine.storage.flush()
+        engine.book_many([("Competition 0", "Club 0", 4)])
+        engine.storage.close()
+        engine = make_write_behind(tmp_path, archive_path=archive_path, flush_interval=60)
+    assert [record["places"] for record in engine.storage.history()] == [6, 4]
+    assert engine.repository.ledger.total("Competition 0", "Club 0") == 10
+    with pytest.raises(BookingError, match="more than 12"):
+        engine.book("Competition 0", "Club 0", 3)
+    engine.storage.close()
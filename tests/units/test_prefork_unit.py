@@ -0,0 +1,32 @@
+import socket
+
+import pytest
+
+import prefork
+import server
+
+
+def test_prefork_refuses_settings_that_do_not_survive_a_fork(monkeypatch):
+    config = dict(server.app.config, BOOKING_LOCK_MODE="process", PERSISTENCE_MODE="sync", HOT_RELOAD_INTERVAL=0,
+                  DATA_LOADING="eager")
+    prefork.checkConfig(config)
+    with pytest.raises(ValueError, match="LOCK_MODE"):
+        prefork.checkConfig(dict(config, BOOKING_LOCK_MODE="thread"))
+    with pytest.raises(ValueError, match="PERSISTENCE_MODE"):
+        prefork.checkConfig(dict(config, PERSISTENCE_MODE="background"))
+    with pytest.raises(ValueError, match="DATA_LOADING"):
+        prefork.checkConfig(dict(config, DATA_LOADING="background"))
+    with pytest.raises(ValueError, match="hot reload"):
+        prefork.checkConfig(dict(config, HOT_RELOAD_INTERVAL=1.0))
+    # SQLite storage is always shared between processes
+    prefork.checkConfig(dict(config, STORAGE_BACKEND="sqlite", BOOKING_LOCK_MODE="thread"))
+
+
+def test_prefork_listener_is_inherited_by_the_workers():
+    listener = prefork.createListener("127.0.0.1", 0)
+    try:
+        assert listener.get_inheritable()
+        with socket.create_connection(listener.getsockname()):
+            pass
+    finally:
+        listener.close()
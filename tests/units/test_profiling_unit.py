@@ -0,0 +1,54 @@
+import time
+
+from profiling import RequestProfiler, profileReport
+
+
+def busy_work():
+    total = 0
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def test_cprofile_mode_dumps_pstats_per_route(tmp_path):
+    profiler = RequestProfiler(tmp_path, mode="cprofile")
+    profile = profiler.start()
+    # Only one request is profiled at a time
+    assert profiler.start() is None
+    busy_work()
+    path = profiler.stop(profile, "purchasePlaces")
+
+    assert path.startswith(str(tmp_path / "purchasePlaces"))
+    assert path.endswith(".pstats")
+    report = "\n".join(profileReport(tmp_path, top=5))
+    assert "1 cProfile profiles" in report
+    assert "busy_work" in report or "sum" in report
+    profile = profiler.start()
+    assert profile is not None
+    profiler.stop(profile, "purchasePlaces")
+
+
+def test_sample_mode_dumps_collapsed_stacks(tmp_path):
+    profiler = RequestProfiler(tmp_path, mode="sample", interval=0.001)
+    profile = profiler.start()
+    busy_work()
+    path = profiler.stop(profile, "book")
+
+    lines = open(path).read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("busy_work (test_profiling_unit.py" in line for line in lines)
+    report = "\n".join(profileReport(tmp_path, route="book"))
+    assert "sampled profiles" in report
+    assert "busy_work" in report
+
+
+def test_requests_are_picked_by_header_or_sample_rate(tmp_path):
+    by_header = RequestProfiler(tmp_path, header="X-Profile")
+    assert by_header.wanted({"X-Profile": "1"})
+    assert not by_header.wanted({})
+    assert RequestProfiler(tmp_path, sample_rate=1.0).wanted({})
+    assert not RequestProfiler(tmp_path, sample_rate=0.0).wanted({"X-Profile": "1"})
+    assert profileReport(tmp_path / "missing") == [f"No profiles in {tmp_path / 'missing'}"]
@@ -0,0 +1,363 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from models import Club, Competition, parseDate
+from repository import BookingLedger, ClubRanking, CompetitionCatalog, CompetitionTimeline, Repository
+
+
+def make_repository():
+    clubs = [
+        Club("Alpha", "alpha@example.com", 10),
+        Club("Beta", "beta@example.com", 4),
+    ]
+    competitions = [
+        Competition("Open", parseDate("2030-01-01 10:00:00"), 20),
+    ]
+    return Repository(clubs, competitions)
+
+
+def test_lookups_by_email_and_name():
+    repo = make_repository()
+    assert repo.club_by_email("beta@example.com").name == "Beta"
+    assert repo.club_by_name("Alpha").email == "alpha@example.com"
+    assert repo.competition_by_name("Open").number_of_places == 20
+
+
+def test_unknown_keys_return_none():
+    repo = make_repository()
+    assert repo.club_by_email("nobody@example.com") is None
+    assert repo.club_by_name("Gamma") is None
+    assert repo.competition_by_name("Closed") is None
+
+
+def test_indexes_return_live_records():
+    repo = make_repository()
+    repo.club_by_name("Alpha").points = 7
+    assert repo.club_by_email("alpha@example.com").points == 7
+
+
+def test_load_replaces_lists_in_place_and_reindexes():
+    repo = make_repository()
+    clubs_alias = repo.clubs
+    repo.load([Club("Gamma", "gamma@example.com", 1)], [])
+    assert clubs_alias is repo.clubs
+    assert [c.name for c in clubs_alias] == ["Gamma"]
+    assert repo.club_by_name("Alpha") is None
+    assert repo.club_by_email("gamma@example.com").name == "Gamma"
+    assert repo.competition_by_name("Open") is None
+
+
+def test_duplicate_keys_keep_first_record():
+    first = Club("Dup", "dup@example.com", 1)
+    second = Club("Dup", "dup@example.com", 2)
+    repo = Repository([first, second], [])
+    assert repo.club_by_name("Dup") is first
+    assert repo.club_by_email("dup@example.com") is first
+
+
+def test_timeline_holds_competition_dates():
+    repo = make_repository()
+    assert repo.timeline.date("Open") == datetime(2030, 1, 1, 10, 0, 0)
+
+
+def test_is_past_uses_timeline_split():
+    repo = Repository([], [
+        Competition("Old", parseDate("2020-03-27 10:00:00"), 5),
+        Competition("Soon", parseDate("2026-07-15 14:00:00"), 5),
+        Competition("Later", parseDate("2027-10-22 13:30:00"), 5),
+    ])
+    now = datetime(2026, 1, 1)
+    assert repo.is_past(repo.competition_by_name("Old"), now)
+    assert not repo.is_past(repo.competition_by_name("Soon"), now)
+    assert not repo.is_past(repo.competition_by_name("Later"), now)
+
+    later = datetime(2026, 8, 1)
+    assert repo.is_past(repo.competition_by_name("Soon"), later)
+    assert not repo.is_past(repo.competition_by_name("Later"), later)
+
+
+def test_timeline_cutoff_moves_with_now_in_both_directions():
+    timeline = CompetitionTimeline([
+        Competition("A", parseDate("2020-01-01 00:00:00"), 0),
+        Competition("B", parseDate("2021-01-01 00:00:00"), 0),
+        Competition("C", parseDate("2022-01-01 00:00:00"), 0),
+    ])
+    assert timeline.cutoff(datetime(2019, 1, 1)) == 0
+    assert timeline.cutoff(datetime(2021, 6, 1)) == 2
+    assert timeline.cutoff(datetime(2021, 1, 1)) == 1
+    assert timeline.cutoff(datetime(2030, 1, 1)) == 3
+    assert timeline.cutoff(datetime(2020, 1, 1)) == 0
+
+
+def test_empty_timeline():
+    timeline = CompetitionTimeline()
+    assert timeline.cutoff(datetime(2026, 1, 1)) == 0
+    assert not timeline.is_past("Missing", datetime(2026, 1, 1))
+
+
+def test_ranking_orders_by_points_with_ties_in_file_order():
+    clubs = [
+        Club("A", "a@example.com", 5),
+        Club("B", "b@example.com", 9),
+        Club("C", "c@example.com", 5),
+    ]
+    ranking = ClubRanking(clubs)
+    assert [c.name for c in ranking.page(0, 10)] == ["B", "A", "C"]
+    assert [c.name for c in ranking.page(1, 1)] == ["A"]
+    assert ranking.page(5, 10) == []
+    assert len(ranking) == 3
+
+
+def test_apply_booking_moves_club_in_ranking_and_bumps_version():
+    repo = make_repository()
+    version = repo.version
+    alpha = repo.club_by_name("Alpha")
+    competition = repo.competition_by_name("Open")
+
+    repo.apply_booking(competition, alpha, 7)
+
+    assert alpha.points == 3
+    assert competition.number_of_places == 13
+    assert [c.name for c in repo.ranking.page(0, 10)] == ["Beta", "Alpha"]
+    assert repo.version > version
+
+
+def test_revision_tells_loads_at_the_same_version_apart():
+    # Two processes, or a process and its restart, count versions from the same start
+    first, second = make_repository(), make_repository()
+    assert first.version == second.version
+    assert first.revision != second.revision
+    revision = first.revision
+    first.touch()
+    assert first.revision.split(".")[0] == revision.split(".")[0]
+    assert first.revision != revision
+
+
+def test_ranking_matches_full_sort_after_many_updates():
+    clubs = [Club(str(i), f"{i}@example.com", i % 7 + 20) for i in range(50)]
+    repo = Repository(clubs, [])
+    for i in range(0, 50, 3):
+        repo.apply_booking(None, repo.club_by_name(str(i)), i % 5)
+    expected = sorted(repo.clubs, key=lambda c: c.points, reverse=True)
+    assert repo.ranking.page(0, 50) == expected
+
+
+def test_merge_keeps_unchanged_records_and_swaps_changed_ones():
+    repo = make_repository()
+    alpha = repo.club_by_name("Alpha")
+    beta = repo.club_by_name("Beta")
+    open_competition = repo.competition_by_name("Open")
+    old_index = repo._clubs_by_email
+    generation = repo.generation
+
+    changed = repo.merge(
+        [Club("Alpha", "alpha@example.com", 10), Club("Beta", "beta@new.example.com", 12)],
+        [Competition("Open", parseDate("2030-01-01 10:00:00"), 20)],
+    )
+
+    assert changed == 1
+    assert repo.club_by_name("Alpha") is alpha
+    assert repo.competition_by_name("Open") is open_competition
+    new_beta = repo.club_by_name("Beta")
+    assert new_beta is not beta and new_beta.points == 12
+    # Readers holding the old record or index see the old data untouched
+    assert beta.email == "beta@example.com"
+    assert old_index["beta@example.com"] is beta
+    assert repo.club_by_email("beta@example.com") is None
+    assert repo.club_by_email("beta@new.example.com") is new_beta
+    assert [c.name for c in repo.ranking.page(0, 10)] == ["Beta", "Alpha"]
+    assert repo.generation > generation
+
+
+def test_merge_adds_and_removes_records():
+    repo = make_repository()
+    version = repo.version
+    competitions_alias = repo.competitions
+
+    changed = repo.merge(
+        [Club("Alpha", "alpha@example.com", 10), Club("Gamma", "gamma@example.com", 30)],
+        [Competition("Open", parseDate("2030-01-01 10:00:00"), 20),
+         Competition("Early", parseDate("2020-01-01 10:00:00"), 5)],
+    )
+
+    assert changed == 3
+    assert repo.club_by_name("Beta") is None
+    assert repo.club_by_email("gamma@example.com").points == 30
+    assert [c.name for c in repo.ranking.page(0, 10)] == ["Gamma", "Alpha"]
+    assert [c.name for c in competitions_alias] == ["Open", "Early"]
+    assert repo.is_past(repo.competition_by_name("Early"), datetime(2026, 1, 1))
+    assert repo.version > version
+
+
+def test_merge_publishes_new_indexes_and_leaves_readers_on_the_old_ones():
+    repo = make_repository()
+    ranking, timeline, catalog = repo.ranking, repo.timeline, repo.catalog
+    # A streamed scoreboard has started iterating when the reload removes a club
+    page = ranking.iter_page(0, 10)
+    assert next(page).name == "Alpha"
+
+    repo.merge([Club("Beta", "beta@example.com", 4)], [])
+
+    assert [club.name for club in page] == ["Beta"]
+    assert [club.name for club in ranking.page(0, 10)] == ["Alpha", "Beta"]
+    assert catalog.by_name() == (["Open"], False)
+    assert timeline.date("Open") is not None
+    assert (repo.ranking, repo.timeline, repo.catalog) != (ranking, timeline, catalog)
+    assert [club.name for club in repo.ranking.page(0, 10)] == ["Beta"]
+    assert repo.catalog.by_name() == ([], False)
+
+
+def test_merge_inserts_added_records_without_a_rebuild():
+    repo = make_catalog_repository()
+    added_competition = Competition("Autumn", parseDate("2029-09-01 10:00:00"), 4)
+    moved = Competition("Festival", parseDate("2024-05-01 10:00:00"), 3)
+    with patch.object(CompetitionTimeline, "rebuild", side_effect=AssertionError), \
+            patch.object(CompetitionCatalog, "rebuild", side_effect=AssertionError), \
+            patch.object(ClubRanking, "rebuild", side_effect=AssertionError):
+        changed = repo.merge(
+            repo.clubs + [Club("Zulu", "zulu@example.com", 12)],
+            [moved if c.name == "Festival" else c for c in repo.competitions if c.name != "Cup"]
+            + [added_competition],
+        )
+    assert changed == 4
+    keys, _ = repo.catalog.by_date()
+    assert [name for _, name in keys] == ["Festival", "Autumn", "Open", "Open Masters", "Classic"]
+    assert repo.catalog.by_name(has_places=True) == (["Autumn", "Festival", "Open", "Open Masters"], False)
+    now = datetime(2026, 1, 1)
+    assert repo.timeline.cutoff(now) == 1
+    assert repo.is_past(moved, now) and not repo.is_past(added_competition, now)
+    assert [club.name for club in repo.ranking.page(0, 10)] == ["Zulu", "Alpha"]
+    assert repo.club_names() == (["Alpha", "Zulu"], False)
+
+
+def test_merge_without_changes_keeps_everything():
+    repo = make_repository()
+    version = repo.version
+    index = repo._clubs_by_name
+    assert repo.merge(
+        [Club("Alpha", "alpha@example.com", 10), Club("Beta", "beta@example.com", 4)],
+        [Competition("Open", parseDate("2030-01-01 10:00:00"), 20)],
+    ) == 0
+    assert repo._clubs_by_name is index
+    assert repo.version == version
+
+
+def test_rollback_refunds_only_the_bookings_since_the_checkpoint():
+    repo = make_repository()
+    alpha, beta = repo.club_by_name("Alpha"), repo.club_by_name("Beta")
+    competition = repo.competition_by_name("Open")
+    repo.apply_booking(competition, alpha, 2)
+    assert repo.rollback() == []
+
+    repo.checkpoint()
+    repo.apply_booking(competition, alpha, 3)
+    repo.apply_booking(competition, beta, 4)
+    repo.apply_booking(competition, alpha, 1)
+    assert sorted(repo.rollback()) == [("Open", "Alpha", -4), ("Open", "Beta", -4)]
+
+    assert (alpha.points, beta.points, competition.number_of_places) == (8, 4, 18)
+    assert [c.name for c in repo.ranking.page(0, 10)] == ["Alpha", "Beta"]
+    # The refunds are not counted as new bookings
+    assert repo.rollback() == []
+
+
+def make_catalog_repository():
+    competitions = [
+        Competition(name, parseDate(date), places)
+        for name, date, places in [
+            ("Open", "2030-01-01 10:00:00", 20),
+            ("Cup", "2025-06-01 10:00:00", 5),
+            ("Classic", "2031-03-01 10:00:00", 0),
+            ("Open Masters", "2030-01-01 10:00:00", 1),
+            ("Festival", "2029-05-01 10:00:00", 3),
+        ]
+    ]
+    return Repository([Club("Alpha", "alpha@example.com", 10)], competitions)
+
+
+def test_catalog_pages_by_date_within_bounds():
+    catalog = make_catalog_repository().catalog
+    keys, more = catalog.by_date(limit=2)
+    assert [name for _, name in keys] == ["Cup", "Festival"] and more
+    keys, more = catalog.by_date(after=keys[-1], limit=2)
+    assert [name for _, name in keys] == ["Open", "Open Masters"] and more
+    keys, more = catalog.by_date(after=keys[-1], limit=2)
+    assert [name for _, name in keys] == ["Classic"] and not more
+
+    keys, _ = catalog.by_date(start=datetime(2029, 1, 1), end=datetime(2031, 1, 1))
+    assert [name for _, name in keys] == ["Festival", "Open", "Open Masters"]
+    keys, _ = catalog.by_date(start=datetime(2029, 1, 1), has_places=True)
+    assert [name for _, name in keys] == ["Festival", "Open", "Open Masters"]
+
+
+def test_catalog_follows_places_and_filters_by_prefix():
+    repo = make_catalog_repository()
+    masters = repo.competition_by_name("Open Masters")
+    repo.apply_booking(masters, repo.club_by_name("Alpha"), 1)
+    assert repo.catalog.by_name("Open", has_places=True) == (["Open"], False)
+    assert repo.catalog.by_name("Open") == (["Open", "Open Masters"], False)
+    assert repo.catalog.by_name("Open", limit=1) == (["Open"], True)
+    assert repo.catalog.by_name("Open", after="Open") == (["Open Masters"], False)
+
+    repo.apply_booking(masters, None, -2)
+    keys, _ = repo.catalog.by_date(has_places=True)
+    assert "Open Masters" in [name for _, name in keys]
+
+
+def test_club_names_page_by_prefix_and_follow_merges():
+    repo = make_repository()
+    assert repo.club_names() == (["Alpha", "Beta"], False)
+    assert repo.club_names("B") == (["Beta"], False)
+    assert repo.club_names(limit=1) == (["Alpha"], True)
+    assert repo.club_names(after="Alpha") == (["Beta"], False)
+    repo.merge([Club("Alpha", "alpha@example.com", 10), Club("Aardvark", "a@example.com", 1)],
+               [Competition("Open", parseDate("2030-01-01 10:00:00"), 0)])
+    assert repo.club_names("A") == (["Aardvark", "Alpha"], False)
+    assert repo.catalog.by_date(has_places=True) == ([], False)
+
+
+def test_ledger_pages_history_and_keeps_running_totals():
+    ledger = BookingLedger([
+        {"seq": 1, "competition": "Open", "club": "Alpha", "places": 2},
+        {"seq": 2, "competition": "Cup", "club": "Alpha", "places": 1},
+    ])
+    assert ledger.record("Open", "Beta", 4) == 2
+    ledger.record("Open", "Alpha", 3)
+
+    page, more = ledger.club_history("Alpha", limit=2)
+    assert page == [(0, "Open", "Alpha", 2), (1, "Cup", "Alpha", 1)] and more
+    page, more = ledger.club_history("Alpha", after=page[-1][0], limit=2)
+    assert page == [(3, "Open", "Alpha", 3)] and not more
+    assert [entry[2] for entry in ledger.competition_history("Open")[0]] == ["Alpha", "Beta", "Alpha"]
+    assert ledger.club_history("Nobody") == ([], False)
+
+    assert ledger.total("Open", "Alpha") == 5
+    assert (ledger.attendees("Open"), ledger.booked("Open")) == (2, 9)
+    # A refund that empties a club's places takes it off the attendees
+    ledger.record("Open", "Beta", -4)
+    assert (ledger.total("Open", "Beta"), ledger.attendees("Open"), ledger.booked("Open")) == (0, 1, 5)
+
+
+def test_ledger_undo_takes_an_entry_back():
+    ledger = BookingLedger()
+    ledger.record("Open", "Alpha", 2)
+    undone = ledger.record("Open", "Beta", 3)
+    ledger.record("Open", "Alpha", 1)
+    ledger.undo(undone)
+    assert [entry[0] for entry in ledger.competition_history("Open")[0]] == [0, 2]
+    assert ledger.club_history("Beta") == ([], False)
+    assert (ledger.total("Open", "Beta"), ledger.attendees("Open"), ledger.booked("Open")) == (0, 1, 3)
+    # Ids stay positions
+    assert ledger.record("Open", "Beta", 1) == 3
+
+
+def test_apply_booking_records_the_booking_in_the_ledger():
+    repository = Repository(
+        [Club("Alpha", "a@example.com", 20)],
+        [Competition("Open", parseDate("2030-01-01 10:00:00"), 20)],
+    )
+    repository.apply_booking(repository.competition_by_name("Open"), repository.club_by_name("Alpha"), 3)
+    assert repository.ledger.total("Open", "Alpha") == 3
+    repository.load(repository.clubs, repository.competitions,
+                    [{"seq": 1, "competition": "Open", "club": "Alpha", "places": 5}])
+    assert repository.ledger.total("Open", "Alpha") == 5
@@ -1,5 +1,10 @@
+import threading
+
 import pytest
+from jinja2 import Environment
+from unittest.mock import MagicMock, patch
 import server
+from storage import saveClubs, saveCompetitions
 
 
 @pytest.fixture()
@@ -25,15 +30,15 @@ def test_unknown_email_redirects_with_flash(client):
 
 
 def test_show_summary_valid_email(client):
-    email = server.clubs[0]["email"]
+    email = server.clubs[0].email
     response = client.post("/showSummary", data={"email": email})
     assert response.status_code == 200
     assert b"Welcome" in response.data
 
 
 def test_book_page_valid_route(client):
-    club = server.clubs[0]["name"]
-    competition = server.competitions[2]["name"] if len(server.competitions) > 2 else server.competitions[0]["name"]
+    club = server.clubs[0].name
+    competition = server.competitions[2].name if len(server.competitions) > 2 else server.competitions[0].name
     response = client.get(f"/book/{competition}/{club}")
     assert response.status_code == 200
     assert competition.encode() in response.data
@@ -56,7 +61,7 @@ def test_purchase_invalid_competition_or_club(client):
 
 
 def test_purchase_invalid_places_value(client):
-    club = server.clubs[0]["name"]
+    club = server.clubs[0].name
     competition = "Summer Championship"
     response = client.post("/purchasePlaces", data={
         "competition": competition,
@@ -67,7 +72,7 @@ def test_purchase_invalid_places_value(client):
 
 
 def test_purchase_non_positive_places(client):
-    club = server.clubs[0]["name"]
+    club = server.clubs[0].name
     competition = "Summer Championship"
     response = client.post("/purchasePlaces", data={
         "competition": competition,
@@ -78,7 +83,7 @@ def test_purchase_non_positive_places(client):
 
 
 def test_purchase_more_than_twelve_rejected(client):
-    club = server.clubs[0]["name"]
+    club = server.clubs[0].name
     competition = "Summer Championship"
     response = client.post("/purchasePlaces", data={
         "competition": competition,
@@ -89,13 +94,13 @@ def test_purchase_more_than_twelve_rejected(client):
 
 
 def test_purchase_more_than_available_rejected(client, monkeypatch):
-    club = server.clubs[0]["name"]
+    club = server.clubs[0].name
     competition = "Summer Championship"
 
     # Force low availability for deterministic behavior
     for comp in server.competitions:
-        if comp["name"] == competition:
-            comp["numberOfPlaces"] = "2"
+        if comp.name == competition:
+            comp.number_of_places = 2
 
     response = client.post("/purchasePlaces", data={
         "competition": competition,
@@ -107,11 +112,11 @@ def test_purchase_more_than_available_rejected(client, monkeypatch):
 
 def test_purchase_more_than_points_rejected(client):
     # Pick a club with very few points
-    low_points_club = next(c for c in server.clubs if int(c["points"]) <= 4)
+    low_points_club = next(c for c in server.clubs if c.points <= 4)
     competition = "Summer Championship"
     response = client.post("/purchasePlaces", data={
         "competition": competition,
-        "club": low_points_club["name"],
+        "club": low_points_club.name,
         "places": "5",
     })
     assert b"does not have enough points" in response.data
@@ -120,26 +125,26 @@ def test_purchase_more_than_points_rejected(client):
 def test_successful_booking_deducts_points_and_places(client):
     # Work on a fresh competition and club with known values
     club = server.clubs[0]
-    competition = next((c for c in server.competitions if c["name"] == "Summer Championship"), server.competitions[0])
+    competition = next((c for c in server.competitions if c.name == "Summer Championship"), server.competitions[0])
 
     # Save original values
-    original_points = int(club["points"])
-    original_places = int(competition["numberOfPlaces"])
+    original_points = club.points
+    original_places = competition.number_of_places
 
     # Ensure we can book 1 place
-    club["points"] = str(max(1, original_points))
-    competition["numberOfPlaces"] = str(max(1, original_places))
+    club.points = max(1, original_points)
+    competition.number_of_places = max(1, original_places)
 
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
-        "club": club["name"],
+        "competition": competition.name,
+        "club": club.name,
         "places": "1",
     })
     assert response.status_code == 200
     assert b"booking complete" in response.data.lower()
 
-    assert int(competition["numberOfPlaces"]) == max(1, original_places) - 1
-    assert int(club["points"]) == max(1, original_points) - 1
+    assert competition.number_of_places == max(1, original_places) - 1
+    assert club.points == max(1, original_points) - 1
 
 
 def test_public_scoreboard_accessible(client):
@@ -154,36 +159,165 @@ def test_login_link_to_scoreboard_present(client):
     assert b"Club Points" in response.data
 
 
-def test_points_deduction_persists_to_json(client, mock_save_functions):
-    """Test that points deduction triggers save functions"""
+def test_points_deduction_persists_to_journal(client, mock_save_functions, booking_journal):
+    """Test that a booking is journaled instead of rewriting the JSON files"""
     mock_save_clubs, mock_save_comps = mock_save_functions
     
     club = server.clubs[0]
     # Use the future competition
-    competition = next((c for c in server.competitions if c["name"] == "Summer Championship"), server.competitions[0])
-    initial_points = int(club["points"])
-    initial_places = int(competition["numberOfPlaces"])
+    competition = next((c for c in server.competitions if c.name == "Summer Championship"), server.competitions[0])
+    initial_points = club.points
+    initial_places = competition.number_of_places
     
     # Make a valid booking
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
-        "club": club["name"],
+        "competition": competition.name,
+        "club": club.name,
         "places": "2",
     })
     assert b"booking complete" in response.data.lower()
     
     # Verify in-memory changes
-    assert int(club["points"]) == initial_points - 2
-    assert int(competition["numberOfPlaces"]) == initial_places - 2
+    assert club.points == initial_points - 2
+    assert competition.number_of_places == initial_places - 2
     
-    # Verify save functions were called
-    mock_save_clubs.assert_called_once()
-    mock_save_comps.assert_called_once()
+    # Verify the booking was journaled and no snapshot was rewritten
+    assert [(r["competition"], r["club"], r["places"]) for r in booking_journal.replay()] == [
+        (competition.name, club.name, 2)
+    ]
+    mock_save_clubs.assert_not_called()
+    mock_save_comps.assert_not_called()
+
+
+def test_journal_compaction_is_left_to_the_background(client, monkeypatch, mock_save_functions, booking_journal):
+    """Test that reaching the compaction threshold wakes the compactor instead of writing snapshots"""
+    mock_save_clubs, mock_save_comps = mock_save_functions
+    monkeypatch.setitem(server.app.config, "JOURNAL_COMPACT_EVERY", 2)
+    request_compaction = MagicMock()
+    monkeypatch.setattr(server.compactor, "request", request_compaction)
+    for _ in range(2):
+        client.post("/purchasePlaces", data={
+            "competition": "Summer Championship",
+            "club": server.clubs[0].name,
+            "places": "1",
+        })
+
+    request_compaction.assert_called_once_with()
+    mock_save_clubs.assert_not_called()
+    mock_save_comps.assert_not_called()
+    assert len(booking_journal.replay()) == 2
+
+
+def test_reload_replays_journal_on_top_of_snapshots(booking_journal):
+    """Test that bookings journaled after the snapshot are applied on reload"""
+    club = server.clubs[0]
+    initial_points = club.points
+    booking_journal.append("Summer Championship", club.name, 2)
+
+    server.reloadData()
+
+    club = server.repository.club_by_name(club.name)
+    competition = server.repository.competition_by_name("Summer Championship")
+    assert club.points == initial_points - 2
+    assert competition.number_of_places == 8
+
+
+def test_hot_reload_applies_edited_files_and_keeps_bookings(client, tmp_path, booking_journal):
+    """Test that a competition added to the JSON file shows up without a restart"""
+    import json
+    clubs_path = tmp_path / "clubs.json"
+    competitions_path = tmp_path / "competitions.json"
+    clubs_path.write_text(json.dumps({"clubs": [c.to_json() for c in server.clubs]}))
+    competitions_path.write_text(json.dumps({"competitions": [c.to_json() for c in server.competitions]}))
+    storage = server.JsonStorage(booking_journal, clubs_path, competitions_path)
+    with patch.object(server, "storage", storage), patch.object(server.bookingEngine, "storage", storage):
+        club = server.clubs[0]
+        client.post("/purchasePlaces", data={"competition": "Summer Championship", "club": club.name, "places": "2"})
+        assert server.reloadChangedData() == 0
+        assert server.repository.club_by_name(club.name) is club
+
+        data = json.loads(competitions_path.read_text())
+        data["competitions"].append({"name": "Winter Cup", "date": "2027-01-10 10:00:00", "numberOfPlaces": "15"})
+        competitions_path.write_text(json.dumps(data))
+        assert server.reloadChangedData() == 1
+
+    assert server.repository.competition_by_name("Winter Cup").number_of_places == 15
+    assert server.repository.club_by_name(club.name) is club
+    assert server.repository.competition_by_name("Summer Championship").number_of_places == 8
+    response = client.post("/showSummary", data={"email": club.email})
+    assert b"Winter Cup" in response.data
+
+
+def test_hot_reload_parses_the_files_without_holding_off_bookings(client, tmp_path, booking_journal):
+    import json
+    clubs_path = tmp_path / "clubs.json"
+    competitions_path = tmp_path / "competitions.json"
+    clubs_path.write_text(json.dumps({"clubs": [c.to_json() for c in server.clubs]}))
+    competitions_path.write_text(json.dumps({"competitions": [c.to_json() for c in server.competitions]}))
+    storage = server.JsonStorage(booking_journal, clubs_path, competitions_path)
+    read_snapshots = storage.read_snapshots
+    booked = []
+
+    def read_while_booking():
+        snapshots = read_snapshots()
+        # A booking made while the files are parsed neither waits nor gets lost
+        thread = threading.Thread(target=lambda: booked.append(
+            server.bookingEngine.book("Fall Classic", "Simply Lift", 2)))
+        thread.start()
+        thread.join(5)
+        return snapshots
+
+    with patch.object(server, "storage", storage), patch.object(server.bookingEngine, "storage", storage), \
+            patch.object(storage, "read_snapshots", read_while_booking):
+        assert server.reloadChangedData() == 0
+    assert len(booked) == 1
+    assert server.repository.club_by_name("Simply Lift").points == 10
+
+
+def test_json_load_parses_again_when_the_snapshots_were_replaced(tmp_path, booking_journal):
+    import json
+    clubs_path = tmp_path / "clubs.json"
+    competitions_path = tmp_path / "competitions.json"
+    clubs_path.write_text(json.dumps({"clubs": [c.to_json() for c in server.clubs]}))
+    competitions_path.write_text(json.dumps({"competitions": [c.to_json() for c in server.competitions]}))
+    storage = server.JsonStorage(booking_journal, clubs_path, competitions_path)
+    snapshots = storage.read_snapshots()
+    clubs, competitions = storage.load()
+    storage.record_booking("Fall Classic", "Simply Lift", 3)
+    club = next(club for club in clubs if club.name == "Simply Lift")
+    club.points -= 3
+    # A compaction after the parse folds the journal into new files
+    with patch("storage.saveClubs", saveClubs), patch("storage.saveCompetitions", saveCompetitions):
+        storage.compact(clubs, competitions)
+    clubs, _ = storage.load(snapshots)
+    assert next(club for club in clubs if club.name == "Simply Lift").points == 9
+
+
+def test_compaction_is_not_taken_for_an_edit(monkeypatch, tmp_path, booking_journal):
+    import json
+    clubs_path = tmp_path / "clubs.json"
+    competitions_path = tmp_path / "competitions.json"
+    clubs_path.write_text(json.dumps({"clubs": [c.to_json() for c in server.clubs]}))
+    competitions_path.write_text(json.dumps({"competitions": [c.to_json() for c in server.competitions]}))
+    storage = server.JsonStorage(booking_journal, clubs_path, competitions_path)
+    watcher = server.FileWatcher([clubs_path, competitions_path], lambda: None)
+    monkeypatch.setattr(server, "fileWatcher", watcher)
+    monkeypatch.setattr(server.bookingEngine, "storage", storage)
+    server.bookingEngine.book("Fall Classic", "Simply Lift", 1)
+    with patch("storage.saveClubs", saveClubs), patch("storage.saveCompetitions", saveCompetitions):
+        assert server.compactor.compact() is True
+    assert not watcher.check()
+
+
+def test_hot_reload_needs_json_files_on_disk():
+    with pytest.raises(ValueError, match="Hot reload"):
+        server.startHotReload(dict(server.app.config, HOT_RELOAD_INTERVAL=1.0, PERSISTENCE_MODE="write-behind"))
+    assert server.startHotReload(dict(server.app.config, HOT_RELOAD_INTERVAL=0)) is None
 
 
 def test_cannot_book_past_competition(client):
     """Test that booking a past competition is rejected"""
-    club = server.clubs[0]["name"]
+    club = server.clubs[0].name
     # Use a past competition (Spring Festival from 2020)
     past_competition = "Spring Festival"
     
@@ -205,39 +339,573 @@ def test_multiple_bookings_accumulate_deductions(client):
     """Test that multiple bookings properly accumulate point deductions"""
     club = server.clubs[0]
     # Use the future competition
-    competition = next((c for c in server.competitions if c["name"] == "Summer Championship"), server.competitions[0])
+    competition = next((c for c in server.competitions if c.name == "Summer Championship"), server.competitions[0])
     
     # Ensure sufficient points and places
-    club["points"] = "20"
-    competition["numberOfPlaces"] = "20"
+    club.points = 20
+    competition.number_of_places = 20
     
     initial_points = 20
     
     # First booking
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
-        "club": club["name"],
+        "competition": competition.name,
+        "club": club.name,
         "places": "3",
     })
     assert b"booking complete" in response.data.lower()
-    assert int(club["points"]) == initial_points - 3
+    assert club.points == initial_points - 3
     
     # Second booking
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
-        "club": club["name"],
+        "competition": competition.name,
+        "club": club.name,
         "places": "2",
     })
     assert b"booking complete" in response.data.lower()
-    assert int(club["points"]) == initial_points - 5
+    assert club.points == initial_points - 5
     
     # Third booking
     response = client.post("/purchasePlaces", data={
-        "competition": competition["name"],
-        "club": club["name"],
+        "competition": competition.name,
+        "club": club.name,
         "places": "1",
     })
     assert b"booking complete" in response.data.lower()
-    assert int(club["points"]) == initial_points - 6
+    assert club.points == initial_points - 6
+
+
+
+
+def test_unknown_storage_backend_rejected():
+    with pytest.raises(ValueError):
+        server.createStorage({"STORAGE_BACKEND": "csv"})
+
+
+def test_persistence_modes(tmp_path):
+    config = dict(server.app.config, JOURNAL_PATH=str(tmp_path / "bookings.journal"))
+    with pytest.raises(ValueError, match="persistence mode"):
+        server.createStorage(dict(config, PERSISTENCE_MODE="eventually"))
+    storage = server.createStorage(dict(config, PERSISTENCE_MODE="write-behind", WRITE_BEHIND_EVERY=7))
+    assert isinstance(storage, server.WriteBehindStorage)
+    assert storage.flush_every == 7
+    assert storage.flush_interval == config["WRITE_BEHIND_INTERVAL_MS"] / 1000
+    storage.close()
+
+
+def test_import_sqlite_command(tmp_path, monkeypatch):
+    database = tmp_path / "gudlft.sqlite3"
+    monkeypatch.setitem(server.app.config, "SQLITE_PATH", str(database))
+    monkeypatch.setitem(server.app.config, "JOURNAL_PATH", str(tmp_path / "bookings.journal"))
+    monkeypatch.setitem(server.app.config, "LEDGER_PATH", str(tmp_path / "bookings.ledger"))
+    journal = server.BookingJournal(tmp_path / "bookings.journal", fsync="never",
+                                    archive_path=tmp_path / "bookings.ledger")
+    journal.append("Fall Classic", "Simply Lift", 4)
+    journal.truncate()
+    # Journaled since the last compaction: not in the snapshots yet
+    journal.append("Fall Classic", "Simply Lift", 5)
+    journal.close()
+    result = server.app.test_cli_runner().invoke(args=["import-sqlite"])
+    assert "Imported 3 clubs, 3 competitions and 2 bookings" in result.output
+
+    imported = server.SqliteStorage(database)
+    clubs, competitions = imported.load()
+    points = {club.name: club.points for club in clubs}
+    assert points["Simply Lift"] == 7
+    assert [(record["club"], record["places"]) for record in imported.history()] == [
+        ("Simply Lift", 4), ("Simply Lift", 5)]
+    # The cap carries over: 9 places are already held
+    with pytest.raises(server.BookingError, match="more than 12"):
+        imported.record_booking("Fall Classic", "Simply Lift", 4)
+    imported.close()
+
+
+def test_scoreboard_is_paginated(client):
+    response = client.get("/clubs?page=1&limit=2")
+    assert b"Simply Lift" in response.data
+    assert b"She Lifts" in response.data
+    assert b"Iron Temple" not in response.data
+    assert b"page=2" in response.data
+
+    response = client.get("/clubs?page=2&limit=2")
+    assert b"Iron Temple" in response.data
+    assert b"Simply Lift" not in response.data
+    assert b"page=1" in response.data
+
+
+def test_scoreboard_ignores_invalid_pagination(client):
+    response = client.get("/clubs?page=abc&limit=-4")
+    assert response.status_code == 200
+    assert b"Iron Temple" in response.data
+
+
+def test_scoreboard_html_is_cached_until_points_change(client):
+    with patch("server.render_template", wraps=server.render_template) as render:
+        client.get("/clubs")
+        client.get("/clubs")
+        assert render.call_count == 1
+
+        client.post("/purchasePlaces", data={
+            "competition": "Summer Championship",
+            "club": "Simply Lift",
+            "places": "1",
+        })
+        render.reset_mock()
+        response = client.get("/clubs")
+        assert render.call_count == 1
+    assert b"11" in response.data
+
+
+def test_index_served_with_etag_and_304(client):
+    response = client.get("/")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "public, no-cache"
+
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_index_with_flash_message_is_not_cached(client):
+    client.post("/showSummary", data={"email": "unknown@example.com"})
+    response = client.get("/")
+    assert b"Unknown email address" in response.data
+    assert "ETag" not in response.headers
+
+
+def test_scoreboard_304_until_a_booking_changes_the_data(client):
+    etag = client.get("/clubs").headers["ETag"]
+    with patch("server.render_template") as render:
+        response = client.get("/clubs", headers={"If-None-Match": etag})
+        render.assert_not_called()
+    assert response.status_code == 304
+
+    client.post("/purchasePlaces", data={
+        "competition": "Summer Championship",
+        "club": "Simply Lift",
+        "places": "1",
+    })
+    response = client.get("/clubs", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
 
+def test_etags_do_not_survive_a_reload(client):
+    etag = client.get("/clubs").headers["ETag"]
+    version = server.repository.version
+    server.repository.load(server.storage.load()[0], server.repository.competitions)
+    server.repository.version = version
+    response = client.get("/clubs", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_scoreboard_revalidates_by_etag_only(client):
+    response = client.get("/clubs")
+    assert "Last-Modified" not in response.headers
+    server.bookingEngine.book("Fall Classic", "Simply Lift", 1)
+    # A booking within the same second as the last response is still seen
+    response = client.get("/clubs", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200
+    assert b"11" in response.data
+
+
+def test_welcome_page_carries_private_etag_per_club(client):
+    first = client.post("/showSummary", data={"email": server.clubs[0].email})
+    second = client.post("/showSummary", data={"email": server.clubs[1].email})
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+    # Conditional POSTs are always answered in full
+    response = client.post("/showSummary", data={"email": server.clubs[0].email},
+                           headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert b"Welcome" in response.data
+
+
+@pytest.fixture()
+def streaming(monkeypatch):
+    monkeypatch.setitem(server.app.config, "STREAM_TEMPLATES", True)
+
+
+def test_welcome_page_streams_in_streaming_mode(client, streaming):
+    with patch("server.render_template") as render:
+        response = client.post("/showSummary", data={"email": server.clubs[0].email})
+        render.assert_not_called()
+    assert b"Welcome" in response.data
+    assert b"Summer Championship" in response.data
+    assert b"(Past competition - booking closed)" in response.data
+
+
+def test_streamed_flash_messages_are_consumed_once(client, streaming):
+    response = client.post("/purchasePlaces", data={
+        "competition": "Summer Championship",
+        "club": "Simply Lift",
+        "places": "1",
+    })
+    assert b"booking complete" in response.data.lower()
 
+    response = client.get("/")
+    assert b"booking complete" not in response.data.lower()
+
+
+def test_streamed_scoreboard_fills_the_page_cache(client, streaming):
+    with patch("server.streamTemplate", wraps=server.streamTemplate) as stream:
+        streamed = client.get("/clubs").data
+        assert b"Simply Lift" in streamed
+        assert client.get("/clubs").data == streamed
+        assert stream.call_count == 1
+
+
+def test_batch_booking_api_books_all_and_persists_once(client, booking_journal):
+    response = client.post("/api/bookings", json={"bookings": [
+        {"competition": "Summer Championship", "club": "Simply Lift", "places": 2},
+        {"competition": "Fall Classic", "club": "Simply Lift", "places": 3},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "booked": 2,
+        "points": {"Simply Lift": 7},
+        "places": {"Summer Championship": 8, "Fall Classic": 8},
+    }
+    with open(booking_journal.path) as f:
+        assert len(f.readlines()) == 1
+
+
+def test_batch_booking_api_reports_every_invalid_item(client):
+    response = client.post("/api/bookings", json={"bookings": [
+        {"competition": "Spring Festival", "club": "Simply Lift", "places": 1},
+        {"competition": "Summer Championship", "club": "Simply Lift", "places": "2"},
+        {"competition": "Summer Championship", "club": "Nobody", "places": 1},
+        {"competition": "Summer Championship", "club": "Simply Lift", "places": 0},
+        "not a booking",
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [
+        {"index": 0, "error": "Cannot book places for past competitions"},
+        {"index": 1, "error": "Invalid number of places."},
+        {"index": 2, "error": "Invalid club or competition."},
+        {"index": 3, "error": "You must request at least 1 place."},
+        {"index": 4, "error": "Each booking must be an object."},
+    ]
+
+
+def test_batch_booking_api_is_all_or_nothing(client, booking_journal):
+    response = client.post("/api/bookings", json={"bookings": [
+        {"competition": "Summer Championship", "club": "Iron Temple", "places": 2},
+        {"competition": "Fall Classic", "club": "Iron Temple", "places": 2},
+    ]})
+    assert response.status_code == 409
+    assert response.get_json()["errors"][0]["index"] == 1
+    assert server.repository.club_by_name("Iron Temple").points == 3
+    assert server.repository.competition_by_name("Summer Championship").number_of_places == 10
+    assert booking_journal.replay() == []
+
+
+@pytest.mark.parametrize("payload", [None, {}, {"bookings": []}, {"bookings": "x"}, [1, 2]])
+def test_batch_booking_api_rejects_malformed_bodies(client, payload):
+    response = client.post("/api/bookings", json=payload)
+    assert response.status_code == 400
+
+
+def test_metrics_endpoint_reports_latency_and_phases(client):
+    club = server.clubs[0]
+    client.post("/showSummary", data={"email": club.email})
+    client.post("/purchasePlaces", data={"competition": "Summer Championship", "club": club.name, "places": "1"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    body = response.get_data(as_text=True)
+    assert 'gudlft_request_duration_seconds_count{endpoint="showSummary"}' in body
+    for phase in ("lookup", "date", "render", "save"):
+        assert f'gudlft_phase_duration_seconds_count{{endpoint="purchasePlaces",phase="{phase}"}}' in body
+
+
+def test_metrics_can_be_switched_off(client, monkeypatch):
+    monkeypatch.setitem(server.app.config, "METRICS", False)
+    before = server.requestLatency.collect().get(("displayClubsPoints",), [0])
+    client.get("/clubs")
+    assert server.requestLatency.collect().get(("displayClubsPoints",), [0]) == before
+
+
+def test_profile_header_dumps_the_request_profile(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "requestProfiler", server.RequestProfiler(tmp_path, header="X-Profile"))
+    client.get("/clubs")
+    assert not tmp_path.exists() or not any(tmp_path.iterdir())
+
+    client.get("/clubs", headers={"X-Profile": "1"})
+    assert len(list((tmp_path / "displayClubsPoints").glob("*.pstats"))) == 1
+
+    monkeypatch.setitem(server.app.config, "PROFILE_DIR", str(tmp_path))
+    result = server.app.test_cli_runner().invoke(args=["profile-report", "--top", "3"])
+    assert "1 cProfile profiles, top 3 by own time" in result.output
+
+
+def test_seed_and_reset_endpoints_restore_the_seeded_data(client, monkeypatch, mock_save_functions):
+    assert client.post("/_test/seed").status_code == 404
+    monkeypatch.setitem(server.app.config, "TEST_ENDPOINTS", True)
+    monkeypatch.setattr(server, "seededWith", None)
+    assert client.post("/_test/reset").status_code == 409
+
+    seeded = client.post("/_test/seed", json={"clubs": 20, "competitions": 10, "seed": 7}).get_json()
+    assert seeded == {"clubs": 20, "competitions": 10, "firstUpcoming": 2, "generated": True, "refunded": 0}
+    assert len(server.clubs) == 20
+    mock_save_clubs, _ = mock_save_functions
+    assert len(mock_save_clubs.call_args.args[0]) == 20
+
+    club = server.clubs[3]
+    competition = server.competitions[5]
+    points, places = club.points, competition.number_of_places
+    for _ in range(2):
+        client.post("/purchasePlaces", data={"competition": competition.name, "club": club.name, "places": "2"})
+    assert club.points == points - 4
+
+    assert client.post("/_test/reset").get_json() == {"refunded": 1}
+    assert (club.points, competition.number_of_places) == (points, places)
+    client.post("/purchasePlaces", data={"competition": competition.name, "club": club.name, "places": "1"})
+    # Seeding alike again only resets
+    again = client.post("/_test/seed", json={"clubs": 20, "competitions": 10, "seed": 7}).get_json()
+    assert (again["generated"], again["refunded"]) == (False, 1)
+    assert server.repository.club_by_name(club.name) is club
+    assert club.points == points
+    assert client.post("/_test/seed", json={"clubs": "many"}).status_code == 400
+
+
+def test_api_competitions_filters_and_pages_with_a_cursor(client):
+    everything = client.get("/api/competitions").get_json()
+    assert [c["name"] for c in everything["competitions"]] == ["Spring Festival", "Summer Championship", "Fall Classic"]
+    assert everything["competitions"][0] == {
+        "name": "Spring Festival", "date": "2020-03-27T10:00:00", "numberOfPlaces": 10, "isPast": True}
+    assert everything["next"] is None
+
+    first = client.get("/api/competitions?upcoming=1&limit=1").get_json()
+    assert [c["name"] for c in first["competitions"]] == ["Summer Championship"]
+    second = client.get(f"/api/competitions?upcoming=1&limit=1&cursor={first['next']}").get_json()
+    assert [c["name"] for c in second["competitions"]] == ["Fall Classic"]
+    assert second["next"] is None
+
+    ranged = client.get("/api/competitions?from=2026-01-01&to=2027-01-01").get_json()
+    assert [c["name"] for c in ranged["competitions"]] == ["Summer Championship"]
+    prefixed = client.get("/api/competitions?prefix=S").get_json()
+    assert [c["name"] for c in prefixed["competitions"]] == ["Spring Festival", "Summer Championship"]
+
+    client.post("/api/bookings", json={"bookings": [
+        {"competition": "Summer Championship", "club": "Simply Lift", "places": 10}]})
+    open_ones = client.get("/api/competitions?has_places=true").get_json()
+    assert [c["name"] for c in open_ones["competitions"]] == ["Spring Festival", "Fall Classic"]
+
+
+def test_api_rejects_bad_arguments_and_answers_not_modified(client):
+    assert client.get("/api/competitions?from=tomorrow").status_code == 400
+    assert client.get("/api/competitions?from=2026-01-01T00:00:00%2B00:00").status_code == 400
+    assert client.get("/api/competitions?cursor=garbage").status_code == 400
+    date_cursor = client.get("/api/competitions?limit=1").get_json()["next"]
+    # A cursor only fits the ordering it came from
+    assert client.get(f"/api/competitions?prefix=S&cursor={date_cursor}").status_code == 400
+    # Date bounds do not follow the name order of a prefix query
+    assert client.get("/api/competitions?prefix=S&from=2026-01-01").status_code == 400
+    assert client.get("/api/competitions?prefix=S&upcoming=1").status_code == 400
+
+    # isPast follows the clock: revalidation goes through the ETag, which holds the cutoff
+    competitions = client.get("/api/competitions")
+    assert "Last-Modified" not in competitions.headers
+    response = client.get("/api/competitions", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200
+
+    response = client.get("/api/clubs?limit=2")
+    assert response.get_json() == {"clubs": [{"name": "Iron Temple", "points": 3},
+                                             {"name": "She Lifts", "points": 10}],
+                                   "next": response.get_json()["next"]}
+    rest = client.get(f"/api/clubs?cursor={response.get_json()['next']}").get_json()
+    assert rest == {"clubs": [{"name": "Simply Lift", "points": 12}], "next": None}
+    assert b"@" not in response.data
+
+    cached = client.get("/api/clubs?limit=2", headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+
+
+def test_welcome_list_is_shared_between_clubs_and_follows_bookings(client, monkeypatch):
+    monkeypatch.setattr(server, "welcomeFragments", server.FragmentCache(2 ** 20))
+    cache = server.welcomeFragments
+    john = client.post("/showSummary", data={"email": "john@simplylift.co"}).data
+    assert b"/book/Fall%20Classic/Simply%20Lift" in john
+    assert cache.misses["competition"] == 3
+    kate = client.post("/showSummary", data={"email": "kate@shelifts.co.uk"}).data
+    assert b"/book/Fall%20Classic/She%20Lifts" in kate
+    assert b"Simply%20Lift" not in kate
+    assert cache.hits["list"] == 1
+
+    client.post("/purchasePlaces", data={"competition": "Fall Classic", "club": "She Lifts", "places": "2"})
+    # The booking changed one competition: the other items are taken from the last list
+    assert cache.misses["competition"] == 4
+    assert cache.misses["list"] == 2
+    assert b"Number of Places: 9" in client.post("/showSummary", data={"email": "kate@shelifts.co.uk"}).data
+
+    monkeypatch.setattr(server, "welcomeFragments", None)
+    uncached = client.post("/showSummary", data={"email": "kate@shelifts.co.uk"}).data
+    monkeypatch.setattr(server, "welcomeFragments", cache)
+    assert client.post("/showSummary", data={"email": "kate@shelifts.co.uk"}).data.split() == uncached.split()
+    assert b'gudlft_welcome_fragments_hits_total{kind="list"}' in client.get("/metrics").data
+
+
+def test_welcome_list_larger_than_the_cache_is_rendered_in_full(client, monkeypatch):
+    monkeypatch.setattr(server, "welcomeFragments", server.FragmentCache(1000))
+    monkeypatch.setattr(server, "welcomeListLimit", None)
+    first = client.post("/showSummary", data={"email": "john@simplylift.co"}).data
+    assert server.welcomeListLimit == len(server.competitions)
+    misses = dict(server.welcomeFragments.misses)
+    again = client.post("/showSummary", data={"email": "kate@shelifts.co.uk"}).data
+    assert b"/book/Fall%20Classic/She%20Lifts" in again and b"Fall Classic" in first
+    assert dict(server.welcomeFragments.misses) == misses
+
+
+def test_session_login_serves_the_summary_on_get(client):
+    response = client.get("/showSummary", follow_redirects=True)
+    assert b"Please log in" in response.data
+
+    club = server.clubs[0]
+    client.post("/showSummary", data={"email": club.email})
+    with patch("server.repository.club_by_email") as lookup:
+        response = client.get("/showSummary")
+        lookup.assert_not_called()
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert club.email.encode() in response.data
+
+    response = client.get("/showSummary", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    client.get("/logout")
+    response = client.get("/showSummary")
+    assert response.status_code == 302
+
+
+def test_session_acts_for_its_own_club_only(client):
+    club, other = server.clubs[0], server.clubs[1]
+    client.post("/showSummary", data={"email": club.email})
+    response = client.get(f"/book/Summer Championship/{other.name}", follow_redirects=True)
+    assert b"Something went wrong" in response.data
+
+    points = int(club.points)
+    response = client.post("/purchasePlaces", data={"competition": "Summer Championship", "places": "1"})
+    assert b"booking complete" in response.data
+    assert int(club.points) == points - 1
+
+    response = client.post("/purchasePlaces", data={
+        "competition": "Summer Championship", "club": other.name, "places": "1"})
+    assert b"booking complete" not in response.data
+
+    # A past competition sends the logged-in club back to its summary
+    response = client.get(f"/book/Spring Festival/{club.name}", follow_redirects=True)
+    assert response.status_code == 200
+    assert b"Welcome" in response.data
+
+
+def test_templates_compile_once_into_the_bytecode_cache(tmp_path):
+    assert server.createBytecodeCache("") is None
+    # A directory that cannot be created, as on a read-only deploy, turns the cache off
+    (tmp_path / "read-only").write_text("")
+    assert server.createBytecodeCache(str(tmp_path / "read-only" / "jinja")) is None
+    cache = server.createBytecodeCache(str(tmp_path / "jinja"))
+    Environment(loader=server.app.jinja_loader, bytecode_cache=cache).get_template("welcome.html")
+    assert list((tmp_path / "jinja").iterdir())
+
+    # A new process only loads the compiled code
+    restarted = Environment(loader=server.app.jinja_loader, bytecode_cache=cache)
+    with patch.object(restarted, "compile") as compile:
+        restarted.get_template("welcome.html")
+        compile.assert_not_called()
+
+
+def test_warm_up_compiles_every_template(client):
+    server.app.jinja_env.cache.clear()
+    server.warmUp()
+    cached = {name for _, name in server.app.jinja_env.cache.keys()}
+    assert cached == set(server.app.jinja_env.list_templates())
+
+
+def test_warm_up_without_the_welcome_cache(client, monkeypatch):
+    # GUDLFT_WARMUP=1 with GUDLFT_WELCOME_CACHE_BYTES=0
+    monkeypatch.setattr(server, "welcomeFragments", None)
+    server.warmUp()
+    response = client.post("/showSummary", data={"email": server.clubs[0].email})
+    assert b"Fall Classic" in response.data
+
+
+def test_requests_wait_for_the_background_load(monkeypatch):
+    monkeypatch.setattr(server, "dataReady", threading.Event())
+    loaded = threading.Event()
+    monkeypatch.setattr(server, "reloadData", lambda: loaded.wait())
+    responses = []
+    request = threading.Thread(target=lambda: responses.append(server.app.test_client().get("/clubs")))
+    request.start()
+    request.join(0.05)
+    assert not responses
+
+    loaded.set()
+    server.loadDataInBackground(warm_up=False)
+    request.join()
+    assert responses[0].status_code == 200
+
+
+def test_failed_background_load_answers_503(client, monkeypatch):
+    monkeypatch.setattr(server, "dataReady", threading.Event())
+    monkeypatch.setattr(server, "dataLoadError", None)
+
+    def fail():
+        raise OSError("clubs.json is unreadable")
+
+    monkeypatch.setattr(server, "reloadData", fail)
+    server.loadDataInBackground(warm_up=False)
+    assert client.get("/").status_code == 503
+
+
+def test_booking_history_api_and_cumulative_cap(client):
+    club = server.clubs[0]
+    for places in ("2", "3"):
+        client.post("/purchasePlaces", data={"competition": "Fall Classic", "club": club.name, "places": places})
+    response = client.get(f"/book/Fall Classic/{club.name}")
+    assert b"already holds here: 5 of 12" in response.data
+
+    response = client.get(f"/api/clubs/{club.name}/bookings?limit=1")
+    assert response.json["bookings"] == [{"id": 0, "competition": "Fall Classic", "places": 2}]
+    response = client.get(f"/api/clubs/{club.name}/bookings?limit=1&cursor={response.json['next']}")
+    assert response.json["bookings"] == [{"id": 1, "competition": "Fall Classic", "places": 3}]
+    assert response.json["next"] is None
+
+    response = client.get("/api/competitions/Fall Classic/bookings")
+    assert response.json["attendees"] == 1
+    assert response.json["placesBooked"] == 5
+    assert response.json["bookings"][-1]["clubTotal"] == 5
+
+    assert client.get("/api/clubs/Nobody/bookings").status_code == 404
+    assert client.get("/api/competitions/Fall Classic/bookings?cursor=abc").status_code == 400
+
+
+def test_login_then_book_acts_for_the_logged_in_club(client):
+    # The Locust book flow: each booking logs in as the club it books for first
+    for club in (server.clubs[0], server.clubs[2]):
+        client.post("/showSummary", data={"email": club.email})
+        response = client.get(f"/book/Fall Classic/{club.name}")
+        assert response.status_code == 200
+        response = client.post("/purchasePlaces", data={
+            "competition": "Fall Classic", "club": club.name, "places": "1"})
+        assert b"booking complete" in response.data
+
+    # After a logout the form's club is used again
+    client.get("/logout")
+    response = client.post("/purchasePlaces", data={
+        "competition": "Fall Classic", "club": server.clubs[0].name, "places": "1"})
+    assert b"booking complete" in response.data
+
+
+def test_summary_revalidates_by_etag_only_since_it_follows_the_clock(client, monkeypatch):
+    client.post("/showSummary", data={"email": server.clubs[0].email})
+    response = client.get("/showSummary")
+    assert "Last-Modified" not in response.headers
+
+    # Fall Classic is past now: a client holding only a date must not get a 304
+    monkeypatch.setattr(server, "currentTime", lambda: server.datetime(2027, 10, 23))
+    response = client.get("/showSummary", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200
@@ -0,0 +1,151 @@
+import json
+import threading
+import types
+
+import pytest
+
+from booking import BookingError
+from journal import BookingJournal
+from models import Club, Competition
+from storage import JsonStorage, SqliteStorage, loadClubs, readSnapshot, saveClubs, saveCompetitions
+
+
+CLUBS = [
+    {"name": "Alpha", "email": "alpha@example.com", "points": "10"},
+    {"name": "Beta", "email": "beta@example.com", "points": "4"},
+]
+COMPETITIONS = [
+    {"name": "Open", "date": "2030-01-01 10:00:00", "numberOfPlaces": "20"},
+]
+
+
+def write_snapshots(tmp_path, clubs_sequence=None, competitions_sequence=None):
+    clubs = {"clubs": CLUBS}
+    competitions = {"competitions": COMPETITIONS}
+    if clubs_sequence is not None:
+        clubs["journalSequence"] = clubs_sequence
+    if competitions_sequence is not None:
+        competitions["journalSequence"] = competitions_sequence
+    (tmp_path / "clubs.json").write_text(json.dumps(clubs))
+    (tmp_path / "competitions.json").write_text(json.dumps(competitions))
+
+
+def json_storage(tmp_path):
+    return JsonStorage(
+        BookingJournal(tmp_path / "bookings.journal", fsync="never"),
+        clubs_path=tmp_path / "clubs.json",
+        competitions_path=tmp_path / "competitions.json",
+    )
+
+
+def test_json_load_applies_journal_after_snapshot_sequence(tmp_path):
+    # The competitions snapshot already holds booking 1, the clubs snapshot does not
+    write_snapshots(tmp_path, clubs_sequence=0, competitions_sequence=1)
+    journal = BookingJournal(tmp_path / "bookings.journal")
+    journal.append("Open", "Alpha", 2)
+    journal.append("Open", "Beta", 1)
+    journal.close()
+
+    storage = json_storage(tmp_path)
+    clubs, competitions = storage.load()
+    assert [c.points for c in clubs] == [8, 3]
+    assert competitions[0].number_of_places == 19
+    assert storage.record_booking("Open", "Alpha", 1)["seq"] == 3
+
+
+def test_json_load_resumes_sequence_from_snapshots(tmp_path):
+    write_snapshots(tmp_path, clubs_sequence=7, competitions_sequence=7)
+    storage = json_storage(tmp_path)
+    storage.load()
+    assert storage.record_booking("Open", "Alpha", 1)["seq"] == 8
+
+
+def test_sqlite_import_and_load_round_trip(tmp_path):
+    storage = SqliteStorage(tmp_path / "gudlft.sqlite3")
+    clubs = [Club.from_json(c) for c in CLUBS]
+    competitions = [Competition.from_json(c) for c in COMPETITIONS]
+    storage.import_records(clubs + [Club("Alpha", "dup@example.com", 1)], competitions)
+    assert storage.load() == (clubs, competitions)
+
+
+def test_sqlite_uses_wal_and_pools_its_connections(tmp_path):
+    storage = SqliteStorage(tmp_path / "gudlft.sqlite3", pool_size=2)
+    with storage._connection() as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    with storage._connection() as again:
+        assert again is connection
+    # Short-lived threads reuse the pooled connections instead of keeping their own
+    threads = [threading.Thread(target=storage.history) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(storage._idle) <= 2
+
+    entered, gate = threading.Barrier(4), threading.Event()
+
+    def hold():
+        with storage._connection():
+            entered.wait()
+            gate.wait()
+
+    threads = [threading.Thread(target=hold) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    entered.wait()
+    # Three connections are out at once; only the pool size stays open once they are back
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert len(storage._idle) == 2
+    storage.close()
+    assert storage._idle == []
+
+
+def test_sqlite_booking_is_a_conditional_update(tmp_path):
+    storage = SqliteStorage(tmp_path / "gudlft.sqlite3")
+    storage.import_records([Club.from_json(c) for c in CLUBS], [Competition.from_json(c) for c in COMPETITIONS])
+    storage.record_booking("Open", "Alpha", 3)
+    with pytest.raises(BookingError, match="does not have enough points"):
+        storage.record_booking("Open", "Beta", 5)
+    with pytest.raises(BookingError, match="Not enough places"):
+        storage.record_booking("Open", "Alpha", 21)
+
+    clubs, competitions = storage.load()
+    # The refused bookings were rolled back entirely
+    assert [c.points for c in clubs] == [7, 4]
+    assert competitions[0].number_of_places == 17
+    assert storage.changes() == []
+
+
+
+@pytest.mark.parametrize("format", ["pretty", "compact", "ndjson"])
+def test_snapshot_formats_round_trip(tmp_path, format):
+    clubs = [Club.from_json(c) for c in CLUBS]
+    competitions = [Competition.from_json(c) for c in COMPETITIONS]
+    saveClubs(clubs, 7, path=tmp_path / "clubs.json", format=format)
+    saveCompetitions(competitions, path=tmp_path / "competitions.json", format=format)
+
+    assert loadClubs(tmp_path / "clubs.json") == clubs
+    sequence, records = readSnapshot(tmp_path / "clubs.json", "clubs")
+    assert sequence == 7
+    assert list(records) == CLUBS
+    storage = JsonStorage(BookingJournal(tmp_path / "bookings.journal"),
+                          tmp_path / "clubs.json", tmp_path / "competitions.json")
+    assert storage.load() == (clubs, competitions)
+
+
+def test_snapshot_layouts(tmp_path):
+    clubs = [Club.from_json(c) for c in CLUBS]
+    saveClubs(clubs, path=tmp_path / "pretty.json")
+    assert (tmp_path / "pretty.json").read_text() == json.dumps({"clubs": CLUBS}, indent=4)
+    saveClubs(clubs, path=tmp_path / "compact.json", format="compact")
+    assert (tmp_path / "compact.json").read_bytes().count(b"\n") == 0
+    saveClubs(clubs, 3, path=tmp_path / "clubs.ndjson", format="ndjson")
+    lines = (tmp_path / "clubs.ndjson").read_text().splitlines()
+    assert json.loads(lines[0]) == {"snapshot": "clubs", "journalSequence": 3}
+    assert [json.loads(line) for line in lines[1:]] == CLUBS
+    # Newline-delimited records are parsed lazily, one line at a time
+    assert isinstance(readSnapshot(tmp_path / "clubs.ndjson", "clubs")[1], types.GeneratorType)
+    with pytest.raises(ValueError, match="snapshot format"):
+        saveClubs(clubs, path=tmp_path / "clubs.xml", format="xml")
@@ -0,0 +1,49 @@
+import os
+import time
+
+from watcher import FileWatcher
+
+
+def test_check_reports_modified_replaced_and_created_files(tmp_path):
+    existing = tmp_path / "clubs.json"
+    existing.write_text("{}")
+    missing = tmp_path / "competitions.json"
+    calls = []
+    watcher = FileWatcher([existing, missing], lambda: calls.append(True))
+
+    assert not watcher.check()
+    stat = existing.stat()
+    os.utime(existing, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert watcher.check()
+    assert not watcher.check()
+
+    replacement = tmp_path / "clubs.json.tmp"
+    replacement.write_text("{}")
+    os.replace(replacement, existing)
+    assert watcher.check()
+
+    missing.write_text("{}")
+    assert watcher.check()
+    assert len(calls) == 3
+
+
+def test_background_thread_survives_failing_callbacks(tmp_path):
+    path = tmp_path / "clubs.json"
+    path.write_text("{}")
+    calls = []
+
+    def on_change():
+        calls.append(True)
+        raise ValueError("half-written file")
+
+    watcher = FileWatcher([path], on_change, interval=0.01)
+    watcher.start()
+    path.write_text('{"clubs": []}')
+    deadline = time.monotonic() + 5
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    path.write_text('{"clubs": [1]}')
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    watcher.stop()
+    assert len(calls) == 2
@@ -0,0 +1,36 @@
+import random
+from collections import Counter
+from datetime import datetime
+
+from workload import ZipfSampler, clubName, competitionName, generateClubs, generateCompetitions, pastCount
+
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def test_generated_data_is_deterministic_per_seed():
+    assert generateClubs(50, seed=3) == generateClubs(50, seed=3)
+    assert generateClubs(50, seed=3) != generateClubs(50, seed=4)
+    assert generateCompetitions(50, NOW, seed=3) == generateCompetitions(50, NOW.replace(hour=20), seed=3)
+    clubs = generateClubs(3, points=(5, 5))
+    assert [club.name for club in clubs] == [clubName(i) for i in range(3)]
+    assert {club.points for club in clubs} == {5}
+    assert len({club.email for club in generateClubs(1000)}) == 1000
+
+
+def test_first_competitions_are_past_and_the_others_upcoming():
+    competitions = generateCompetitions(100, NOW, past=0.2)
+    assert pastCount(100, 0.2) == 20
+    assert [c.name for c in competitions[:2]] == [competitionName(0), competitionName(1)]
+    assert all(c.date < NOW for c in competitions[:20])
+    assert all(c.date > NOW for c in competitions[20:])
+
+
+def test_zipf_sampler_skews_towards_the_first_indexes():
+    sample = ZipfSampler(100, s=1.2, rng=random.Random(1))
+    draws = Counter(sample() for _ in range(20000))
+    assert set(draws) <= set(range(100))
+    assert draws[0] > draws[1] > draws[10] > draws[90]
+    sample = ZipfSampler(4, s=0, rng=random.Random(1))
+    uniform = Counter(sample() for _ in range(20000))
+    assert all(4000 < count < 6000 for count in uniform.values())
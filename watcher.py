@@ -0,0 +1,65 @@
+import logging
+import os
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+def fileStamps(paths):
+    """Return (mtime, size, inode) of each path, ``None`` for a missing one."""
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stamps.append(None)
+            continue
+        stamps.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+    return stamps
+
+
+class FileWatcher:
+    """Polls files and calls ``on_change`` when any of them changed.
+
+    A file changed when its modification time, size or inode differs, so a
+    file replaced by a rename is noticed too. ``on_change`` runs on the
+    watcher thread; its errors are logged and polling goes on.
+    """
+
+    def __init__(self, paths, on_change, interval=1.0):
+        self.paths = [os.fspath(path) for path in paths]
+        self.on_change = on_change
+        self.interval = interval
+        self._stamps = fileStamps(self.paths)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Call ``on_change`` if a file changed since the last check."""
+        stamps = fileStamps(self.paths)
+        if stamps == self._stamps:
+            return False
+        self._stamps = stamps
+        self.on_change()
+        return True
+
+    def mark_seen(self):
+        """Take the files as they are now as unchanged, e.g. after writing them ourselves."""
+        self._stamps = fileStamps(self.paths)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Reloading %s failed", ', '.join(self.paths))
@@ -0,0 +1,71 @@
+import random
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+
+from models import Club, Competition
+
+
+CLUB_WORDS = ('Iron', 'Steel', 'Titan', 'Summit', 'Granite', 'Atlas', 'Apex', 'Forge')
+COMPETITION_WORDS = ('Open', 'Classic', 'Cup', 'Festival', 'Championship', 'Trophy', 'Meet', 'Series')
+# Share of the generated competitions dated in the past
+PAST_FRACTION = 0.2
+
+
+def clubName(index):
+    return f'{CLUB_WORDS[index % len(CLUB_WORDS)]} Lift {index}'
+
+
+def clubEmail(index):
+    return f'club{index}@example.com'
+
+
+def competitionName(index):
+    return f'{COMPETITION_WORDS[index % len(COMPETITION_WORDS)]} {index}'
+
+
+def generateClubs(count, seed=0, points=(10, 500)):
+    """Return ``count`` clubs named by :func:`clubName`, same ``seed`` same points."""
+    rng = random.Random(f'clubs-{seed}')
+    return [Club(clubName(i), clubEmail(i), rng.randint(*points)) for i in range(count)]
+
+
+def generateCompetitions(count, now, seed=0, places=(10, 500), past=PAST_FRACTION):
+    """Return ``count`` competitions, the first ``past`` fraction dated before ``now``.
+
+    Upcoming competitions are spread over the year after ``now``. Dates
+    are whole minutes after midnight of ``now``'s day, so the same
+    ``seed`` gives the same data all day long.
+    """
+    rng = random.Random(f'competitions-{seed}')
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    past_count = pastCount(count, past)
+    competitions = []
+    for i in range(count):
+        if i < past_count:
+            date = day - timedelta(days=rng.randint(1, 365), minutes=rng.randrange(1440))
+        else:
+            date = day + timedelta(days=rng.randint(1, 365), minutes=rng.randrange(1440))
+        competitions.append(Competition(competitionName(i), date, rng.randint(*places)))
+    return competitions
+
+
+def pastCount(count, past):
+    return int(count * past)
+
+
+class ZipfSampler:
+    """Draws indexes in ``range(count)`` with weight ``1 / (index + 1) ** s``.
+
+    ``s=0`` is uniform; the larger ``s``, the more draws fall on the first
+    indexes. A draw is a bisect over the cumulative weights.
+    """
+
+    def __init__(self, count, s=1.0, rng=None):
+        self.count = count
+        self.s = s
+        self.rng = rng or random.Random()
+        self._cumulative = list(accumulate(1 / (rank + 1) ** s for rank in range(count)))
+
+    def __call__(self):
+        return bisect_left(self._cumulative, self.rng.random() * self._cumulative[-1])